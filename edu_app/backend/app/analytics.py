@@ -0,0 +1,170 @@
+"""
+Thống kê lớp học bằng truy vấn GROUP BY trên point_history / rewards_redeemed / students
+
+- Chuỗi thời gian theo ngày/tuần, tần suất lý do cộng/trừ, phân bố hạng, tỉ lệ tham gia
+- Mọi phép tổng hợp chạy trong SQLite (không duyệt object ORM trong Python)
+- Kết quả được cache trong bộ nhớ theo (lớp, version của lớp, tham số): mọi thao tác ghi
+  đều tăng classrooms.version (crud.touch_classroom) nên cache cũ tự hết hiệu lực
+- Chỉ tính point_history hiện tại: tháng đã lưu trữ (archive.py) không còn chi tiết theo ngày / lý do
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import and_, case, func, literal, select
+from sqlalchemy.orm import Session
+from . import models
+
+# Số lớp giữ cache tối đa (LRU) và số kết quả mỗi lớp
+CACHE_CLASSROOMS = 256
+CACHE_ENTRIES_PER_CLASSROOM = 64
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # classroom_id -> (version, {key: result})
+
+
+def cached(classroom_id: str, version: int, key: tuple, compute):
+    """Lấy kết quả từ cache nếu version của lớp chưa đổi, nếu không thì tính bằng compute()"""
+    with _lock:
+        entry = _cache.get(classroom_id)
+        if entry is not None and entry[0] == version and key in entry[1]:
+            _cache.move_to_end(classroom_id)
+            return entry[1][key]
+
+    result = compute()
+    with _lock:
+        entry = _cache.get(classroom_id)
+        if entry is None or entry[0] != version:
+            entry = _cache[classroom_id] = (version, {})
+        if len(entry[1]) >= CACHE_ENTRIES_PER_CLASSROOM:
+            entry[1].clear()
+        entry[1][key] = result
+        _cache.move_to_end(classroom_id)
+        while len(_cache) > CACHE_CLASSROOMS:
+            _cache.popitem(last=False)
+    return result
+
+
+def invalidate(classroom_id: str):
+    with _lock:
+        _cache.pop(classroom_id, None)
+
+
+def _history_in_range(classroom_id: str, since: datetime = None, until: datetime = None):
+    """Điều kiện lọc point_history của lớp trong khoảng [since, until)"""
+    conditions = [models.Student.classroom_id == classroom_id]
+    if since is not None:
+        conditions.append(models.PointHistory.timestamp >= since)
+    if until is not None:
+        conditions.append(models.PointHistory.timestamp < until)
+    return and_(*conditions)
+
+
+def _bucket(column, bucket: str):
+    """Nhãn kỳ: ngày 'YYYY-MM-DD' hoặc thứ Hai đầu tuần 'YYYY-MM-DD'"""
+    if bucket == "day":
+        return func.date(column)
+    if bucket == "week":
+        return func.date(column, "weekday 0", "-6 days")
+    raise ValueError(f"Kỳ không hợp lệ: {bucket}")
+
+
+def timeseries(db: Session, classroom_id: str, bucket: str = "day",
+               since: datetime = None, until: datetime = None):
+    """
+    Điểm cộng/trừ, số lượt và số học sinh hoạt động theo ngày/tuần,
+    kèm điểm tiêu cho đổi quà (lượt đổi quà cũng là 1 dòng trừ điểm trong point_history).
+    """
+    history = models.PointHistory
+    period = _bucket(history.timestamp, bucket).label("period")
+    rows = db.execute(
+        select(
+            period,
+            func.sum(case((history.change > 0, history.change), else_=0)),
+            func.sum(case((history.change < 0, -history.change), else_=0)),
+            func.count(),
+            func.count(func.distinct(history.student_id)),
+        ).join(
+            models.Student, models.Student.id == history.student_id
+        ).where(
+            _history_in_range(classroom_id, since, until)
+        ).group_by(period).order_by(period)
+    ).all()
+
+    redeemed = models.RewardRedeemed
+    redeemed_period = _bucket(redeemed.timestamp, bucket).label("period")
+    conditions = [models.Student.classroom_id == classroom_id]
+    if since is not None:
+        conditions.append(redeemed.timestamp >= since)
+    if until is not None:
+        conditions.append(redeemed.timestamp < until)
+    redemptions = dict(
+        (period_label, (points, count))
+        for period_label, points, count in db.execute(
+            select(redeemed_period, func.sum(redeemed.points_spent), func.count())
+            .join(models.Student, models.Student.id == redeemed.student_id)
+            .where(and_(*conditions))
+            .group_by(redeemed_period)
+        )
+    )
+
+    return [
+        {
+            "period": period_label,
+            "earned": earned,
+            "deducted": deducted,
+            "events": events,
+            "active_students": active,
+            "redeemed_points": redemptions.get(period_label, (0, 0))[0],
+            "redemptions": redemptions.get(period_label, (0, 0))[1],
+        }
+        for period_label, earned, deducted, events, active in rows
+    ]
+
+
+def reasons(db: Session, classroom_id: str, sign: str = "negative", limit: int = 10,
+            since: datetime = None, until: datetime = None):
+    """Các lý do cộng (sign=positive) hoặc trừ (sign=negative) điểm thường gặp nhất"""
+    history = models.PointHistory
+    condition = history.change > 0 if sign == "positive" else history.change < 0
+    reason = func.coalesce(history.reason, literal("")).label("reason")
+    count = func.count().label("count")
+    rows = db.execute(
+        select(reason, count, func.sum(func.abs(history.change)))
+        .join(models.Student, models.Student.id == history.student_id)
+        .where(_history_in_range(classroom_id, since, until), condition)
+        .group_by(reason)
+        .order_by(count.desc(), reason)
+        .limit(limit)
+    ).all()
+    return [{"reason": r, "count": c, "points": p} for r, c, p in rows]
+
+
+def tiers(db: Session, classroom_id: str):
+    """Số học sinh ở mỗi hạng (đồng/bạc/vàng/kim cương), cùng mốc điểm với models.rank_for_points"""
+    rank = case(
+        *[(models.Student.total_points >= minimum, name) for minimum, name in models.RANK_THRESHOLDS],
+        else_="bronze",
+    ).label("rank")
+    counts = dict(db.execute(
+        select(rank, func.count())
+        .where(models.Student.classroom_id == classroom_id)
+        .group_by(rank)
+    ).all())
+    return [{"rank": name, "count": counts.get(name, 0)} for name in models.RANKS]
+
+
+def participation(db: Session, classroom_id: str, since: datetime = None, until: datetime = None):
+    """Tỉ lệ học sinh có ít nhất 1 lần được cộng/trừ điểm hoặc đổi quà trong khoảng thời gian"""
+    students = db.scalar(
+        select(func.count()).select_from(models.Student).where(models.Student.classroom_id == classroom_id)
+    )
+    active = db.scalar(
+        select(func.count(func.distinct(models.PointHistory.student_id)))
+        .join(models.Student, models.Student.id == models.PointHistory.student_id)
+        .where(_history_in_range(classroom_id, since, until))
+    )
+    return {
+        "students": students,
+        "active_students": active,
+        "rate": round(active / students, 4) if students else 0.0,
+    }
@@ -0,0 +1,250 @@
+"""
+Lưu trữ lịch sử điểm cũ (point_history) cho DB chạy nhiều năm học
+
+- Lịch sử cũ hơn mốc (mặc định HISTORY_ARCHIVE_MONTHS = 12 tháng, làm tròn về đầu tháng) được gộp
+  thành 1 dòng/học sinh/tháng trong point_history_monthly. students.total_points và student_stats
+  (Tổng cộng / Tổng trừ của export) không đổi nên vẫn chính xác.
+- Có HISTORY_ARCHIVE_DB: dòng gốc được chuyển sang file DB lưu trữ riêng (ATTACH với tên "archive"
+  trên mọi kết nối, xem database.py). Không có: dòng gốc bị xóa, chỉ còn dòng tổng hợp (cần --drop-raw).
+- Sau khi lưu trữ: VACUUM để trả lại dung lượng cho ổ đĩa.
+- Lịch sử của học sinh và export đọc gộp (history_union): dòng hiện tại + dòng trong archive
+  + dòng tổng hợp của các tháng không còn dòng gốc.
+
+Mỗi lớp được xử lý trong 2 transaction: (1) chép dòng gốc sang archive, (2) ghi dòng tổng hợp,
+xóa dòng gốc và nâng mốc history_archive.archived_before. Người đọc chỉ lấy dòng archive có
+timestamp < mốc nên không bao giờ thấy 1 dòng 2 lần (kể cả khi dừng giữa chừng: chạy lại là xong).
+
+Chạy từ thư mục backend (dùng DATABASE_URL / HISTORY_ARCHIVE_DB):
+    python -m app.archive [--months 12] [--classroom <id>] [--drop-raw] [--no-vacuum]
+"""
+import argparse
+import os
+from datetime import datetime
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, MetaData, String, Table,
+    case, cast, delete, func, literal, select, union_all, update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from . import models
+from .database import HISTORY_ARCHIVE_DB
+
+HISTORY_ARCHIVE_MONTHS = int(os.getenv("HISTORY_ARCHIVE_MONTHS", "12"))
+
+# Bảng trong file DB lưu trữ (schema "archive"), cùng cột với point_history, không có khóa ngoại
+archive_metadata = MetaData(schema="archive")
+archived_history = Table(
+    "point_history", archive_metadata,
+    Column("id", String, primary_key=True),
+    Column("student_id", String, nullable=False),
+    Column("change", Integer, nullable=False),
+    Column("reason", String(255)),
+    Column("points_after", Integer, nullable=False),
+    Column("timestamp", DateTime),
+    Index("ix_archive_point_history_student_timestamp", "student_id", "timestamp"),
+)
+
+HISTORY_COLUMNS = ("id", "student_id", "change", "reason", "points_after", "timestamp")
+
+
+def enabled() -> bool:
+    return bool(HISTORY_ARCHIVE_DB)
+
+
+def create_archive_tables(engine):
+    """Tạo bảng trong file DB lưu trữ (nếu có cấu hình)"""
+    if enabled():
+        archive_metadata.create_all(bind=engine)
+
+
+def cutoff_for(months: int, now: datetime = None) -> datetime:
+    """Đầu tháng cách đây `months` tháng (UTC): chỉ gộp trọn tháng"""
+    now = now or datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+# ============ Đọc ============
+def get_archived_before(db, classroom_id: str = None, student_id: str = None):
+    """Mốc lưu trữ của lớp (hoặc lớp của học sinh); None nếu lớp chưa từng lưu trữ"""
+    state = models.HistoryArchiveState
+    stmt = select(state.archived_before)
+    if student_id is not None:
+        stmt = stmt.join(
+            models.Student, models.Student.classroom_id == state.classroom_id
+        ).where(models.Student.id == student_id)
+    else:
+        stmt = stmt.where(state.classroom_id == classroom_id)
+    return db.scalar(stmt)
+
+
+def _student_filter(column, classroom_id: str = None, student_id: str = None):
+    if student_id is not None:
+        return column == student_id
+    return column.in_(select(models.Student.id).where(models.Student.classroom_id == classroom_id))
+
+
+def history_union(archived_before: datetime, classroom_id: str = None, student_id: str = None):
+    """
+    Subquery (id, student_id, change, reason, points_after, timestamp) gộp lịch sử hiện tại,
+    dòng trong archive (nếu có) và dòng tổng hợp tháng không còn dòng gốc, của 1 học sinh hoặc 1 lớp.
+    """
+    history = models.PointHistory
+    parts = [
+        select(*[getattr(history, name) for name in HISTORY_COLUMNS])
+        .where(_student_filter(history.student_id, classroom_id, student_id))
+    ]
+    if enabled():
+        parts.append(
+            select(*[archived_history.c[name] for name in HISTORY_COLUMNS]).where(
+                _student_filter(archived_history.c.student_id, classroom_id, student_id),
+                archived_history.c.timestamp < archived_before,
+            )
+        )
+    monthly = models.PointHistoryMonthly
+    parts.append(
+        select(
+            (literal("monthly:") + monthly.month).label("id"),
+            monthly.student_id,
+            (monthly.earned - monthly.deducted).label("change"),
+            (literal("Tổng hợp tháng ") + monthly.month + " ("
+             + cast(monthly.earn_count + monthly.deduct_count, String) + " lượt)").label("reason"),
+            monthly.points_after,
+            monthly.last_timestamp.label("timestamp"),
+        ).where(
+            _student_filter(monthly.student_id, classroom_id, student_id),
+            monthly.raw_archived == 0,
+        )
+    )
+    return union_all(*parts).subquery("history")
+
+
+# ============ Lưu trữ ============
+def _old_history(classroom_id: str, cutoff: datetime):
+    history = models.PointHistory
+    return (
+        _student_filter(history.student_id, classroom_id=classroom_id),
+        history.timestamp < cutoff,
+    )
+
+
+def archive_classroom(engine, classroom_id: str, cutoff: datetime, keep_raw: bool) -> int:
+    """Gộp (và chuyển sang archive nếu keep_raw) lịch sử trước cutoff của 1 lớp. Trả về số dòng đã gộp"""
+    history = models.PointHistory
+    conditions = _old_history(classroom_id, cutoff)
+
+    if keep_raw:
+        with engine.begin() as conn:
+            conn.execute(
+                sqlite_insert(archived_history).from_select(
+                    list(HISTORY_COLUMNS),
+                    select(*[getattr(history, name) for name in HISTORY_COLUMNS]).where(*conditions),
+                ).on_conflict_do_nothing()
+            )
+
+    with engine.begin() as conn:
+        month = func.strftime("%Y-%m", history.timestamp).label("month")
+        # SQLite: cột points_after "trần" cạnh max(timestamp) lấy từ đúng dòng có timestamp lớn nhất
+        summaries = select(
+            history.student_id,
+            month,
+            func.sum(case((history.change > 0, history.change), else_=0)),
+            func.sum(case((history.change < 0, -history.change), else_=0)),
+            func.sum(case((history.change > 0, 1), else_=0)),
+            func.sum(case((history.change < 0, 1), else_=0)),
+            history.points_after,
+            func.max(history.timestamp),
+            literal(1 if keep_raw else 0),
+        ).where(*conditions).group_by(history.student_id, month)
+
+        table = models.PointHistoryMonthly.__table__
+        stmt = sqlite_insert(table).from_select([
+            "student_id", "month", "earned", "deducted", "earn_count", "deduct_count",
+            "points_after", "last_timestamp", "raw_archived",
+        ], summaries)
+        newer = stmt.excluded.last_timestamp >= table.c.last_timestamp
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.student_id, table.c.month],
+            set_={
+                **{key: table.c[key] + stmt.excluded[key]
+                   for key in ("earned", "deducted", "earn_count", "deduct_count")},
+                "points_after": case((newer, stmt.excluded.points_after), else_=table.c.points_after),
+                "last_timestamp": case((newer, stmt.excluded.last_timestamp), else_=table.c.last_timestamp),
+                "raw_archived": func.min(table.c.raw_archived, stmt.excluded.raw_archived),
+            },
+        )
+        conn.execute(stmt)
+
+        count = conn.execute(delete(history).where(*conditions)).rowcount
+
+        state = models.HistoryArchiveState.__table__
+        upsert = sqlite_insert(state).values(
+            classroom_id=classroom_id, archived_before=cutoff, archived_at=datetime.utcnow()
+        )
+        conn.execute(upsert.on_conflict_do_update(
+            index_elements=[state.c.classroom_id],
+            set_={
+                "archived_before": func.max(state.c.archived_before, upsert.excluded.archived_before),
+                "archived_at": upsert.excluded.archived_at,
+            },
+        ))
+        if count:
+            # Đổi version → ETag / cache thống kê của server biết dữ liệu lớp đã đổi
+            conn.execute(
+                update(models.Classroom)
+                .where(models.Classroom.id == classroom_id)
+                .values(version=models.Classroom.version + 1)
+            )
+    return count
+
+
+def delete_archived(db, classroom_id: str = None, student_id: str = None):
+    """Xóa dòng lưu trữ của học sinh / cả lớp (gọi trước khi xóa học sinh, cùng transaction)"""
+    if enabled():
+        db.execute(delete(archived_history).where(
+            _student_filter(archived_history.c.student_id, classroom_id, student_id)
+        ))
+
+
+def reclaim_space(engine):
+    """Checkpoint WAL rồi VACUUM file DB chính (không chạy được trong transaction)"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.exec_driver_sql("VACUUM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months", type=int, default=HISTORY_ARCHIVE_MONTHS,
+                        help="Giữ nguyên lịch sử chi tiết của bấy nhiêu tháng gần nhất")
+    parser.add_argument("--classroom", help="Chỉ lưu trữ 1 lớp")
+    parser.add_argument("--drop-raw", action="store_true",
+                        help="Cho phép xóa dòng gốc khi không cấu hình HISTORY_ARCHIVE_DB")
+    parser.add_argument("--no-vacuum", action="store_true", help="Không VACUUM sau khi lưu trữ")
+    args = parser.parse_args()
+
+    if not enabled() and not args.drop_raw:
+        parser.error("Chưa cấu hình HISTORY_ARCHIVE_DB: dòng gốc sẽ bị xóa, thêm --drop-raw để xác nhận")
+
+    from .database import Base, engine
+
+    Base.metadata.create_all(bind=engine, tables=[
+        models.PointHistoryMonthly.__table__, models.HistoryArchiveState.__table__,
+    ])
+    create_archive_tables(engine)
+
+    cutoff = cutoff_for(args.months)
+    with engine.connect() as conn:
+        classroom_ids = [args.classroom] if args.classroom else conn.scalars(select(models.Classroom.id)).all()
+
+    total = 0
+    for classroom_id in classroom_ids:
+        total += archive_classroom(engine, classroom_id, cutoff, keep_raw=enabled())
+    print(f"✅ Đã lưu trữ {total} dòng lịch sử trước {cutoff:%Y-%m-%d} của {len(classroom_ids)} lớp")
+
+    if total and not args.no_vacuum:
+        reclaim_space(engine)
+        print("🧹 Đã VACUUM file DB")
+
+
+if __name__ == "__main__":
+    main()
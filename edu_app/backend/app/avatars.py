@@ -0,0 +1,156 @@
+"""
+Kho ảnh đại diện theo nội dung (content-addressed)
+
+Ảnh base64 (data URL) gửi lên được giải mã và lưu 1 lần trên đĩa theo SHA-256 của nội dung:
+    data/avatars/<hash>/full.<ext>   ảnh gốc
+    data/avatars/<hash>/thumb.<ext>  ảnh thu nhỏ (tạo khi upload)
+Cột students.avatar chỉ giữ tham chiếu ngắn "/api/avatars/<hash>" (trỏ tới ảnh thu nhỏ,
+thêm ?size=full để lấy ảnh gốc). URL ảnh bên ngoài (http...) được giữ nguyên.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+
+AVATAR_DIR = os.getenv("AVATAR_DIR", os.path.join("data", "avatars"))
+AVATAR_URL_PREFIX = "/api/avatars/"
+# Thẻ học sinh hiển thị 100px: thu nhỏ 2x cho màn hình mật độ cao
+THUMB_SIZE = int(os.getenv("AVATAR_THUMB_SIZE", "200"))
+MAX_AVATAR_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(10 * 1024 * 1024)))
+
+DATA_URL_RE = re.compile(r"^data:(image/[\w.+-]+);base64,(.*)$", re.DOTALL)
+HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+MEDIA_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+# Không nhận SVG: ảnh SVG có thể chứa script, phục vụ cùng origin với app (kèm cache 1 năm) là XSS
+
+
+_pil_image = False  # False = chưa nạp, None = không cài Pillow
+
+
+def load_pil_image():
+    """Nạp Pillow khi tạo ảnh thu nhỏ lần đầu, None nếu không cài"""
+    global _pil_image
+    if _pil_image is False:
+        try:
+            from PIL import Image
+        except ImportError:
+            Image = None
+        _pil_image = Image
+    return _pil_image
+
+
+def is_data_url(value) -> bool:
+    return isinstance(value, str) and value.startswith("data:")
+
+
+def _make_thumbnail(content: bytes, ext: str):
+    """Thu nhỏ ảnh về THUMB_SIZE. Không có Pillow → dùng ảnh gốc"""
+    Image = load_pil_image()
+    if Image is None:
+        return content, ext
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            img.load()
+            if max(img.size) <= THUMB_SIZE and ext in ("jpg", "png", "webp"):
+                return content, ext
+            img.thumbnail((THUMB_SIZE, THUMB_SIZE))
+            out = io.BytesIO()
+            if img.mode in ("RGBA", "LA", "P"):
+                img.save(out, format="PNG", optimize=True)
+                return out.getvalue(), "png"
+            img.convert("RGB").save(out, format="JPEG", quality=85, optimize=True)
+            return out.getvalue(), "jpg"
+    except Exception:
+        raise ValueError("File ảnh không hợp lệ")
+
+
+def _write_atomic(path: str, content: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def store_avatar(value):
+    """
+    Lưu avatar nếu là data URL và trả về tham chiếu "/api/avatars/<hash>".
+    Giá trị khác (None, URL, tham chiếu sẵn có) được trả lại nguyên vẹn.
+    Ném ValueError nếu data URL không hợp lệ.
+    """
+    if not is_data_url(value):
+        return value
+
+    match = DATA_URL_RE.match(value)
+    if not match:
+        raise ValueError("Avatar phải là ảnh dạng data:image/...;base64")
+    media_type, payload = match.groups()
+    ext = EXTENSIONS.get(media_type.lower())
+    if ext is None:
+        raise ValueError(f"Định dạng ảnh không hỗ trợ: {media_type}")
+    try:
+        content = base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError):
+        raise ValueError("Dữ liệu base64 của avatar không hợp lệ")
+    if not content or len(content) > MAX_AVATAR_BYTES:
+        raise ValueError("Ảnh avatar rỗng hoặc quá lớn")
+
+    digest = hashlib.sha256(content).hexdigest()
+    folder = os.path.join(AVATAR_DIR, digest)
+    # Cùng nội dung → cùng thư mục: chỉ lưu và thu nhỏ lần đầu. Kiểm tra cả 2 file (không chỉ thư mục):
+    # tiến trình chết giữa chừng để lại thư mục thiếu file thì lần upload sau ghi lại
+    if find_avatar(digest, "full") is None or find_avatar(digest, "thumb") is None:
+        thumb, thumb_ext = _make_thumbnail(content, ext)
+        os.makedirs(folder, exist_ok=True)
+        _write_atomic(os.path.join(folder, f"full.{ext}"), content)
+        _write_atomic(os.path.join(folder, f"thumb.{thumb_ext}"), thumb)
+    return AVATAR_URL_PREFIX + digest
+
+
+def find_avatar(avatar_hash: str, size: str = "thumb"):
+    """Tìm file avatar, trả về (đường dẫn, media type) hoặc None"""
+    if not HASH_RE.match(avatar_hash):
+        return None
+    folder = os.path.join(AVATAR_DIR, avatar_hash)
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return None
+    for name in names:
+        stem, _, ext = name.partition(".")
+        if stem == size and ext in MEDIA_TYPES:
+            return os.path.join(folder, name), MEDIA_TYPES[ext]
+    return None
+
+
+def migrate_inline_avatars(conn, batch_size: int = 100):
+    """Bước migration: chuyển avatar base64 đang nằm trong bảng students ra kho ảnh"""
+    last_id = ""
+    while True:
+        rows = conn.exec_driver_sql(
+            "SELECT id, avatar FROM students WHERE avatar LIKE 'data:%' AND id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size),
+        ).all()
+        if not rows:
+            return
+        for student_id, avatar in rows:
+            try:
+                ref = store_avatar(avatar)
+            except ValueError:
+                ref = None  # Ảnh hỏng: bỏ, giao diện dùng avatar mặc định
+            conn.exec_driver_sql("UPDATE students SET avatar = ? WHERE id = ?", (ref, student_id))
+        last_id = rows[-1][0]
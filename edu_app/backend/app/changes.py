@@ -0,0 +1,88 @@
+"""
+Nhật ký thay đổi theo lớp (bảng classroom_changes) cho đồng bộ delta
+
+- crud gọi record() trong cùng transaction với mỗi thao tác ghi, ngay sau touch_classroom:
+  mỗi dòng chỉ gồm (lớp, version, loại đối tượng, id), không chép dữ liệu
+- Cursor của client chính là classrooms.version đã biết (cùng số với ETag / sự kiện SSE)
+- get_changes() trả trạng thái hiện tại của các đối tượng đã đổi sau cursor; đối tượng không
+  còn tồn tại được trả về như đã xóa (không cần lưu loại thao tác)
+- Mỗi lớp giữ tối đa CHANGE_LOG_VERSIONS version gần nhất: cứ CHANGE_LOG_TRIM_EVERY version thì
+  xóa phần cũ và nâng classrooms.changes_floor; cursor cũ hơn mốc đó → client phải tải lại toàn bộ
+"""
+import os
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from . import models
+
+CHANGE_LOG_VERSIONS = int(os.getenv("CHANGE_LOG_VERSIONS", "1000"))
+CHANGE_LOG_TRIM_EVERY = 100
+
+STUDENT = "student"
+REWARD = "reward"
+
+
+def record(db: Session, classroom_id: str, version: int, entity: str, entity_ids):
+    """Ghi các đối tượng đã đổi ở version này. Không commit: đi cùng transaction người gọi"""
+    if version is None:
+        return
+    rows = [
+        {"classroom_id": classroom_id, "version": version, "entity": entity, "entity_id": entity_id}
+        for entity_id in entity_ids
+    ]
+    if rows:
+        db.execute(insert(models.ClassroomChange), rows)
+    if version % CHANGE_LOG_TRIM_EVERY == 0 and version > CHANGE_LOG_VERSIONS:
+        trim(db, classroom_id, version - CHANGE_LOG_VERSIONS)
+
+
+def trim(db: Session, classroom_id: str, floor: int):
+    """Xóa nhật ký có version <= floor; cursor < floor từ nay phải tải lại toàn bộ"""
+    log = models.ClassroomChange
+    db.execute(delete(log).where(log.classroom_id == classroom_id, log.version <= floor))
+    db.execute(
+        update(models.Classroom)
+        .where(models.Classroom.id == classroom_id)
+        .values(changes_floor=floor)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_changes(db: Session, classroom_id: str, since: int):
+    """
+    Các thay đổi của lớp sau version `since`, đọc trong 1 transaction (cùng 1 ảnh chụp dữ liệu).
+    Trả về None nếu lớp không tồn tại; resync=True nếu cursor không dùng được.
+    """
+    row = db.execute(
+        select(models.Classroom.version, models.Classroom.changes_floor)
+        .where(models.Classroom.id == classroom_id)
+    ).first()
+    if row is None:
+        return None
+    version, floor = row
+    if since < floor or since > version:
+        return {"version": version, "resync": True}
+
+    log = models.ClassroomChange
+    changed = {STUDENT: set(), REWARD: set()}
+    for entity, entity_id in db.execute(
+        select(log.entity, log.entity_id).where(
+            log.classroom_id == classroom_id, log.version > since
+        ).distinct()
+    ):
+        changed[entity].add(entity_id)
+
+    students = db.scalars(
+        select(models.Student).where(models.Student.id.in_(changed[STUDENT]))
+        .order_by(models.Student.order_number)
+    ).all() if changed[STUDENT] else []
+    rewards = db.scalars(
+        select(models.Reward).where(models.Reward.id.in_(changed[REWARD]))
+        .order_by(models.Reward.points_required)
+    ).all() if changed[REWARD] else []
+    return {
+        "version": version,
+        "students": students,
+        "deleted_students": sorted(changed[STUDENT] - {s.id for s in students}),
+        "rewards": rewards,
+        "deleted_rewards": sorted(changed[REWARD] - {r.id for r in rewards}),
+    }
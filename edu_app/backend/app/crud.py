@@ -1,25 +1,61 @@
 """
 CRUD Operations - Các thao tác dữ liệu
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+import base64
+from typing import Optional
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.sql import Subquery
+from sqlalchemy import desc, func, select, insert, update, or_, and_
 from datetime import datetime
-from . import models, schemas
+from . import models, schemas, leaderboard, snapshots, events, stats, analytics, archive, changes
+from .database import on_commit
 
 
 # ============ Classroom ============
+def touch_classroom(db: Session, classroom_id: str):
+    """
+    Tăng version của lớp trong cùng transaction với thay đổi dữ liệu.
+    Mọi thao tác ghi trong module này đều gọi hàm này → ETag / bảng xếp hạng biết dữ liệu đã đổi.
+    Trả về version mới (None nếu lớp không tồn tại).
+    """
+    return db.execute(
+        update(models.Classroom)
+        .where(models.Classroom.id == classroom_id)
+        .values(version=models.Classroom.version + 1)
+        .returning(models.Classroom.version)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
+def get_classroom_version(db: Session, classroom_id: str):
+    """Version hiện tại của lớp (truy vấn theo khóa chính), None nếu không có lớp"""
+    return db.scalar(select(models.Classroom.version).where(models.Classroom.id == classroom_id))
+
+
 def get_classrooms(db: Session):
-    """Lấy danh sách tất cả lớp học"""
-    classrooms = db.query(models.Classroom).all()
-    result = []
-    for c in classrooms:
-        result.append(schemas.ClassroomResponse(
-            id=c.id,
-            name=c.name,
-            created_at=c.created_at,
-            student_count=len(c.students)
-        ))
-    return result
+    """Lấy danh sách tất cả lớp học kèm sĩ số (1 truy vấn GROUP BY)"""
+    counts = select(
+        models.Student.classroom_id,
+        func.count(models.Student.id).label("student_count"),
+    ).group_by(models.Student.classroom_id).subquery()
+
+    rows = db.execute(
+        select(
+            models.Classroom.id,
+            models.Classroom.name,
+            models.Classroom.created_at,
+            func.coalesce(counts.c.student_count, 0),
+        ).outerjoin(counts, counts.c.classroom_id == models.Classroom.id)
+    ).all()
+    return [
+        schemas.ClassroomResponse(
+            id=id,
+            name=name,
+            created_at=created_at,
+            student_count=student_count
+        )
+        for id, name, created_at, student_count in rows
+    ]
 
 
 def create_classroom(db: Session, data: schemas.ClassroomCreate):
@@ -35,7 +71,25 @@ def delete_classroom(db: Session, classroom_id: str):
     """Xóa lớp học"""
     classroom = db.query(models.Classroom).filter(models.Classroom.id == classroom_id).first()
     if classroom:
+        # Bảng không có relationship cascade: xóa trước để không vi phạm khóa ngoại
+        db.query(models.RankingSnapshot).filter(
+            models.RankingSnapshot.classroom_id == classroom_id
+        ).delete(synchronize_session=False)
+        db.query(models.Reward).filter(
+            models.Reward.classroom_id == classroom_id
+        ).delete(synchronize_session=False)
+        db.query(models.ClassroomChange).filter(
+            models.ClassroomChange.classroom_id == classroom_id
+        ).delete(synchronize_session=False)
+        db.query(models.HistoryArchiveState).filter(
+            models.HistoryArchiveState.classroom_id == classroom_id
+        ).delete(synchronize_session=False)
+        archive.delete_archived(db, classroom_id=classroom_id)
         db.delete(classroom)
+        on_commit(db, lambda: leaderboard.invalidate(classroom_id))
+        on_commit(db, lambda: snapshots.forget_classroom(classroom_id))
+        on_commit(db, lambda: events.publish(classroom_id, "classroom_deleted"))
+        on_commit(db, lambda: analytics.invalidate(classroom_id))
         db.commit()
         return True
     return False
@@ -49,13 +103,38 @@ def get_students(db: Session, classroom_id: str):
     ).order_by(models.Student.order_number).all()
 
 
+def get_student_ids(db: Session, classroom_id: str):
+    """Lấy id học sinh theo lớp (không tải cả dòng)"""
+    return db.scalars(
+        select(models.Student.id).where(
+            models.Student.classroom_id == classroom_id
+        ).order_by(models.Student.order_number)
+    ).all()
+
+
+def get_student_roster(db: Session, classroom_id: str):
+    """id, tên, STT, điểm của cả lớp trong 1 SELECT (import upsert dựng bảng tra cứu từ đây)"""
+    return db.execute(
+        select(
+            models.Student.id,
+            models.Student.name,
+            models.Student.order_number,
+            models.Student.total_points,
+        ).where(models.Student.classroom_id == classroom_id)
+        .order_by(models.Student.order_number, models.Student.created_at)
+    ).mappings().all()
+
+
 def get_student(db: Session, student_id: str):
-    """Lấy chi tiết 1 học sinh"""
-    return db.query(models.Student).filter(models.Student.id == student_id).first()
+    """Lấy chi tiết 1 học sinh (kèm tổng hợp điểm)"""
+    return db.query(models.Student).options(
+        joinedload(models.Student.stats)
+    ).filter(models.Student.id == student_id).first()
 
 
 def create_student(db: Session, classroom_id: str, data: schemas.StudentCreate):
     """Thêm học sinh mới"""
+    snapshots.ensure_snapshots(db, classroom_id)
     student = models.Student(
         name=data.name,
         order_number=data.order_number,
@@ -64,11 +143,96 @@ def create_student(db: Session, classroom_id: str, data: schemas.StudentCreate):
         classroom_id=classroom_id
     )
     db.add(student)
+    db.flush()
+    version = touch_classroom(db, classroom_id)
+    changes.record(db, classroom_id, version, changes.STUDENT, [student.id])
+    entry = leaderboard.snapshot(student)
+    on_commit(db, lambda: leaderboard.apply_student(entry, version=version))
+    on_commit(db, lambda: events.publish(
+        classroom_id, "student_created", version, student=events.student_payload(entry)
+    ))
     db.commit()
     db.refresh(student)
     return student
 
 
+def bulk_create_students(db: Session, classroom_id: str, items: list):
+    """
+    Thêm nhiều học sinh bằng 1 câu INSERT nhiều dòng.
+    Không commit: người gọi tự quản lý transaction (import tất cả hoặc không gì cả).
+    """
+    if not items:
+        return
+    snapshots.ensure_snapshots(db, classroom_id)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": models.generate_uuid(),
+            "name": item.name,
+            "order_number": item.order_number,
+            "avatar": item.avatar,
+            "total_points": item.total_points,
+            "classroom_id": classroom_id,
+            "created_at": now,
+        }
+        for item in items
+    ]
+    db.execute(insert(models.Student), rows)
+    version = touch_classroom(db, classroom_id)
+    changes.record(db, classroom_id, version, changes.STUDENT, [row["id"] for row in rows])
+    on_commit(db, lambda: leaderboard.invalidate(classroom_id))
+    on_commit(db, lambda: events.publish(classroom_id, "students_reloaded", version))
+
+
+def bulk_update_students(db: Session, classroom_id: str, updates: list, reason: str):
+    """
+    Cập nhật nhiều học sinh bằng UPDATE theo khóa chính (executemany).
+    updates: dict {id, name, order_number, total_points}; total_points=None thì giữ điểm hiện tại.
+    Học sinh đổi điểm được ghi kèm 1 dòng point_history (lý do `reason`) để lịch sử / tổng hợp khớp
+    với tổng điểm. Mức thay đổi tính từ điểm đọc lại sau khi đã giữ khóa ghi (kế hoạch import được
+    dựng trước đó, điểm có thể đã đổi); học sinh đã bị xóa trong lúc đó được bỏ qua.
+    Không commit: người gọi tự quản lý transaction.
+    """
+    if not updates:
+        return
+    snapshots.ensure_snapshots(db, classroom_id)
+    version = touch_classroom(db, classroom_id)
+    current = dict(db.execute(
+        select(models.Student.id, models.Student.total_points).where(
+            models.Student.classroom_id == classroom_id,
+            models.Student.id.in_([item["id"] for item in updates]),
+        )
+    ).all())
+    updates = [
+        dict(item, total_points=current[item["id"]]) if item["total_points"] is None else item
+        for item in updates if item["id"] in current
+    ]
+    if not updates:
+        return
+    db.execute(update(models.Student), [
+        {key: item[key] for key in ("id", "name", "order_number", "total_points")}
+        for item in updates
+    ])
+    now = datetime.utcnow()
+    history = [
+        {
+            "id": models.generate_uuid(),
+            "student_id": item["id"],
+            "change": item["total_points"] - current[item["id"]],
+            "reason": reason,
+            "points_after": item["total_points"],
+            "timestamp": now,
+        }
+        for item in updates if item["total_points"] != current[item["id"]]
+    ]
+    if history:
+        db.execute(insert(models.PointHistory), history)
+        stats.record(db, [stats.point_delta(h["student_id"], h["change"], now) for h in history])
+    changes.record(db, classroom_id, version, changes.STUDENT, [item["id"] for item in updates])
+    on_commit(db, lambda: leaderboard.invalidate(classroom_id))
+    on_commit(db, lambda: events.publish(classroom_id, "students_reloaded", version))
+
+
 def update_student(db: Session, student_id: str, data: schemas.StudentUpdate):
     """Cập nhật thông tin học sinh"""
     student = db.query(models.Student).filter(models.Student.id == student_id).first()
@@ -80,6 +244,13 @@ def update_student(db: Session, student_id: str, data: schemas.StudentUpdate):
         student.order_number = data.order_number
     if data.avatar is not None:
         student.avatar = data.avatar
+    version = touch_classroom(db, student.classroom_id)
+    changes.record(db, student.classroom_id, version, changes.STUDENT, [student_id])
+    entry = leaderboard.snapshot(student)
+    on_commit(db, lambda: leaderboard.apply_student(entry, version=version))
+    on_commit(db, lambda: events.publish(
+        entry["classroom_id"], "student_updated", version, student=events.student_payload(entry)
+    ))
     db.commit()
     db.refresh(student)
     return student
@@ -89,13 +260,111 @@ def delete_student(db: Session, student_id: str):
     """Xóa học sinh"""
     student = db.query(models.Student).filter(models.Student.id == student_id).first()
     if student:
+        classroom_id = student.classroom_id
+        snapshots.ensure_snapshots(db, classroom_id)
+        archive.delete_archived(db, student_id=student_id)
         db.delete(student)
+        version = touch_classroom(db, classroom_id)
+        changes.record(db, classroom_id, version, changes.STUDENT, [student_id])
+        on_commit(db, lambda: leaderboard.remove_student(classroom_id, student_id, version))
+        on_commit(db, lambda: events.publish(classroom_id, "student_deleted", version, student_id=student_id))
         db.commit()
         return True
     return False
 
 
+# ============ History (phân trang keyset) ============
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    """Cursor = (timestamp, id) của dòng cuối trang, mã hóa base64 an toàn cho URL"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str):
+    """Giải mã cursor, ném ValueError nếu không hợp lệ"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), row_id
+    except Exception:
+        raise ValueError("Cursor không hợp lệ")
+
+
+def _keyset_page(db: Session, model, student_id: str, limit: int, cursor: Optional[str],
+                 since: Optional[datetime], until: Optional[datetime], extra_filters=()):
+    """
+    Lấy 1 trang của model (PointHistory / RewardRedeemed, hoặc subquery lịch sử gộp với
+    dòng đã lưu trữ) theo học sinh, sắp xếp (timestamp, id) giảm dần ngay trong SQL,
+    dùng index student_id+timestamp.
+    """
+    columns = model.c if isinstance(model, Subquery) else model
+    stmt = select(model).where(columns.student_id == student_id, *extra_filters)
+    if since is not None:
+        stmt = stmt.where(columns.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(columns.timestamp < until)
+    if cursor:
+        last_timestamp, last_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            columns.timestamp < last_timestamp,
+            and_(columns.timestamp == last_timestamp, columns.id < last_id),
+        ))
+    # Lấy dư 1 dòng để biết còn trang sau hay không
+    stmt = stmt.order_by(desc(columns.timestamp), desc(columns.id)).limit(limit + 1)
+    items = db.execute(stmt).all() if columns is not model else db.scalars(stmt).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].timestamp, items[-1].id)
+    return items, next_cursor
+
+
+def get_point_history_page(db: Session, student_id: str, limit: int = 50, cursor: Optional[str] = None,
+                           since: Optional[datetime] = None, until: Optional[datetime] = None,
+                           sign: Optional[str] = None):
+    """
+    Lịch sử điểm phân trang, mới nhất trước.
+    sign: "positive" (chỉ cộng) / "negative" (chỉ trừ) / None (tất cả)
+    Lớp đã lưu trữ lịch sử cũ: đọc gộp cả dòng trong archive / dòng tổng hợp tháng.
+    """
+    source = models.PointHistory
+    archived_before = archive.get_archived_before(db, student_id=student_id)
+    if archived_before is not None:
+        source = archive.history_union(archived_before, student_id=student_id)
+    columns = source.c if isinstance(source, Subquery) else source
+    extra = []
+    if sign == "positive":
+        extra.append(columns.change > 0)
+    elif sign == "negative":
+        extra.append(columns.change < 0)
+    return _keyset_page(db, source, student_id, limit, cursor, since, until, extra)
+
+
+def get_rewards_redeemed_page(db: Session, student_id: str, limit: int = 50, cursor: Optional[str] = None,
+                              since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Lịch sử đổi quà phân trang, mới nhất trước"""
+    return _keyset_page(db, models.RewardRedeemed, student_id, limit, cursor, since, until)
+
+
 # ============ Points ============
+def _add_points(db: Session, student_id: str, change: int):
+    """
+    Cộng/trừ điểm nguyên tử ngay trong SQL, chỉ khi kết quả không âm:
+        UPDATE students SET total_points = total_points + :change
+        WHERE id = :id AND total_points + :change >= 0 RETURNING total_points
+    Không đọc-sửa-ghi trong Python nên nhiều request/worker ghi đồng thời không làm mất
+    cập nhật. Trả về điểm mới, None nếu không đủ điểm (hoặc không có học sinh).
+    """
+    return db.execute(
+        update(models.Student)
+        .where(models.Student.id == student_id, models.Student.total_points + change >= 0)
+        .values(total_points=models.Student.total_points + change)
+        .returning(models.Student.total_points)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
 def change_points(db: Session, student_id: str, data: schemas.PointChange):
     """
     Thay đổi điểm học sinh.
@@ -107,29 +376,144 @@ def change_points(db: Session, student_id: str, data: schemas.PointChange):
     if not student:
         return None, None, None
 
-    old_rank = student.rank
-    new_points = student.total_points + data.change
+    snapshots.ensure_snapshots(db, student.classroom_id)
 
     # Không cho phép điểm âm
-    if new_points < 0:
+    new_points = _add_points(db, student_id, data.change)
+    if new_points is None:
+        db.rollback()
         return None, None, "Điểm không thể âm"
 
-    student.total_points = new_points
-    new_rank = student.rank
+    old_points = new_points - data.change
+    old_rank = models.rank_for_points(old_points)
+    new_rank = models.rank_for_points(new_points)
+    rank_changed = old_rank != new_rank and data.change > 0
 
-    # Lưu lịch sử
+    # Lưu lịch sử + cộng dồn tổng hợp
+    now = datetime.utcnow()
     history = models.PointHistory(
         student_id=student_id,
         change=data.change,
         reason=data.reason,
         points_after=new_points,
-        timestamp=datetime.utcnow()
+        timestamp=now
     )
     db.add(history)
+    stats.record(db, [stats.point_delta(student_id, data.change, now)])
+    version = touch_classroom(db, student.classroom_id)
+    changes.record(db, student.classroom_id, version, changes.STUDENT, [student_id])
+    entry = dict(leaderboard.snapshot(student), total_points=new_points)
+    on_commit(db, lambda: leaderboard.apply_student(entry, old_points, version))
+    on_commit(db, lambda: events.publish(
+        entry["classroom_id"], "points", version,
+        student=events.student_payload(entry), change=data.change, rank_changed=rank_changed
+    ))
     db.commit()
     db.refresh(student)
 
-    return student, old_rank != new_rank and data.change > 0, None
+    return student, rank_changed, None
+
+
+def change_points_batch(db: Session, items: list):
+    """
+    Thay đổi điểm nhiều học sinh trong 1 transaction (1 commit).
+    - 1 SELECT lấy thông tin học sinh, mỗi mục 1 UPDATE có điều kiện (nguyên tử như change_points),
+      1 INSERT hàng loạt point_history
+    - Mục không hợp lệ (không tìm thấy, điểm âm, trừ điểm thiếu lý do) bị bỏ qua và báo lỗi riêng
+    Trả về danh sách schemas.PointBatchResult theo đúng thứ tự items.
+    """
+    student_ids = {item.student_id for item in items}
+    rows = db.execute(
+        select(
+            models.Student.id,
+            models.Student.name,
+            models.Student.order_number,
+            models.Student.avatar,
+            models.Student.total_points,
+            models.Student.classroom_id,
+        ).where(models.Student.id.in_(student_ids))
+    ).mappings().all()
+    current = {row["id"]: dict(row) for row in rows}
+    for classroom_id in {row["classroom_id"] for row in current.values()}:
+        snapshots.ensure_snapshots(db, classroom_id)
+
+    now = datetime.utcnow()
+    results = []
+    history = []
+    # Điểm trước lần cập nhật đầu tiên của mỗi học sinh (để đối chiếu bảng xếp hạng)
+    original_points = {}
+    for item in items:
+        student = current.get(item.student_id)
+        if not student:
+            results.append(schemas.PointBatchResult(student_id=item.student_id, error="Không tìm thấy học sinh"))
+            continue
+        if item.change < 0 and not item.reason.strip():
+            results.append(schemas.PointBatchResult(student_id=item.student_id, error="Trừ điểm phải có lý do"))
+            continue
+
+        # Không cho phép điểm âm
+        new_points = _add_points(db, item.student_id, item.change)
+        if new_points is None:
+            results.append(schemas.PointBatchResult(student_id=item.student_id, error="Điểm không thể âm"))
+            continue
+
+        old_points = new_points - item.change
+        original_points.setdefault(item.student_id, old_points)
+        student["total_points"] = new_points
+        old_rank = models.rank_for_points(old_points)
+        new_rank = models.rank_for_points(new_points)
+        history.append({
+            "id": models.generate_uuid(),
+            "student_id": item.student_id,
+            "change": item.change,
+            "reason": item.reason,
+            "points_after": new_points,
+            "timestamp": now,
+        })
+        results.append(schemas.PointBatchResult(
+            student_id=item.student_id,
+            rank_changed=old_rank != new_rank and item.change > 0,
+            new_rank=new_rank,
+        ))
+
+    if history:
+        db.execute(insert(models.PointHistory), history)
+        stats.record(db, [stats.point_delta(h["student_id"], h["change"], now) for h in history])
+        versions = {
+            classroom_id: touch_classroom(db, classroom_id)
+            for classroom_id in {current[sid]["classroom_id"] for sid in original_points}
+        }
+        for classroom_id, version in versions.items():
+            changes.record(db, classroom_id, version, changes.STUDENT, [
+                sid for sid in original_points if current[sid]["classroom_id"] == classroom_id
+            ])
+        for sid, old in original_points.items():
+            entry = dict(current[sid])
+            version = versions[entry["classroom_id"]]
+            on_commit(db, lambda entry=entry, old=old, version=version: leaderboard.apply_student(entry, old, version))
+        # 1 sự kiện cho mỗi lớp (không phải mỗi học sinh) kèm điểm cuối cùng sau cả lô
+        rank_changed = {}
+        for result in results:
+            if result.error is None:
+                rank_changed[result.student_id] = rank_changed.get(result.student_id, False) or result.rank_changed
+        for classroom_id, version in versions.items():
+            changed = [
+                dict(events.student_payload(current[sid]), rank_changed=rank_changed[sid])
+                for sid in original_points if current[sid]["classroom_id"] == classroom_id
+            ]
+            on_commit(db, lambda classroom_id=classroom_id, version=version, changed=changed: events.publish(
+                classroom_id, "points_batch", version, students=changed
+            ))
+        db.commit()
+    else:
+        db.rollback()
+
+    # Gắn thông tin học sinh (điểm cuối cùng sau cả lô)
+    for result in results:
+        if result.error is None:
+            student = current[result.student_id]
+            result.student = schemas.StudentBrief(**student, rank=models.rank_for_points(student["total_points"]))
+    return results
 
 
 # ============ Rewards ============
@@ -150,6 +534,11 @@ def create_reward(db: Session, classroom_id: str, data: schemas.RewardCreate):
         classroom_id=classroom_id
     )
     db.add(reward)
+    db.flush()
+    version = touch_classroom(db, classroom_id)
+    changes.record(db, classroom_id, version, changes.REWARD, [reward.id])
+    payload = schemas.RewardResponse.model_validate(reward).model_dump()
+    on_commit(db, lambda: events.publish(classroom_id, "reward_created", version, reward=payload))
     db.commit()
     db.refresh(reward)
     return reward
@@ -159,7 +548,11 @@ def delete_reward(db: Session, reward_id: str):
     """Xóa phần thưởng"""
     reward = db.query(models.Reward).filter(models.Reward.id == reward_id).first()
     if reward:
+        classroom_id = reward.classroom_id
         db.delete(reward)
+        version = touch_classroom(db, classroom_id)
+        changes.record(db, classroom_id, version, changes.REWARD, [reward_id])
+        on_commit(db, lambda: events.publish(classroom_id, "reward_deleted", version, reward_id=reward_id))
         db.commit()
         return True
     return False
@@ -168,7 +561,7 @@ def delete_reward(db: Session, reward_id: str):
 def redeem_reward(db: Session, student_id: str, reward_id: str):
     """
     Đổi quà cho học sinh.
-    Kiểm tra đủ điểm → trừ điểm → lưu lịch sử
+    Trừ điểm có điều kiện (chỉ khi đủ điểm) trong 1 câu UPDATE → lưu lịch sử
     """
     student = db.query(models.Student).filter(models.Student.id == student_id).first()
     reward = db.query(models.Reward).filter(models.Reward.id == reward_id).first()
@@ -176,52 +569,155 @@ def redeem_reward(db: Session, student_id: str, reward_id: str):
     if not student or not reward:
         return None, "Không tìm thấy học sinh hoặc phần thưởng"
 
-    if student.total_points < reward.points_required:
-        return None, f"Không đủ điểm. Cần {reward.points_required}, hiện có {student.total_points}"
+    snapshots.ensure_snapshots(db, student.classroom_id)
 
-    # Trừ điểm
-    student.total_points -= reward.points_required
+    # Trừ điểm (kiểm tra đủ điểm ngay trong câu UPDATE)
+    new_points = _add_points(db, student_id, -reward.points_required)
+    if new_points is None:
+        required = reward.points_required
+        db.rollback()
+        # Đọc lại điểm hiện tại: student.total_points là giá trị đã nạp trước câu UPDATE có điều kiện
+        current = db.scalar(select(models.Student.total_points).where(models.Student.id == student_id))
+        return None, f"Không đủ điểm. Cần {required}, hiện có {current}"
+    old_points = new_points + reward.points_required
 
     # Lưu lịch sử đổi quà
+    now = datetime.utcnow()
     redeemed = models.RewardRedeemed(
         student_id=student_id,
         reward_name=reward.name,
         points_spent=reward.points_required,
-        timestamp=datetime.utcnow()
+        timestamp=now
     )
     db.add(redeemed)
 
-    # Lưu lịch sử điểm
+    # Lưu lịch sử điểm + cộng dồn tổng hợp
     history = models.PointHistory(
         student_id=student_id,
         change=-reward.points_required,
         reason=f"Đổi quà: {reward.name}",
-        points_after=student.total_points,
-        timestamp=datetime.utcnow()
+        points_after=new_points,
+        timestamp=now
     )
     db.add(history)
-
+    stats.record(db, [stats.redeem_delta(student_id, reward.points_required, now)])
+
+    version = touch_classroom(db, student.classroom_id)
+    changes.record(db, student.classroom_id, version, changes.STUDENT, [student_id])
+    entry = dict(leaderboard.snapshot(student), total_points=new_points)
+    on_commit(db, lambda: leaderboard.apply_student(entry, old_points, version))
+    redeemed_event = {"reward_name": reward.name, "points_spent": reward.points_required}
+    on_commit(db, lambda: events.publish(
+        entry["classroom_id"], "redeem", version, student=events.student_payload(entry), **redeemed_event
+    ))
     db.commit()
     db.refresh(student)
     return student, None
 
 
 # ============ Rankings ============
-def get_rankings(db: Session, classroom_id: str, limit: int = 10):
-    """Lấy bảng xếp hạng Top N"""
-    students = db.query(models.Student).filter(
+def _ranking_entry(position: int, entry: dict, baseline: dict):
+    return schemas.RankingEntry(
+        position=position,
+        student_id=entry["id"],
+        name=entry["name"],
+        avatar=entry["avatar"],
+        total_points=entry["total_points"],
+        rank=models.rank_for_points(entry["total_points"]),
+        # Xu hướng: số bậc tăng (+) / giảm (-) so với đầu kỳ, học sinh mới tính 0
+        trend=baseline.get(entry["id"], position) - position
+    )
+
+
+def _ranking_baseline(db: Session, classroom_id: str, period: str):
+    """
+    Vị trí đầu kỳ để tính xu hướng (tạo ảnh chụp nếu kỳ mới chưa có).
+    Chỉ commit khi vừa ghi ảnh chụp (tối đa 1 lần mỗi kỳ mỗi lớp): lần xem thường không mở transaction ghi
+    """
+    if snapshots.ensure_snapshots(db, classroom_id):
+        db.commit()
+    return snapshots.get_baseline(db, classroom_id, period)
+
+
+def get_rankings(db: Session, classroom_id: str, limit: int = 10, period: str = "week"):
+    """Lấy bảng xếp hạng Top N (từ bảng xếp hạng trong bộ nhớ), xu hướng so với đầu kỳ"""
+    baseline = _ranking_baseline(db, classroom_id, period)
+    board = leaderboard.get_board(db, classroom_id, get_classroom_version(db, classroom_id))
+    return [_ranking_entry(position, entry, baseline) for position, entry in board.top(limit)]
+
+
+def get_ranking_position(db: Session, classroom_id: str, student_id: str, period: str = "week"):
+    """Vị trí xếp hạng của 1 học sinh trong lớp, None nếu không có"""
+    baseline = _ranking_baseline(db, classroom_id, period)
+    board = leaderboard.get_board(db, classroom_id, get_classroom_version(db, classroom_id))
+    found = board.locate(student_id)
+    if found is None:
+        return None
+    return _ranking_entry(*found, baseline)
+
+
+# ============ Export ============
+def get_export_summary(db: Session, classroom_id: str):
+    """
+    Danh sách học sinh kèm Tổng cộng / Tổng trừ, đọc từ bảng tổng hợp student_stats
+    (O(số học sinh), không quét lịch sử). Chỉ lấy các cột cần thiết (không tải avatar).
+    """
+    totals = models.StudentStats
+    stmt = select(
+        models.Student.order_number,
+        models.Student.name,
+        models.Student.total_points,
+        func.coalesce(totals.earned, 0).label("total_add"),
+        (-func.coalesce(totals.deducted, 0)).label("total_sub"),
+    ).outerjoin(
+        totals, totals.student_id == models.Student.id
+    ).where(
         models.Student.classroom_id == classroom_id
-    ).order_by(desc(models.Student.total_points)).limit(limit).all()
-
-    rankings = []
-    for i, student in enumerate(students):
-        rankings.append(schemas.RankingEntry(
-            position=i + 1,
-            student_id=student.id,
-            name=student.name,
-            avatar=student.avatar,
-            total_points=student.total_points,
-            rank=student.rank,
-            trend=0  # Có thể mở rộng sau
-        ))
-    return rankings
+    ).order_by(models.Student.order_number, models.Student.id)
+    return db.execute(stmt)
+
+
+def iter_point_history(db: Session, classroom_id: str, chunk_size: int = 1000):
+    """
+    Duyệt lịch sử điểm của cả lớp theo từng khối (chunk), sắp xếp ngay trong SQL:
+    theo thứ tự học sinh, mới nhất trước (gộp cả lịch sử đã lưu trữ, xem archive.py).
+    Trả về các dòng (name, timestamp, change, reason, points_after).
+    """
+    history = models.PointHistory
+    archived_before = archive.get_archived_before(db, classroom_id=classroom_id)
+    if archived_before is not None:
+        history = archive.history_union(archived_before, classroom_id=classroom_id).c
+    stmt = select(
+        models.Student.name,
+        history.timestamp,
+        history.change,
+        history.reason,
+        history.points_after,
+    ).join(
+        models.Student, models.Student.id == history.student_id
+    ).where(
+        models.Student.classroom_id == classroom_id
+    ).order_by(
+        models.Student.order_number, models.Student.id, desc(history.timestamp)
+    ).execution_options(yield_per=chunk_size)
+    return db.execute(stmt)
+
+
+def iter_rewards_redeemed(db: Session, classroom_id: str, chunk_size: int = 1000):
+    """
+    Duyệt lịch sử đổi quà của cả lớp theo từng khối (chunk).
+    Trả về các dòng (name, reward_name, points_spent, timestamp).
+    """
+    stmt = select(
+        models.Student.name,
+        models.RewardRedeemed.reward_name,
+        models.RewardRedeemed.points_spent,
+        models.RewardRedeemed.timestamp,
+    ).join(
+        models.Student, models.Student.id == models.RewardRedeemed.student_id
+    ).where(
+        models.Student.classroom_id == classroom_id
+    ).order_by(
+        models.Student.order_number, models.Student.id, desc(models.RewardRedeemed.timestamp)
+    ).execution_options(yield_per=chunk_size)
+    return db.execute(stmt)
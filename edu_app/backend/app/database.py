@@ -1,15 +1,88 @@
 """
 Cấu hình cơ sở dữ liệu SQLite + SQLAlchemy async
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
-DATABASE_URL = "sqlite:///./data/classroom.db"
+# Mặc định đường dẫn tương đối: file DB nằm trong ./data của thư mục chạy server
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/classroom.db")
+# Cùng file DB, driver aiosqlite cho các endpoint async
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# ============ Cấu hình SQLite (biến môi trường) ============
+# WAL: đọc không chặn ghi, mỗi commit chỉ ghi nối vào file -wal
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# NORMAL an toàn với WAL (chỉ có thể mất commit cuối khi mất điện), không fsync mỗi commit
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# Số âm = KiB: 20 MB page cache cho mỗi kết nối
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+# Chờ khóa tối đa bao lâu trước khi báo "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_FOREIGN_KEYS = os.getenv("SQLITE_FOREIGN_KEYS", "1") == "1"
+# File DB lưu trữ lịch sử điểm cũ (xem archive.py), gắn vào mọi kết nối với tên "archive"; rỗng = không dùng
+HISTORY_ARCHIVE_DB = os.getenv("HISTORY_ARCHIVE_DB", "")
+
+# Pool kết nối (mỗi engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """Áp dụng cấu hình SQLite cho mỗi kết nối mới"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA temp_store = {SQLITE_TEMP_STORE}")
+    cursor.execute(f"PRAGMA foreign_keys = {'ON' if SQLITE_FOREIGN_KEYS else 'OFF'}")
+    if HISTORY_ARCHIVE_DB:
+        cursor.execute("ATTACH DATABASE ? AS archive", (HISTORY_ARCHIVE_DB,))
+        cursor.execute(f"PRAGMA archive.journal_mode = {SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA archive.synchronous = {SQLITE_SYNCHRONOUS}")
+    cursor.close()
+
+
+# Giây client nên chờ trước khi thử lại khi DB đang bị khóa ghi (header Retry-After của 503)
+LOCKED_RETRY_AFTER = 2
+
+
+def is_locked_error(exc) -> bool:
+    """OperationalError do chờ khóa SQLite quá busy_timeout (database is locked / busy)"""
+    message = str(getattr(exc, "orig", exc)).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+event.listen(engine, "connect", apply_sqlite_pragmas)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Engine async: giữ kết nối trong pool (mặc định của aiosqlite là NullPool,
+# mỗi request phải mở kết nối + luồng mới)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     """Dependency: tạo DB session cho mỗi request"""
@@ -18,3 +91,34 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Dependency: tạo AsyncSession cho mỗi request.
+    Endpoint gọi lại các hàm crud (đồng bộ) qua `await db.run_sync(crud.xxx, ...)`:
+    I/O đi qua aiosqlite, không chiếm luồng của threadpool khi chờ SQLite.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# ============ Hook sau commit ============
+def on_commit(db: Session, callback):
+    """
+    Đăng ký callback chạy sau khi transaction hiện tại của session commit thành công.
+    Dùng để cập nhật trạng thái trong bộ nhớ (bảng xếp hạng...) chỉ khi dữ liệu đã ghi xong;
+    nếu transaction rollback thì callback bị hủy.
+    """
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_commit(session):
+    session.info.pop("after_commit", None)
@@ -0,0 +1,36 @@
+"""
+ETag / GET có điều kiện cho dữ liệu theo lớp
+
+ETag được suy ra từ classrooms.version (tăng ở mọi thay đổi trong crud), nên kiểm tra
+If-None-Match chỉ cần 1 truy vấn theo khóa chính trên bảng classrooms.
+"""
+from fastapi import Request, Response
+
+# Trình duyệt luôn hỏi lại server (kèm If-None-Match) trước khi dùng bản cache
+CACHE_CONTROL = "no-cache"
+
+
+def classroom_etag(kind: str, classroom_id: str, version: int, *extra) -> str:
+    parts = [kind, classroom_id, str(version), *(str(x) for x in extra)]
+    return '"' + ":".join(parts) + '"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """So khớp header If-None-Match (có thể chứa nhiều ETag, hoặc *)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    # Proxy (nginx gzip) có thể đổi ETag thành dạng yếu W/"..."
+    return etag in tags or f"W/{etag}" in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,114 @@
+"""
+Hub phát sự kiện theo lớp (đẩy thay đổi điểm/xếp hạng tới màn hình chiếu, máy tính bảng...)
+
+- crud đăng ký publish() bằng on_commit → chỉ phát khi dữ liệu đã ghi xong
+- Mỗi sự kiện được serialize JSON 1 lần, rồi chỉ việc đưa vào hàng đợi của từng subscriber
+  (không truy vấn DB theo từng subscriber)
+- publish() gọi được từ mọi thread (route async hoặc route sync chạy trong threadpool):
+  việc đưa vào hàng đợi luôn chạy trên event loop của subscriber qua call_soon_threadsafe,
+  mỗi loop 1 lần gọi cho cả nhóm subscriber
+- Subscriber chậm (hàng đợi đầy) không chặn người khác: hàng đợi bị xóa và thay bằng
+  sự kiện "resync" để client tải lại toàn bộ
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from .models import rank_for_points
+
+# Số sự kiện tối đa chờ gửi cho 1 subscriber trước khi yêu cầu client tải lại
+QUEUE_SIZE = 100
+
+RESYNC = json.dumps({"type": "resync"})
+
+
+class Subscription:
+    """1 kết nối đang nghe sự kiện của 1 lớp"""
+
+    def __init__(self, classroom_id: str, loop: asyncio.AbstractEventLoop):
+        self.classroom_id = classroom_id
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def push(self, data: str):
+        """Chạy trên event loop của subscriber"""
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+
+class EventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, classroom_id: str) -> Subscription:
+        """Đăng ký nghe sự kiện của lớp (gọi trong event loop)"""
+        subscription = Subscription(classroom_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[classroom_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.classroom_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.classroom_id]
+
+    def subscriber_count(self, classroom_id: str = None) -> int:
+        with self._lock:
+            if classroom_id is not None:
+                return len(self._subscribers.get(classroom_id, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, classroom_id: str, event: dict):
+        """Phát 1 sự kiện tới mọi subscriber của lớp"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(classroom_id, ()))
+        if not subscribers:
+            return
+        data = json.dumps(event, default=str, ensure_ascii=False)
+
+        by_loop = defaultdict(list)
+        for subscription in subscribers:
+            by_loop[subscription.loop].append(subscription)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, group, data)
+            except RuntimeError:
+                # Loop đã đóng (server đang tắt)
+                pass
+
+
+def _deliver(subscriptions, data: str):
+    for subscription in subscriptions:
+        subscription.push(data)
+
+
+hub = EventHub()
+
+
+def publish(classroom_id: str, event_type: str, version=None, **payload):
+    """Phát sự kiện {"type", "version", ...payload} của lớp qua hub mặc định"""
+    hub.publish(classroom_id, {"type": event_type, "version": version, **payload})
+
+
+def student_payload(student: dict) -> dict:
+    """Dữ liệu học sinh gọn (như StudentBrief) từ dict snapshot() của leaderboard"""
+    return {
+        "id": student["id"],
+        "name": student["name"],
+        "avatar": student["avatar"],
+        "total_points": student["total_points"],
+        "order_number": student["order_number"],
+        "rank": rank_for_points(student["total_points"]),
+        "classroom_id": student["classroom_id"],
+    }
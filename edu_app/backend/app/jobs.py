@@ -0,0 +1,331 @@
+"""
+Job chạy nền cho import / export file lớn (bảng jobs + thư mục data/jobs/<id>/)
+
+- Endpoint chỉ lưu file upload / tham số, tạo dòng jobs (queued) rồi trả 202 ngay
+- Job chạy trên ProcessPoolExecutor giới hạn JOB_WORKERS tiến trình (openpyxl tốn CPU: không chặn
+  event loop hay threadpool của server). Tiến trình con tạo bằng "spawn", dùng engine của riêng nó.
+- Tiến độ ghi vào file progress.json của job (tối đa mỗi PROGRESS_INTERVAL giây), không ghi DB:
+  import giữ khóa ghi SQLite tới lúc commit nên cập nhật bảng jobs giữa chừng sẽ phải chờ
+- Kết quả (dòng jobs + thư mục) giữ JOB_RETENTION_HOURS giờ rồi được dọn khi có job mới
+- Server khởi động lại: job dở dang của tiến trình không còn chạy được đánh dấu failed
+  (nhận diện tiến trình bằng PID + boot_id + thời điểm khởi động: PID bị dùng lại không bị coi là còn chạy)
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from . import models
+
+JOB_DIR = os.getenv("JOB_DIR", os.path.join("data", "jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+PROGRESS_INTERVAL = 0.5
+# Số lỗi từng dòng tối đa giữ trong kết quả import
+MAX_RESULT_ERRORS = 100
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def job_dir(job_id: str) -> str:
+    return os.path.join(JOB_DIR, job_id)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Tạo pool khi có job đầu tiên (import app không khởi động tiến trình nào)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# ============ Phía server ============
+def create_job(db: Session, kind: str, classroom_id: str = None, params: dict = None) -> models.Job:
+    """Tạo dòng jobs (queued) và thư mục của job. Không commit"""
+    job = models.Job(
+        kind=kind, status=QUEUED, classroom_id=classroom_id,
+        params=json.dumps(params or {}, ensure_ascii=False), owner_pid=os.getpid(),
+        owner_identity=process_identity(os.getpid()),
+    )
+    db.add(job)
+    db.flush()
+    os.makedirs(job_dir(job.id), exist_ok=True)
+    return job
+
+
+def submit(job_id: str):
+    """Đưa job (đã commit) vào pool"""
+    future = get_pool().submit(run_job, job_id)
+    future.add_done_callback(partial(_on_done, job_id))
+
+
+def _on_done(job_id: str, future):
+    """Chạy ở luồng quản lý của pool trong tiến trình server"""
+    from .database import SessionLocal
+    from . import events, leaderboard
+
+    if future.cancelled():
+        outcome, error = None, "Server dừng trước khi chạy job"
+    else:
+        try:
+            outcome, error = future.result(), None
+        except Exception as e:  # Tiến trình con chết (BrokenProcessPool), lỗi pickle...
+            outcome, error = None, f"Tiến trình xử lý job bị lỗi: {e!r}"
+    if error is not None:
+        with SessionLocal() as db:
+            _finish(db, job_id, FAILED, error=error, only_unfinished=True)
+        return
+    # Import ghi DB ở tiến trình con: báo cho bảng xếp hạng / client SSE của tiến trình này
+    if outcome and outcome.get("kind") == "import" and outcome.get("version") is not None:
+        classroom_id = outcome["classroom_id"]
+        leaderboard.invalidate(classroom_id)
+        events.publish(classroom_id, "students_reloaded", outcome["version"])
+
+
+def read_progress(job: models.Job) -> int:
+    """Tiến độ hiện tại: từ progress.json khi job đang chạy, từ DB khi đã xong"""
+    if job.status != RUNNING:
+        return job.progress
+    try:
+        with open(os.path.join(job_dir(job.id), "progress.json")) as f:
+            return json.load(f)["progress"]
+    except (OSError, ValueError, KeyError):
+        return job.progress
+
+
+def result_path(job: models.Job):
+    if job.status != DONE or not job.result_file:
+        return None
+    return os.path.join(job_dir(job.id), job.result_file)
+
+
+def process_identity(pid: int):
+    """
+    "boot_id:thời điểm khởi động" của tiến trình (Linux /proc), None nếu không đọc được.
+    PID bị dùng lại (sau khi khởi động lại máy / container hay tiến trình cũ đã dừng) cho giá trị khác.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot_id = f.read().strip()
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Trường thứ 22 (starttime); tên tiến trình trong (...) có thể chứa khoảng trắng
+    return f"{boot_id}:{stat.rsplit(')', 1)[1].split()[19]}"
+
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_alive(pid, identity) -> bool:
+    """Tiến trình server đã nhận job còn chạy không (cùng PID nhưng khác identity = tiến trình khác)"""
+    if not _pid_alive(pid):
+        return False
+    current = process_identity(pid)
+    if identity is None:
+        # Có /proc mà job không ghi identity: job từ trước khi có cột này → tiến trình đó đã khởi động lại.
+        # Không có /proc (không phải Linux): chỉ kiểm tra được PID
+        return current is None
+    return current == identity
+
+
+def recover(db: Session):
+    """Khi khởi động: job dở dang của tiến trình server đã dừng sẽ không bao giờ xong → failed"""
+    pending = db.execute(
+        select(models.Job.id, models.Job.owner_pid, models.Job.owner_identity)
+        .where(models.Job.status.in_([QUEUED, RUNNING]))
+    ).all()
+    own_identity = process_identity(os.getpid())
+    for job_id, owner_pid, owner_identity in pending:
+        if owner_pid == os.getpid() and owner_identity == own_identity:
+            continue
+        if not _owner_alive(owner_pid, owner_identity):
+            _finish(db, job_id, FAILED, error="Server khởi động lại khi job chưa xong", only_unfinished=True)
+
+
+def cleanup(db: Session):
+    """Xóa job đã kết thúc quá JOB_RETENTION_HOURS giờ (dòng jobs + thư mục)"""
+    threshold = datetime.utcnow() - timedelta(hours=JOB_RETENTION_HOURS)
+    expired = db.scalars(
+        select(models.Job.id).where(models.Job.status.in_([DONE, FAILED]), models.Job.finished_at < threshold)
+    ).all()
+    for job_id in expired:
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    if expired:
+        db.query(models.Job).filter(models.Job.id.in_(expired)).delete(synchronize_session=False)
+        db.commit()
+
+
+def _finish(db: Session, job_id: str, status: str, only_unfinished: bool = False, **values):
+    stmt = update(models.Job).where(models.Job.id == job_id)
+    if only_unfinished:
+        stmt = stmt.where(models.Job.status.in_([QUEUED, RUNNING]))
+    db.execute(stmt.values(status=status, finished_at=datetime.utcnow(), **values))
+    db.commit()
+
+
+# ============ Phía tiến trình con ============
+class ProgressReporter:
+    """Cộng dồn số dòng đã xử lý, ghi ra progress.json (thay file nguyên tử) theo chu kỳ"""
+
+    def __init__(self, job_id: str):
+        self.path = os.path.join(job_dir(job_id), "progress.json")
+        self.progress = 0
+        self.written_at = 0.0
+
+    def remove(self):
+        """Job kết thúc: tiến độ cuối cùng nằm trong bảng jobs"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def add(self, rows: int):
+        self.progress += rows
+        now = time.monotonic()
+        if now - self.written_at >= PROGRESS_INTERVAL:
+            self.written_at = now
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"progress": self.progress}, f)
+            os.replace(tmp, self.path)
+
+
+def _estimate_rows(db: Session, classroom_ids: list) -> int:
+    """Ước lượng số dòng export từ bảng tổng hợp student_stats (không quét lịch sử)"""
+    stats = models.StudentStats
+    students, history, redeemed = db.execute(
+        select(
+            func.count(models.Student.id),
+            func.coalesce(func.sum(stats.earn_count + stats.deduct_count), 0),
+            func.coalesce(func.sum(stats.redeem_count), 0),
+        ).outerjoin(stats, stats.student_id == models.Student.id)
+        .where(models.Student.classroom_id.in_(classroom_ids))
+    ).one()
+    return students + history + redeemed
+
+
+def _set_total(db: Session, job_id: str, total: int):
+    db.execute(update(models.Job).where(models.Job.id == job_id).values(total=total))
+    db.commit()
+
+
+def _run_import(db: Session, job: models.Job, params: dict, reporter: ProgressReporter):
+    from . import crud
+    from .routers import excel
+
+    path = os.path.join(job_dir(job.id), params["input"])
+    try:
+        with open(path, "rb") as f:
+            result = excel.run_import(
+                db, job.classroom_id, f, params["filename"], reporter.add, mode=params.get("mode", "append")
+            )
+    finally:
+        os.remove(path)
+    errors = result["errors"]
+    return {
+        "mode": result["mode"],
+        "imported": result["imported"],
+        "created": result["created"],
+        "updated": result["updated"],
+        "unchanged": result["unchanged"],
+        "error_count": len(errors),
+        "errors": errors[:MAX_RESULT_ERRORS],
+        "elapsed_ms": result["elapsed_ms"],
+        "version": crud.get_classroom_version(db, job.classroom_id),
+    }, None
+
+
+def _run_export(db: Session, job: models.Job, params: dict, reporter: ProgressReporter):
+    from .routers import excel
+
+    classroom = db.get(models.Classroom, job.classroom_id)
+    if classroom is None:
+        raise ValueError("Không tìm thấy lớp học")
+    _set_total(db, job.id, _estimate_rows(db, [job.classroom_id]))
+    filename = excel.classroom_export_filename(classroom.name)
+    with open(os.path.join(job_dir(job.id), filename), "wb") as f:
+        excel.write_classroom_workbook(db, job.classroom_id, f, reporter.add)
+    return {}, filename
+
+
+def _run_export_school(db: Session, job: models.Job, params: dict, reporter: ProgressReporter):
+    from .routers import excel
+
+    classrooms = excel.get_export_classrooms(db, params.get("classroom_ids"))
+    _set_total(db, job.id, _estimate_rows(db, [classroom_id for classroom_id, _ in classrooms]))
+    db.rollback()  # iter_school_zip đọc bằng session riêng; không giữ transaction đọc ở đây
+    filename = excel.school_export_filename(params["format"])
+    with open(os.path.join(job_dir(job.id), filename), "wb") as f:
+        for chunk in excel.iter_school_zip(classrooms, params["format"], reporter.add):
+            f.write(chunk)
+    return {"classrooms": len(classrooms)}, filename
+
+
+RUNNERS = {
+    "import": _run_import,
+    "export": _run_export,
+    "export_school": _run_export_school,
+}
+
+
+def run_job(job_id: str):
+    """
+    Điểm vào trong tiến trình con. Tự ghi trạng thái cuối vào bảng jobs;
+    trả về thông tin cho tiến trình server (lớp + version sau import) hoặc None.
+    """
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        job = db.get(models.Job, job_id)
+        if job is None or job.status != QUEUED:
+            return None
+        job.status = RUNNING
+        job.started_at = datetime.utcnow()
+        db.commit()
+
+        reporter = ProgressReporter(job_id)
+        params = json.loads(job.params)
+        try:
+            result, filename = RUNNERS[job.kind](db, job, params, reporter)
+        except Exception as e:
+            db.rollback()
+            # HTTPException của các hàm dùng chung với router: lấy thông báo trong detail
+            error = getattr(e, "detail", None) or str(e) or e.__class__.__name__
+            _finish(db, job_id, FAILED, progress=reporter.progress, error=error)
+            reporter.remove()
+            return None
+
+        version = result.pop("version", None)
+        _finish(
+            db, job_id, DONE, progress=reporter.progress, result_file=filename,
+            result=json.dumps(result, ensure_ascii=False),
+        )
+        reporter.remove()
+        return {"kind": job.kind, "classroom_id": job.classroom_id, "version": version}
@@ -0,0 +1,196 @@
+"""
+Bảng xếp hạng trong bộ nhớ, cập nhật tăng dần theo từng lần thay đổi điểm
+
+Mỗi lớp giữ 1 SortedList khóa (-điểm, STT, id) nên:
+- Top N: cắt N phần tử đầu
+- Vị trí của 1 học sinh: O(log n)
+- Cập nhật điểm: xóa khóa cũ + chèn khóa mới, O(log n) (list thường + insort là O(n) mỗi lần)
+Ghi và đọc bảng đều giữ _lock của module: lần đọc không thấy bảng ở giữa 1 lần cập nhật
+Bảng của 1 lớp được dựng lại từ DB khi truy cập lần đầu (sau khởi động)
+hoặc khi phát hiện lệch với dữ liệu (điểm cũ không khớp, học sinh lạ,
+version của lớp không liền mạch với version của bảng).
+"""
+import threading
+from sortedcontainers import SortedList
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from . import models
+
+
+def _sort_key(entry: dict):
+    """Điểm cao trước, bằng điểm thì theo STT rồi id (thứ tự ổn định)"""
+    return (-entry["total_points"], entry["order_number"] or 0, entry["id"])
+
+
+class ClassroomLeaderboard:
+    """Bảng xếp hạng của 1 lớp"""
+
+    def __init__(self, entries, version=None):
+        # version của lớp (classrooms.version) mà bảng đang phản ánh, None nếu không rõ
+        self.version = version
+        self._entries = {e["id"]: e for e in entries}
+        self._keys = SortedList(_sort_key(e) for e in self._entries.values())
+
+    def __len__(self):
+        with _lock:
+            return len(self._keys)
+
+    def __contains__(self, student_id):
+        with _lock:
+            return student_id in self._entries
+
+    def get(self, student_id: str):
+        with _lock:
+            return self._entries.get(student_id)
+
+    def upsert(self, entry: dict):
+        """Thêm mới hoặc cập nhật 1 học sinh (điểm, tên, STT, avatar)"""
+        with _lock:
+            self.remove(entry["id"])
+            self._entries[entry["id"]] = entry
+            self._keys.add(_sort_key(entry))
+
+    def remove(self, student_id: str):
+        with _lock:
+            old = self._entries.pop(student_id, None)
+            if old is not None:
+                self._keys.remove(_sort_key(old))
+
+    def top(self, limit: int):
+        """Top N học sinh, kèm vị trí (bắt đầu từ 1)"""
+        with _lock:
+            return [(i + 1, self._entries[key[2]]) for i, key in enumerate(self._keys.islice(0, limit))]
+
+    def locate(self, student_id: str):
+        """(vị trí bắt đầu từ 1, học sinh) đọc cùng lúc, None nếu không có trong lớp"""
+        with _lock:
+            entry = self._entries.get(student_id)
+            if entry is None:
+                return None
+            return self._keys.bisect_left(_sort_key(entry)) + 1, entry
+
+    def position(self, student_id: str):
+        """Vị trí (bắt đầu từ 1) của học sinh, None nếu không có trong lớp"""
+        found = self.locate(student_id)
+        return found[0] if found else None
+
+
+# ============ Registry theo lớp ============
+_lock = threading.RLock()
+_boards = {}
+# Tăng mỗi lần bảng của lớp bị thay đổi/hủy: bảng dựng từ DB chỉ được lưu
+# nếu không có thay đổi nào chen vào trong lúc đang truy vấn
+_generations = {}
+
+
+def _load_entries(db: Session, classroom_id: str):
+    rows = db.execute(
+        select(
+            models.Student.id,
+            models.Student.name,
+            models.Student.avatar,
+            models.Student.total_points,
+            models.Student.order_number,
+        ).where(models.Student.classroom_id == classroom_id)
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def get_board(db: Session, classroom_id: str, version=None) -> ClassroomLeaderboard:
+    """
+    Lấy bảng xếp hạng của lớp, dựng từ DB nếu chưa có.
+    version: version hiện tại của lớp (đọc TRƯỚC khi gọi); nếu khác version của bảng
+    (có ghi từ process khác) thì dựng lại.
+    """
+    with _lock:
+        board = _boards.get(classroom_id)
+        if board is not None and (version is None or board.version == version):
+            return board
+        generation = _generations.get(classroom_id, 0)
+
+    board = ClassroomLeaderboard(_load_entries(db, classroom_id), version)
+    with _lock:
+        if _generations.get(classroom_id, 0) == generation:
+            current = _boards.get(classroom_id)
+            if current is None or current.version != version:
+                _boards[classroom_id] = board
+            return _boards[classroom_id]
+    # Có thay đổi chen vào: vẫn trả bảng vừa dựng (đúng tại thời điểm đọc) nhưng không lưu
+    return board
+
+
+def rebuild(db: Session, classroom_id: str) -> ClassroomLeaderboard:
+    """Bỏ bảng hiện tại và dựng lại từ DB"""
+    invalidate(classroom_id)
+    return get_board(db, classroom_id)
+
+
+def invalidate(classroom_id: str):
+    """Hủy bảng của lớp, lần đọc sau sẽ dựng lại từ DB"""
+    with _lock:
+        _generations[classroom_id] = _generations.get(classroom_id, 0) + 1
+        _boards.pop(classroom_id, None)
+
+
+def snapshot(student) -> dict:
+    """Chụp các trường cần cho bảng xếp hạng (trước commit, khi object còn dữ liệu)"""
+    return {
+        "id": student.id,
+        "name": student.name,
+        "avatar": student.avatar,
+        "total_points": student.total_points,
+        "order_number": student.order_number,
+        "classroom_id": student.classroom_id,
+    }
+
+
+def _follows(board: ClassroomLeaderboard, version) -> bool:
+    """
+    Thay đổi mang version `version` có nối tiếp ngay sau bảng không
+    (bằng version: nhiều học sinh cùng lớp trong 1 transaction, vd cộng điểm hàng loạt)
+    """
+    if version is None or board.version is None:
+        return True
+    return board.version in (version - 1, version)
+
+
+def apply_student(student: dict, old_points=None, version=None):
+    """
+    Cập nhật 1 học sinh vào bảng của lớp (nếu bảng đang được giữ).
+    student: dict từ snapshot() (id, name, avatar, total_points, order_number, classroom_id).
+    old_points: điểm trước khi thay đổi; nếu không khớp với bảng thì hủy bảng để dựng lại.
+    version: version của lớp sau thay đổi; nếu bảng bị lỡ 1 thay đổi thì hủy bảng.
+    """
+    classroom_id = student["classroom_id"]
+    entry = {k: student[k] for k in ("id", "name", "avatar", "total_points", "order_number")}
+    with _lock:
+        _generations[classroom_id] = _generations.get(classroom_id, 0) + 1
+        board = _boards.get(classroom_id)
+        if board is None:
+            return
+        if not _follows(board, version):
+            _boards.pop(classroom_id, None)
+            return
+        if old_points is not None:
+            current = board.get(entry["id"])
+            if current is None or current["total_points"] != old_points:
+                _boards.pop(classroom_id, None)
+                return
+        board.upsert(entry)
+        if version is not None:
+            board.version = version
+
+
+def remove_student(classroom_id: str, student_id: str, version=None):
+    """Xóa học sinh khỏi bảng của lớp"""
+    with _lock:
+        _generations[classroom_id] = _generations.get(classroom_id, 0) + 1
+        board = _boards.get(classroom_id)
+        if board is None:
+            return
+        if not _follows(board, version):
+            _boards.pop(classroom_id, None)
+            return
+        board.remove(student_id)
+        if version is not None:
+            board.version = version
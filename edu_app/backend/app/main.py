@@ -1,27 +1,93 @@
 """
 LỚP HỌC TÍCH CỰC - FastAPI Backend
 Main application entry point
+
+Import module này không đụng tới DB hay ổ đĩa: tạo bảng, migration và dữ liệu mẫu
+chạy trong lifespan khi server khởi động (xem init_database).
 """
 import os
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timedelta
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base, SessionLocal
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.exc import IntegrityError, OperationalError
+from .database import engine, async_engine, Base, SessionLocal, LOCKED_RETRY_AFTER, is_locked_error
 from .models import Classroom, Student, PointHistory, Reward, RewardRedeemed
-from .routers import students, rewards, excel
+from .routers import students, rewards, excel, avatars, events, analytics, jobs as job_routes
+from .migrations import run_migrations
+from . import archive, jobs, metrics, stats, events as event_hub
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có khóa file, chạy 1 worker
+    fcntl = None
+
+# Dữ liệu mẫu khi DB trống: "demo" (lớp 10A1 mẫu) hoặc "none"
+SEED_DATA = os.getenv("SEED_DATA", "demo")
+
+
+@contextmanager
+def init_lock(path: str):
+    """Khóa file độc quyền: nhiều worker uvicorn khởi động cùng lúc sẽ khởi tạo DB lần lượt"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def init_database():
+    """Tạo thư mục data, bảng, migration và dữ liệu mẫu (idempotent, chạy khi khởi động)"""
+    db_path = engine.url.database
+    if db_path and db_path != ":memory:":
+        data_dir = os.path.dirname(os.path.abspath(db_path))
+    else:
+        data_dir = os.path.abspath("data")
+    os.makedirs(data_dir, exist_ok=True)
+    if archive.enabled():
+        os.makedirs(os.path.dirname(os.path.abspath(archive.HISTORY_ARCHIVE_DB)), exist_ok=True)
 
-# Tạo thư mục data nếu chưa có
-os.makedirs("data", exist_ok=True)
+    with init_lock(os.path.join(data_dir, ".init.lock")):
+        # Tạo tất cả bảng
+        Base.metadata.create_all(bind=engine)
+        # Nâng cấp schema cho DB đã có (index, cột mới...)
+        run_migrations(engine)
+        # Bảng trong file DB lưu trữ lịch sử cũ (nếu có HISTORY_ARCHIVE_DB)
+        archive.create_archive_tables(engine)
+        if SEED_DATA == "demo":
+            seed_data()
+        # Job dở dang của lần chạy trước không bao giờ xong
+        with SessionLocal() as db:
+            jobs.recover(db)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(init_database)
+    yield
+    jobs.shutdown()
+    await async_engine.dispose()
+    engine.dispose()
 
-# Tạo tất cả bảng
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Lớp Học Tích Cực API",
     description="API quản lý điểm thưởng/phạt học sinh với hệ thống gamification",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Đo độ trễ / số câu SQL theo route (xem /api/metrics)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # CORS - cho phép frontend kết nối
 app.add_middleware(
     CORSMiddleware,
@@ -31,30 +97,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# Vi phạm ràng buộc (vd: thêm học sinh vào lớp không tồn tại khi bật foreign_keys)
+@app.exception_handler(IntegrityError)
+async def integrity_error_handler(request: Request, exc: IntegrityError):
+    return JSONResponse(status_code=400, content={"detail": "Dữ liệu không hợp lệ (lớp học/học sinh không tồn tại?)"})
+
+
+# Chờ khóa ghi SQLite quá busy_timeout (vd đang có ghi hàng loạt): tạm thời, client thử lại sau
+@app.exception_handler(OperationalError)
+async def operational_error_handler(request: Request, exc: OperationalError):
+    if not is_locked_error(exc):
+        raise exc
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Cơ sở dữ liệu đang bận, vui lòng thử lại"},
+        headers={"Retry-After": str(LOCKED_RETRY_AFTER)},
+    )
+
+
 # Đăng ký routers
 app.include_router(students.router)
 app.include_router(rewards.router)
 app.include_router(excel.router)
+app.include_router(avatars.router)
+app.include_router(events.router)
+app.include_router(analytics.router)
+app.include_router(job_routes.router)
 
 
 # ============ API Classroom ============
-from fastapi import Depends
-from sqlalchemy.orm import Session
-from .database import get_db
-from . import crud, schemas
+from fastapi import Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import get_async_db
+from . import crud, schemas, changes
 from typing import List
 
 
 @app.get("/api/classrooms", response_model=List[schemas.ClassroomResponse])
-def list_classrooms(db: Session = Depends(get_db)):
+async def list_classrooms(db: AsyncSession = Depends(get_async_db)):
     """Lấy danh sách lớp học"""
-    return crud.get_classrooms(db)
+    return await db.run_sync(crud.get_classrooms)
 
 
 @app.post("/api/classrooms", response_model=schemas.ClassroomResponse)
-def create_classroom(data: schemas.ClassroomCreate, db: Session = Depends(get_db)):
+async def create_classroom(data: schemas.ClassroomCreate, db: AsyncSession = Depends(get_async_db)):
     """Tạo lớp học mới"""
-    classroom = crud.create_classroom(db, data)
+    classroom = await db.run_sync(crud.create_classroom, data)
     return schemas.ClassroomResponse(
         id=classroom.id,
         name=classroom.name,
@@ -64,20 +153,43 @@ def create_classroom(data: schemas.ClassroomCreate, db: Session = Depends(get_db
 
 
 @app.delete("/api/classrooms/{classroom_id}")
-def delete_classroom(classroom_id: str, db: Session = Depends(get_db)):
+async def delete_classroom(classroom_id: str, db: AsyncSession = Depends(get_async_db)):
     """Xóa lớp học"""
-    success = crud.delete_classroom(db, classroom_id)
+    success = await db.run_sync(crud.delete_classroom, classroom_id)
     if not success:
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
     return {"message": "Đã xóa lớp học"}
 
 
+@app.get("/api/classrooms/{classroom_id}/changes", response_model=schemas.ChangesResponse)
+async def get_classroom_changes(classroom_id: str, since: int = Query(..., ge=0),
+                                db: AsyncSession = Depends(get_async_db)):
+    """
+    Đồng bộ delta: học sinh / phần thưởng đã đổi sau version `since` (cursor = version đã biết,
+    lấy từ lần gọi trước hoặc sự kiện SSE). resync=true: cursor quá cũ, client tải lại toàn bộ.
+    """
+    result = await db.run_sync(changes.get_changes, classroom_id, since)
+    if result is None:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
+    return result
+
+
 @app.get("/api/health")
 def health_check():
     return {"status": "ok", "app": "Lớp Học Tích Cực", "version": "1.0.0"}
 
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Số liệu vận hành định dạng Prometheus"""
+    return PlainTextResponse(
+        metrics.render({"sse_subscribers": ("Số kết nối SSE đang mở", event_hub.hub.subscriber_count())}),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 # ============ Seed Data - Dữ liệu mẫu ============
 def seed_data():
     """Tạo dữ liệu mẫu khi khởi động lần đầu"""
@@ -172,6 +284,9 @@ def seed_data():
             )
             db.add(reward)
 
+        # Lịch sử mẫu được ghi thẳng (không qua crud): tính bảng tổng hợp từ lịch sử
+        db.flush()
+        stats.backfill(db, classroom.id)
         db.commit()
         print("✅ Đã tạo dữ liệu mẫu thành công!")
 
@@ -181,6 +296,3 @@ def seed_data():
     finally:
         db.close()
 
-
-# Chạy seed khi khởi động
-seed_data()
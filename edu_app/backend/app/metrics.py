@@ -0,0 +1,230 @@
+"""
+Đo lường vận hành: độ trễ theo route, số câu SQL / thời gian DB mỗi request, commit, lỗi khóa SQLite
+
+- MetricsMiddleware (ASGI thuần): đo từ lúc nhận request tới khi gửi xong byte cuối của response
+  (kể cả response stream như export), gắn nhãn theo mẫu route (/api/students/{student_id})
+  để số nhãn không tăng theo id
+- instrument_engine(): hook event của SQLAlchemy, cộng số câu SQL / thời gian vào request hiện tại
+  (qua ContextVar: đi theo cả threadpool của route sync lẫn greenlet của AsyncSession.run_sync)
+- render(): xuất định dạng text của Prometheus cho /api/metrics
+- Request chậm hơn SLOW_REQUEST_MS được ghi log WARNING kèm các câu SQL chậm nhất
+Không phụ thuộc thư viện ngoài (prometheus_client).
+"""
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Ngưỡng ghi log request chậm (ms), 0 = tắt
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+# Số câu SQL tối đa giữ lại mỗi request để in khi request chậm
+SLOW_LOG_STATEMENTS = 5
+MAX_TRACKED_STATEMENTS = 200
+STATEMENT_PREVIEW = 300
+
+# Kết nối lâu dài (SSE) không tính vào độ trễ
+UNTIMED_PREFIXES = ("/api/events/",)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class RequestStats:
+    """Số liệu DB của 1 request (giữ trong ContextVar)"""
+
+    __slots__ = ("statements", "db_seconds", "queries")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.queries = []
+
+
+_current: ContextVar = ContextVar("request_stats", default=None)
+
+_lock = threading.Lock()
+_in_flight = 0
+_requests = {}         # (method, route, status) -> số request
+_latency = {}          # (method, route) -> Histogram giây
+_request_sql = {}      # (method, route) -> Histogram số câu SQL
+_request_db = {}       # (method, route) -> Histogram giây DB
+_db = {"statements": 0, "seconds": 0.0, "commits": 0, "rollbacks": 0, "errors": 0, "lock_errors": 0}
+
+
+def _observe(table: dict, key, buckets, value):
+    histogram = table.get(key)
+    if histogram is None:
+        histogram = table[key] = Histogram(buckets)
+    histogram.observe(value)
+
+
+# ============ SQLAlchemy ============
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    with _lock:
+        _db["statements"] += 1
+        _db["seconds"] += elapsed
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        if len(stats.queries) < MAX_TRACKED_STATEMENTS:
+            stats.queries.append((elapsed, statement))
+
+
+def _on_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+    locked = "locked" in str(context.original_exception).lower()
+    with _lock:
+        _db["errors"] += 1
+        if locked:
+            _db["lock_errors"] += 1
+
+
+def _on_commit(conn):
+    with _lock:
+        _db["commits"] += 1
+
+
+def _on_rollback(conn):
+    with _lock:
+        _db["rollbacks"] += 1
+
+
+def instrument_engine(engine):
+    """Gắn hook đo lường vào engine đồng bộ (với engine async: truyền async_engine.sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _on_error)
+    event.listen(engine, "commit", _on_commit)
+    event.listen(engine, "rollback", _on_rollback)
+
+
+# ============ HTTP ============
+class MetricsMiddleware:
+    """Middleware ASGI đo độ trễ, request đang xử lý và số liệu DB theo route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNTIMED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        global _in_flight
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = {"code": 500}
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        with _lock:
+            _in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            key = (scope["method"], path)
+            with _lock:
+                _in_flight -= 1
+                _requests[key + (status["code"],)] = _requests.get(key + (status["code"],), 0) + 1
+                _observe(_latency, key, LATENCY_BUCKETS, elapsed)
+                _observe(_request_sql, key, STATEMENT_BUCKETS, stats.statements)
+                _observe(_request_db, key, LATENCY_BUCKETS, stats.db_seconds)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope, status["code"], elapsed, stats)
+
+
+def _log_slow_request(scope, status_code, elapsed, stats):
+    slowest = sorted(stats.queries, key=lambda q: q[0], reverse=True)[:SLOW_LOG_STATEMENTS]
+    lines = [
+        f"  {seconds * 1000:.1f} ms: {' '.join(statement.split())[:STATEMENT_PREVIEW]}"
+        for seconds, statement in slowest
+    ]
+    logger.warning(
+        "Request chậm %s %s -> %s: %.1f ms, %d câu SQL (%.1f ms DB)%s",
+        scope["method"], scope["path"], status_code, elapsed * 1000,
+        stats.statements, stats.db_seconds * 1000,
+        "".join("\n" + line for line in lines),
+    )
+
+
+# ============ Xuất Prometheus ============
+def _labels(**labels) -> str:
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _render_histograms(lines, name, help_text, table):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), histogram in sorted(table.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {count}")
+        lines.append(f"{name}_bucket{_labels(method=method, route=route, le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {histogram.count}")
+
+
+def render(extra_gauges: dict = None) -> str:
+    """Toàn bộ số liệu ở định dạng text của Prometheus (version 0.0.4)"""
+    lines = []
+    with _lock:
+        lines += ["# HELP http_requests_in_flight Số request đang xử lý",
+                  "# TYPE http_requests_in_flight gauge",
+                  f"http_requests_in_flight {_in_flight}"]
+        lines += ["# HELP http_requests_total Số request theo route và mã trạng thái",
+                  "# TYPE http_requests_total counter"]
+        for (method, route, code), count in sorted(_requests.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=code)} {count}")
+        _render_histograms(lines, "http_request_duration_seconds", "Độ trễ request", _latency)
+        _render_histograms(lines, "http_request_sql_statements", "Số câu SQL mỗi request", _request_sql)
+        _render_histograms(lines, "http_request_db_seconds", "Tổng thời gian DB mỗi request", _request_db)
+        for name, key, kind, help_text in (
+            ("db_statements_total", "statements", "counter", "Số câu SQL đã chạy"),
+            ("db_statement_seconds_total", "seconds", "counter", "Tổng thời gian chạy SQL"),
+            ("db_commits_total", "commits", "counter", "Số lần commit"),
+            ("db_rollbacks_total", "rollbacks", "counter", "Số lần rollback"),
+            ("db_errors_total", "errors", "counter", "Số lỗi DB"),
+            ("db_lock_errors_total", "lock_errors", "counter", "Số lỗi 'database is locked' của SQLite"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {_db[key]}"]
+    for name, (help_text, value) in (extra_gauges or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,71 @@
+"""
+Migration schema SQLite theo phiên bản (lưu trong PRAGMA user_version)
+
+- DB mới: Base.metadata.create_all tạo bảng + index, migration chỉ còn đánh dấu phiên bản
+- DB cũ (data/classroom.db đã triển khai): các bước còn thiếu được áp dụng khi khởi động
+Mỗi bước là câu SQL hoặc hàm nhận Connection, phải chạy lại được an toàn (idempotent).
+"""
+from sqlalchemy import inspect
+from .avatars import migrate_inline_avatars
+from .stats import backfill as backfill_student_stats
+from .search import create_search_index
+
+
+def add_column_if_missing(table: str, column: str, ddl: str):
+    """Tạo bước migration ALTER TABLE ADD COLUMN, bỏ qua nếu cột đã có"""
+    def step(conn):
+        columns = {c["name"] for c in inspect(conn).get_columns(table)}
+        if column not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return step
+
+
+# (phiên bản, mô tả, các bước)
+MIGRATIONS = [
+    (1, "Index theo đường truy cập: lớp+STT, lớp+điểm, học sinh+thời gian, lớp+điểm quà", [
+        "CREATE INDEX IF NOT EXISTS ix_students_classroom_order ON students (classroom_id, order_number)",
+        "CREATE INDEX IF NOT EXISTS ix_students_classroom_points ON students (classroom_id, total_points)",
+        "CREATE INDEX IF NOT EXISTS ix_point_history_student_timestamp ON point_history (student_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_rewards_redeemed_student_timestamp ON rewards_redeemed (student_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_rewards_classroom_points ON rewards (classroom_id, points_required)",
+    ]),
+    (2, "Chuyển avatar base64 trong bảng students ra kho ảnh data/avatars", [
+        migrate_inline_avatars,
+    ]),
+    (3, "Cột classrooms.version cho ETag theo lớp", [
+        add_column_if_missing("classrooms", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ]),
+    (4, "Tính bảng tổng hợp student_stats từ lịch sử điểm / đổi quà", [
+        backfill_student_stats,
+    ]),
+    (5, "Cột classrooms.changes_floor: nhật ký thay đổi bắt đầu từ version hiện tại", [
+        add_column_if_missing("classrooms", "changes_floor", "INTEGER NOT NULL DEFAULT 0"),
+        "UPDATE classrooms SET changes_floor = version",
+    ]),
+    (6, "Chỉ mục FTS5 tìm học sinh theo tên (không dấu) + trigger đồng bộ", [
+        create_search_index,
+    ]),
+    (7, "Cột jobs.owner_identity: nhận diện tiến trình server của job dù PID bị dùng lại", [
+        add_column_if_missing("jobs", "owner_identity", "VARCHAR"),
+    ]),
+]
+
+
+def get_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def run_migrations(engine):
+    """Áp dụng các migration có phiên bản lớn hơn user_version hiện tại"""
+    with engine.begin() as conn:
+        current = get_version(conn)
+        for version, description, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.exec_driver_sql(step)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            print(f"🔧 Migration {version}: {description}")
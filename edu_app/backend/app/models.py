@@ -3,7 +3,7 @@ SQLAlchemy Models - Định nghĩa các bảng dữ liệu
 """
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -12,6 +12,19 @@ def generate_uuid():
     return str(uuid.uuid4())
 
 
+# (điểm tối thiểu, hạng), từ cao xuống thấp; dưới mọi mốc là "bronze"
+RANK_THRESHOLDS = [(200, "diamond"), (100, "gold"), (50, "silver")]
+RANKS = ["bronze", "silver", "gold", "diamond"]
+
+
+def rank_for_points(points):
+    """Tính hạng từ số điểm (dùng chung cho ORM và các truy vấn chỉ lấy cột)"""
+    for minimum, rank in RANK_THRESHOLDS:
+        if points >= minimum:
+            return rank
+    return "bronze"
+
+
 class Classroom(Base):
     """Bảng lớp học"""
     __tablename__ = "classrooms"
@@ -19,6 +32,10 @@ class Classroom(Base):
     id = Column(String, primary_key=True, default=generate_uuid)
     name = Column(String(100), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Tăng sau mỗi thay đổi dữ liệu của lớp (học sinh, điểm, quà) → ETag / đồng bộ
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Nhật ký thay đổi chỉ đầy đủ cho các version > changes_floor (xem changes.py)
+    changes_floor = Column(Integer, nullable=False, default=0, server_default="0")
 
     students = relationship("Student", back_populates="classroom", cascade="all, delete-orphan")
 
@@ -26,6 +43,10 @@ class Classroom(Base):
 class Student(Base):
     """Bảng học sinh"""
     __tablename__ = "students"
+    __table_args__ = (
+        Index("ix_students_classroom_order", "classroom_id", "order_number"),
+        Index("ix_students_classroom_points", "classroom_id", "total_points"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     name = Column(String(100), nullable=False)
@@ -38,23 +59,21 @@ class Student(Base):
     classroom = relationship("Classroom", back_populates="students")
     point_history = relationship("PointHistory", back_populates="student", cascade="all, delete-orphan")
     rewards_redeemed = relationship("RewardRedeemed", back_populates="student", cascade="all, delete-orphan")
+    stats = relationship("StudentStats", uselist=False, cascade="all, delete-orphan")
+    monthly_history = relationship("PointHistoryMonthly", cascade="all, delete-orphan")
 
     @property
     def rank(self):
         """Tính hạng dựa trên tổng điểm"""
-        if self.total_points >= 200:
-            return "diamond"
-        elif self.total_points >= 100:
-            return "gold"
-        elif self.total_points >= 50:
-            return "silver"
-        else:
-            return "bronze"
+        return rank_for_points(self.total_points)
 
 
 class PointHistory(Base):
     """Lịch sử thay đổi điểm"""
     __tablename__ = "point_history"
+    __table_args__ = (
+        Index("ix_point_history_student_timestamp", "student_id", "timestamp"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     student_id = Column(String, ForeignKey("students.id"), nullable=False)
@@ -66,9 +85,56 @@ class PointHistory(Base):
     student = relationship("Student", back_populates="point_history")
 
 
+class StudentStats(Base):
+    """
+    Tổng hợp điểm của từng học sinh, cập nhật cùng transaction với mỗi lần ghi point_history /
+    rewards_redeemed (xem stats.py) để export / thống kê không phải quét toàn bộ lịch sử
+    """
+    __tablename__ = "student_stats"
+
+    student_id = Column(String, ForeignKey("students.id"), primary_key=True)
+    earned = Column(Integer, nullable=False, default=0)  # Tổng điểm cộng
+    deducted = Column(Integer, nullable=False, default=0)  # Tổng điểm trừ (số dương, gồm cả đổi quà)
+    redeemed = Column(Integer, nullable=False, default=0)  # Tổng điểm tiêu cho đổi quà
+    earn_count = Column(Integer, nullable=False, default=0)
+    deduct_count = Column(Integer, nullable=False, default=0)
+    redeem_count = Column(Integer, nullable=False, default=0)
+    last_activity_at = Column(DateTime, nullable=True)
+
+
+class PointHistoryMonthly(Base):
+    """
+    Lịch sử điểm đã lưu trữ, gộp 1 dòng/học sinh/tháng (xem archive.py).
+    raw_archived = 1 nếu các dòng gốc vẫn còn trong DB lưu trữ, 0 nếu đã bị xóa.
+    """
+    __tablename__ = "point_history_monthly"
+
+    student_id = Column(String, ForeignKey("students.id"), primary_key=True)
+    month = Column(String(7), primary_key=True)  # "YYYY-MM"
+    earned = Column(Integer, nullable=False, default=0)
+    deducted = Column(Integer, nullable=False, default=0)  # Số dương
+    earn_count = Column(Integer, nullable=False, default=0)
+    deduct_count = Column(Integer, nullable=False, default=0)
+    points_after = Column(Integer, nullable=False)  # Điểm sau lần thay đổi cuối tháng
+    last_timestamp = Column(DateTime, nullable=False)
+    raw_archived = Column(Integer, nullable=False, default=0)
+
+
+class HistoryArchiveState(Base):
+    """Mốc lưu trữ của từng lớp: lịch sử trước archived_before đã được gộp / chuyển đi"""
+    __tablename__ = "history_archive"
+
+    classroom_id = Column(String, ForeignKey("classrooms.id"), primary_key=True)
+    archived_before = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Reward(Base):
     """Danh sách phần thưởng (cửa hàng quà)"""
     __tablename__ = "rewards"
+    __table_args__ = (
+        Index("ix_rewards_classroom_points", "classroom_id", "points_required"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     name = Column(String(100), nullable=False)
@@ -82,6 +148,9 @@ class Reward(Base):
 class RewardRedeemed(Base):
     """Lịch sử đổi quà"""
     __tablename__ = "rewards_redeemed"
+    __table_args__ = (
+        Index("ix_rewards_redeemed_student_timestamp", "student_id", "timestamp"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     student_id = Column(String, ForeignKey("students.id"), nullable=False)
@@ -90,3 +159,52 @@ class RewardRedeemed(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     student = relationship("Student", back_populates="rewards_redeemed")
+
+
+class ClassroomChange(Base):
+    """Nhật ký thay đổi theo lớp cho đồng bộ delta: đối tượng nào đổi ở version nào"""
+    __tablename__ = "classroom_changes"
+    __table_args__ = (
+        Index("ix_classroom_changes_classroom_version", "classroom_id", "version"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    classroom_id = Column(String, ForeignKey("classrooms.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    entity = Column(String(10), nullable=False)  # "student" | "reward"
+    entity_id = Column(String, nullable=False)
+
+
+class Job(Base):
+    """Job chạy nền (import / export file lớn), xem jobs.py"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_created", "status", "created_at"),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    kind = Column(String(20), nullable=False)  # "import" | "export" | "export_school"
+    status = Column(String(10), nullable=False, default="queued")  # queued | running | done | failed
+    classroom_id = Column(String, nullable=True)  # Không khóa ngoại: job export nhiều lớp, lớp bị xóa sau đó
+    params = Column(Text, nullable=False, default="{}")  # JSON
+    progress = Column(Integer, nullable=False, default=0)  # Số dòng đã xử lý (lúc kết thúc)
+    total = Column(Integer, nullable=True)  # Ước lượng số dòng (None nếu không biết trước)
+    result = Column(Text, nullable=True)  # JSON kết quả (số học sinh import, lỗi...)
+    result_file = Column(String, nullable=True)  # Tên file tải về trong thư mục của job
+    error = Column(Text, nullable=True)
+    owner_pid = Column(Integer, nullable=True)  # Tiến trình server đã nhận job
+    owner_identity = Column(String, nullable=True)  # boot_id:thời điểm khởi động của tiến trình đó (PID có thể bị dùng lại)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class RankingSnapshot(Base):
+    """Ảnh chụp vị trí xếp hạng đầu mỗi kỳ (tuần/tháng) để tính xu hướng"""
+    __tablename__ = "ranking_snapshots"
+
+    classroom_id = Column(String, ForeignKey("classrooms.id"), primary_key=True)
+    period = Column(String(10), primary_key=True)  # "week" | "month"
+    period_start = Column(DateTime, primary_key=True)  # Mốc đầu kỳ (UTC)
+    student_id = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False)
@@ -0,0 +1,71 @@
+"""
+Router: Thống kê lớp học (tổng hợp bằng SQL, cache theo version của lớp)
+"""
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Literal
+from ..database import get_async_db
+from .. import crud, schemas, analytics, etags, snapshots
+
+router = APIRouter(prefix="/api/analytics", tags=["Thống kê"])
+
+
+async def cached_result(request: Request, response: Response, db: AsyncSession,
+                        classroom_id: str, kind: str, compute, *params):
+    """
+    Trả kết quả thống kê: 304 nếu client đã có bản mới nhất (ETag theo version của lớp),
+    lấy từ cache nếu lớp chưa thay đổi, nếu không thì tính bằng SQL.
+    """
+    version = await db.run_sync(crud.get_classroom_version, classroom_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
+    etag = etags.classroom_etag(f"analytics-{kind}", classroom_id, version, *params)
+    if etags.is_not_modified(request, etag):
+        return etags.not_modified(etag)
+    etags.set_etag(response, etag)
+    return await db.run_sync(lambda session: analytics.cached(
+        classroom_id, version, (kind, *params), lambda: compute(session, classroom_id, *params)
+    ))
+
+
+def default_since(since: Optional[datetime]) -> datetime:
+    """Mặc định từ đầu tháng hiện tại"""
+    return since if since is not None else snapshots.period_start("month")
+
+
+@router.get("/{classroom_id}/timeseries", response_model=List[schemas.TimeseriesPoint])
+async def get_timeseries(classroom_id: str, request: Request, response: Response,
+                         bucket: Literal["day", "week"] = "day",
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         db: AsyncSession = Depends(get_async_db)):
+    """Điểm cộng/trừ, số lượt, học sinh hoạt động, đổi quà theo ngày/tuần (mặc định từ đầu tháng)"""
+    return await cached_result(request, response, db, classroom_id, "timeseries",
+                               analytics.timeseries, bucket, default_since(since), until)
+
+
+@router.get("/{classroom_id}/reasons", response_model=List[schemas.ReasonCount])
+async def get_reasons(classroom_id: str, request: Request, response: Response,
+                      sign: Literal["positive", "negative"] = "negative",
+                      limit: int = Query(10, ge=1, le=100),
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      db: AsyncSession = Depends(get_async_db)):
+    """Lý do cộng/trừ điểm thường gặp nhất (mặc định: lý do trừ điểm, từ đầu tháng)"""
+    return await cached_result(request, response, db, classroom_id, "reasons",
+                               analytics.reasons, sign, limit, default_since(since), until)
+
+
+@router.get("/{classroom_id}/tiers", response_model=List[schemas.TierCount])
+async def get_tiers(classroom_id: str, request: Request, response: Response,
+                    db: AsyncSession = Depends(get_async_db)):
+    """Phân bố học sinh theo hạng Đồng/Bạc/Vàng/Kim Cương"""
+    return await cached_result(request, response, db, classroom_id, "tiers", analytics.tiers)
+
+
+@router.get("/{classroom_id}/participation", response_model=schemas.Participation)
+async def get_participation(classroom_id: str, request: Request, response: Response,
+                            since: Optional[datetime] = None, until: Optional[datetime] = None,
+                            db: AsyncSession = Depends(get_async_db)):
+    """Tỉ lệ học sinh có hoạt động (cộng/trừ điểm, đổi quà) trong khoảng thời gian (mặc định từ đầu tháng)"""
+    return await cached_result(request, response, db, classroom_id, "participation",
+                               analytics.participation, default_since(since), until)
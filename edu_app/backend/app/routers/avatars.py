@@ -0,0 +1,28 @@
+"""
+Router: Ảnh đại diện (kho ảnh theo nội dung, cache lâu dài)
+"""
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from .. import avatars
+
+router = APIRouter(prefix="/api/avatars", tags=["Avatar"])
+
+# Nội dung theo hash không bao giờ đổi: cho phép trình duyệt/proxy cache 1 năm
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{avatar_hash}")
+def get_avatar(avatar_hash: str, request: Request, size: Literal["thumb", "full"] = "thumb"):
+    """Lấy ảnh đại diện (mặc định ảnh thu nhỏ)"""
+    found = avatars.find_avatar(avatar_hash, size)
+    if not found:
+        raise HTTPException(status_code=404, detail="Không tìm thấy ảnh")
+    path, media_type = found
+
+    etag = f'"{avatar_hash}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
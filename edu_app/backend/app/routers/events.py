@@ -0,0 +1,55 @@
+"""
+Router: Đẩy sự kiện theo lớp (Server-Sent Events)
+"""
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
+from .. import crud, events
+
+router = APIRouter(prefix="/api/events", tags=["Sự kiện"])
+
+# Gửi comment giữ kết nối (proxy thường cắt kết nối im lặng sau 60s)
+HEARTBEAT_SECONDS = 15
+# Thời gian trình duyệt chờ trước khi tự kết nối lại (ms)
+RETRY_MS = 3000
+
+
+async def event_stream(request: Request, subscription: events.Subscription, version: int):
+    """Luồng text/event-stream: sự kiện hello (version hiện tại) rồi các sự kiện của lớp"""
+    try:
+        hello = json.dumps({"type": "hello", "version": version})
+        yield f"retry: {RETRY_MS}\ndata: {hello}\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            yield f"data: {data}\n\n"
+    finally:
+        events.hub.unsubscribe(subscription)
+
+
+@router.get("/{classroom_id}")
+async def classroom_events(classroom_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Nghe thay đổi của lớp (điểm, đổi quà, học sinh, phần thưởng).
+    Mỗi sự kiện là 1 dòng JSON {"type", "version", ...}. Client bỏ qua sự kiện có version
+    không lớn hơn version đã biết; thấy version nhảy cóc hoặc nhận "resync" thì tải lại qua REST.
+    """
+    # Đăng ký TRƯỚC khi đọc version để không lỡ sự kiện nào xảy ra sau version đó
+    subscription = events.hub.subscribe(classroom_id)
+    version = await db.run_sync(crud.get_classroom_version, classroom_id)
+    if version is None:
+        events.hub.unsubscribe(subscription)
+        raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
+    return StreamingResponse(
+        event_stream(request, subscription, version),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,174 +1,627 @@
 """
 Router: Import/Export Excel
 """
+import csv
 import io
+import re
+import tempfile
+import time
 import urllib.parse
+import zipfile
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from typing import List, Literal, Optional
+from pydantic import ValidationError
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from ..database import get_db
-from .. import crud, schemas, models
-
-try:
-    import openpyxl
-except ImportError:
-    openpyxl = None
+from ..database import get_db, SessionLocal, LOCKED_RETRY_AFTER, is_locked_error
+from .. import crud, schemas, models, text
 
 router = APIRouter(prefix="/api/excel", tags=["Import/Export"])
 
 
-@router.post("/import/{classroom_id}")
-async def import_excel(classroom_id: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
+def load_openpyxl():
+    """Nạp openpyxl khi dùng lần đầu (worker không đụng tới Excel thì không tốn thời gian import)"""
+    try:
+        import openpyxl
+    except ImportError:
+        raise HTTPException(status_code=500, detail="Server chưa cài openpyxl")
+    return openpyxl
+
+
+# Số dòng được kiểm tra và INSERT mỗi lượt khi import
+IMPORT_BATCH_SIZE = 500
+
+NAME_KEYS = ['Tên', 'Họ và tên', 'Ho va ten', 'Name', 'ten', 'name']
+POINT_KEYS = ['Điểm', 'Diem', 'Points', 'Score', 'diem', 'points']
+ORDER_KEYS = ['STT', 'Số thứ tự', 'So thu tu', 'Order', 'stt', 'order']
+# Lý do ghi vào lịch sử khi import upsert đổi điểm học sinh
+IMPORT_UPDATE_REASON = "Cập nhật từ file import"
+
+
+def iter_import_rows(fileobj, filename: str):
     """
-    Import danh sách học sinh từ file Excel (.xlsx) hoặc CSV.
-    Cột: Tên/Họ và tên (bắt buộc), Điểm (tùy chọn, mặc định 0)
+    Đọc từng dòng của file upload (file tạm của request hoặc file của job) dưới dạng
+    dict {tiêu đề: giá trị} mà không nạp toàn bộ file vào bộ nhớ.
+    """
+    if filename.endswith('.csv'):
+        # Parse CSV tăng dần từ file tạm của upload
+        text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+        try:
+            yield from csv.DictReader(text)
+        finally:
+            text.detach()
+    else:
+        # Parse XLSX ở chế độ read-only (đọc dần từng dòng)
+        wb = load_openpyxl().load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            rows = ws.iter_rows(values_only=True)
+            header_row = next(rows, None) or ()
+            headers = [val for val in header_row if val]
+            for row in rows:
+                row_dict = {}
+                for i, val in enumerate(row):
+                    if i < len(headers):
+                        row_dict[headers[i]] = val
+                if any(v for v in row_dict.values()):
+                    yield row_dict
+        finally:
+            wb.close()
+
+
+def read_import_rows(fileobj, filename: str):
     """
-    if not file.filename.endswith(('.xlsx', '.csv')):
+    iter_import_rows nhưng lỗi của chính việc đọc file (file hỏng, sai mã hóa, CSV lỗi...) → 400.
+    Lỗi DB của người gọi không đi qua đây: để handler chung xử lý (không lộ câu SQL trong thông báo).
+    """
+    rows = iter_import_rows(fileobj, filename)
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Lỗi đọc file: {str(e)}")
+        yield row
+
+
+def parse_import_row(row: dict):
+    """
+    Tìm tên, điểm và STT trong 1 dòng import. Trả về (name, points, order_number):
+    name=None nếu thiếu tên, points=None nếu không có cột điểm hoặc ô điểm trống,
+    order_number=None nếu không có STT hợp lệ. Ô điểm không phải số → ValueError.
+    """
+    name = None
+    points = None
+    order_number = None
+
+    # Tìm tên học sinh
+    for key in NAME_KEYS:
+        if key in row and row[key]:
+            name = str(row[key]).strip()
+            break
+
+    # Tìm điểm
+    for key in POINT_KEYS:
+        if key in row:
+            value = str(row[key]).strip() if row[key] is not None else ""
+            if value:
+                try:
+                    points = int(float(value))
+                except (ValueError, OverflowError):
+                    raise ValueError(f"Điểm không phải số: {value}")
+            break
+
+    # Tìm STT (chỉ dùng khi import upsert)
+    for key in ORDER_KEYS:
+        if key in row and row[key] not in (None, ""):
+            try:
+                order_number = int(float(str(row[key])))
+            except (ValueError, TypeError):
+                order_number = None
+            if order_number is not None and order_number < 0:
+                order_number = None
+            break
+
+    return name, points, order_number
+
+
+def validate_import_row(line_no: int, row: dict, errors: list):
+    """
+    Kiểm tra 1 dòng. Trả về (StudentCreate, points, order_number) như parse_import_row,
+    hoặc None nếu dòng lỗi (lỗi được ghi vào errors). STT của StudentCreate = vị trí dòng trong file.
+    """
+    try:
+        name, points, order_number = parse_import_row(row)
+    except ValueError as e:
+        errors.append(f"Dòng {line_no}: {e}")
+        return None
+    if not name:
+        errors.append(f"Dòng {line_no}: Không tìm thấy tên học sinh")
+        return None
+    try:
+        student_data = schemas.StudentCreate(
+            name=name,
+            order_number=line_no - 1,
+            total_points=max(0, points or 0)
+        )
+    except ValidationError as e:
+        errors.append(f"Dòng {line_no}: {e.errors()[0]['msg']}")
+        return None
+    return student_data, points, order_number
+
+
+def validate_import_batch(batch: list, errors: list, imported: list):
+    """
+    Kiểm tra 1 lô dòng (line_no, row) và trả về danh sách StudentCreate hợp lệ.
+    Dòng lỗi được ghi vào errors, dòng hợp lệ được ghi vào imported.
+    """
+    valid = []
+    for line_no, row in batch:
+        parsed = validate_import_row(line_no, row, errors)
+        if parsed is None:
+            continue
+        student_data, points, _ = parsed
+        valid.append(student_data)
+        imported.append({"name": student_data.name, "points": points or 0})
+    return valid
+
+
+class RosterMatcher:
+    """
+    Bảng tra cứu học sinh sẵn có của lớp cho import upsert, nạp bằng 1 SELECT
+    (không truy vấn từng dòng): tên chuẩn hóa (text.fold) → học sinh, STT → học sinh.
+
+    Khớp theo tên trước; trùng tên thì ưu tiên học sinh cùng STT, rồi tới STT nhỏ nhất chưa khớp.
+    Dòng không khớp tên nhưng có STT chỉ được khớp theo STT ở cuối file (resolve_pending): lúc đó
+    mới biết học sinh ở STT ấy có còn dòng nào khớp tên không (tránh đổi tên nhầm học sinh).
+    """
+
+    def __init__(self, roster):
+        self.by_name = {}
+        self.by_order = {}
+        for student in roster:
+            self.by_name.setdefault(text.fold(student["name"]), []).append(student)
+            self.by_order.setdefault(student["order_number"], student)
+        self.matched = set()
+
+    def match(self, name: str, order_number):
+        """Học sinh sẵn có cùng tên (chưa khớp với dòng nào) hoặc None"""
+        candidates = [s for s in self.by_name.get(text.fold(name), ()) if s["id"] not in self.matched]
+        if not candidates:
+            return None
+        if order_number is not None:
+            candidates = [s for s in candidates if s["order_number"] == order_number] or candidates
+        self.matched.add(candidates[0]["id"])
+        return candidates[0]
+
+    def match_order(self, order_number):
+        """Học sinh sẵn có ở STT này nếu chưa khớp với dòng nào"""
+        student = self.by_order.get(order_number)
+        if student is None or student["id"] in self.matched:
+            return None
+        self.matched.add(student["id"])
+        return student
+
+
+def plan_update(student: dict, data: schemas.StudentCreate, points, order_number, rename: bool):
+    """
+    Dict cho crud.bulk_update_students, hoặc None nếu dòng không đổi gì.
+    Ô điểm trống / file không có cột điểm (points=None) hay không có STT (order_number=None)
+    thì giữ giá trị đang có (total_points=None: giữ điểm tại lúc ghi); STT theo vị trí dòng chỉ
+    dùng cho học sinh mới.
+    """
+    item = {
+        "id": student["id"],
+        "name": data.name if rename else student["name"],
+        "order_number": order_number if order_number is not None else student["order_number"],
+        "total_points": data.total_points if points is not None else None,
+    }
+    if (item["name"], item["order_number"], item["total_points"]) == (
+        student["name"], student["order_number"],
+        student["total_points"] if points is not None else None,
+    ):
+        return None
+    return item
+
+
+def stage_upsert_batch(batch: list, matcher: RosterMatcher, plan: dict, pending: list,
+                       counts: dict, errors: list, imported: list):
+    """
+    Khớp 1 lô dòng với học sinh sẵn có theo tên, ghi thay đổi vào plan["updates"] (chưa ghi DB).
+    Dòng chưa khớp được giữ trong pending (StudentCreate, points, STT trong file) tới cuối file.
+    """
+    for line_no, row in batch:
+        parsed = validate_import_row(line_no, row, errors)
+        if parsed is None:
+            continue
+        student_data, points, order_number = parsed
+        if order_number is not None:
+            student_data.order_number = order_number
+        imported.append({"name": student_data.name, "points": student_data.total_points})
+        student = matcher.match(student_data.name, order_number)
+        if student is None:
+            pending.append(parsed)
+            continue
+        item = plan_update(student, student_data, points, order_number, rename=False)
+        if item is None:
+            counts["unchanged"] += 1
+        else:
+            plan["updates"].append(item)
+
+
+def resolve_pending(matcher: RosterMatcher, pending: list, plan: dict, counts: dict):
+    """Cuối file: dòng có STT khớp học sinh còn lại ở STT đó (đổi tên), các dòng khác là học sinh mới"""
+    for student_data, points, order_number in pending:
+        student = matcher.match_order(order_number) if order_number is not None else None
+        if student is None:
+            plan["created"].append(student_data)
+            continue
+        item = plan_update(student, student_data, points, order_number, rename=True)
+        if item is None:
+            counts["unchanged"] += 1
+        else:
+            plan["updates"].append(item)
+
+
+def apply_import_plan(db: Session, classroom_id: str, plan: dict):
+    """
+    Ghi kế hoạch import theo lô IMPORT_BATCH_SIZE, mỗi lô 1 transaction ngắn: khóa ghi SQLite được
+    nhả giữa các lô nên thao tác khác (chấm điểm...) không phải chờ hết cả file.
+    """
+    updates, created = plan["updates"], plan["created"]
+    for i in range(0, len(updates), IMPORT_BATCH_SIZE):
+        crud.bulk_update_students(db, classroom_id, updates[i:i + IMPORT_BATCH_SIZE], IMPORT_UPDATE_REASON)
+        db.commit()
+    for i in range(0, len(created), IMPORT_BATCH_SIZE):
+        crud.bulk_create_students(db, classroom_id, created[i:i + IMPORT_BATCH_SIZE])
+        db.commit()
+
+
+def check_import_filename(filename: str):
+    if not filename.endswith(('.xlsx', '.csv')):
         raise HTTPException(status_code=400, detail="Chỉ hỗ trợ file .xlsx hoặc .csv")
+    if filename.endswith('.xlsx'):
+        load_openpyxl()
+
 
-    contents = await file.read()
+def run_import(db: Session, classroom_id: str, fileobj, filename: str, progress=None, mode: str = "append"):
+    """
+    Import 2 bước, dùng chung cho endpoint import trực tiếp và job chạy nền (jobs.py):
+    1. Đọc dần cả file, kiểm tra và khớp từng lô thành kế hoạch ghi (chưa ghi gì, không giữ khóa ghi):
+       file lỗi không để lại thay đổi nào. progress(số dòng) được gọi sau mỗi lô.
+    2. Ghi kế hoạch theo lô, mỗi lô commit riêng (apply_import_plan).
+    - append: mọi dòng hợp lệ là học sinh mới
+    - upsert: khớp với học sinh sẵn có theo tên (không dấu / hoa thường / khoảng trắng) hoặc STT,
+      cập nhật học sinh đổi điểm / STT, thêm học sinh mới
+    DB bận quá busy_timeout → 503 (các lô đã commit được giữ lại).
+    """
+    started = time.perf_counter()
     imported = []
     errors = []
+    counts = {"created": 0, "updated": 0, "unchanged": 0}
+    plan = {"updates": [], "created": []}
 
+    if db.get(models.Classroom, classroom_id) is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
     try:
-        if file.filename.endswith('.csv'):
-            # Parse CSV
-            import csv
-            text = contents.decode('utf-8-sig')
-            reader = csv.DictReader(io.StringIO(text))
-            rows = list(reader)
+        if mode == "upsert":
+            matcher = RosterMatcher(crud.get_student_roster(db, classroom_id))
+            pending = []
+
+            def stage_batch(batch):
+                stage_upsert_batch(batch, matcher, plan, pending, counts, errors, imported)
         else:
-            # Parse XLSX
-            wb = openpyxl.load_workbook(io.BytesIO(contents))
-            ws = wb.active
-            headers = [cell.value for cell in ws[1] if cell.value]
-            rows = []
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                row_dict = {}
-                for i, val in enumerate(row):
-                    if i < len(headers):
-                        row_dict[headers[i]] = val
-                if any(v for v in row_dict.values()):
-                    rows.append(row_dict)
-
-        # Tìm cột tên
-        for idx, row in enumerate(rows):
-            name = None
-            points = 0
-
-            # Tìm tên học sinh
-            for key in ['Tên', 'Họ và tên', 'Ho va ten', 'Name', 'ten', 'name']:
-                if key in row and row[key]:
-                    name = str(row[key]).strip()
-                    break
-
-            if not name:
-                errors.append(f"Dòng {idx + 2}: Không tìm thấy tên học sinh")
-                continue
-
-            # Tìm điểm
-            for key in ['Điểm', 'Diem', 'Points', 'Score', 'diem', 'points']:
-                if key in row and row[key] is not None:
-                    try:
-                        points = int(float(str(row[key])))
-                    except (ValueError, TypeError):
-                        points = 0
-                    break
-
-            # Tạo học sinh
-            student_data = schemas.StudentCreate(
-                name=name,
-                order_number=idx + 1,
-                total_points=max(0, points)
-            )
-            student = crud.create_student(db, classroom_id, student_data)
-            imported.append({"name": name, "points": points})
-
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Lỗi đọc file: {str(e)}")
+            def stage_batch(batch):
+                plan["created"].extend(validate_import_batch(batch, errors, imported))
+
+        # Kết thúc transaction đọc (roster) trước khi đọc file: không giữ ảnh chụp DB suốt lúc parse
+        db.rollback()
+        batch = []
+        for idx, row in enumerate(read_import_rows(fileobj, filename)):
+            batch.append((idx + 2, row))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                stage_batch(batch)
+                if progress:
+                    progress(len(batch))
+                batch = []
+        stage_batch(batch)
+        if mode == "upsert":
+            resolve_pending(matcher, pending, plan, counts)
+        if progress:
+            progress(len(batch))
+
+        apply_import_plan(db, classroom_id, plan)
+    except OperationalError as e:
+        db.rollback()
+        if not is_locked_error(e):
+            raise
+        raise HTTPException(
+            status_code=503, detail="Cơ sở dữ liệu đang bận, vui lòng thử lại",
+            headers={"Retry-After": str(LOCKED_RETRY_AFTER)},
+        )
+    except BaseException:
+        db.rollback()
+        raise
+    counts["updated"] += len(plan["updates"])
+    counts["created"] += len(plan["created"])
 
     return {
+        "mode": mode,
         "imported": len(imported),
+        **counts,
         "errors": errors,
-        "students": imported
+        "students": imported,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
     }
 
 
-@router.get("/export/{classroom_id}")
-def export_excel(classroom_id: str, db: Session = Depends(get_db)):
+@router.post("/import/{classroom_id}")
+def import_excel(classroom_id: str, file: UploadFile = File(...),
+                 mode: Literal["append", "upsert"] = "append",
+                 db: Session = Depends(get_db)):
     """
-    Export dữ liệu lớp ra file Excel gồm 3 sheet:
-    1. Danh sách: Tên | Điểm | Hạng | Tổng cộng | Tổng trừ
-    2. Lịch sử: Tên | Thời gian | Thay đổi | Lý do | Điểm sau
-    3. Quà đã đổi: Tên | Quà | Điểm tiêu | Thời gian
+    Import danh sách học sinh từ file Excel (.xlsx) hoặc CSV.
+    Cột: Tên/Họ và tên (bắt buộc), Điểm (tùy chọn, mặc định 0), STT (tùy chọn, chỉ dùng khi upsert)
+    mode=upsert: cập nhật học sinh đã có (khớp theo tên hoặc STT) thay vì thêm trùng;
+    kết quả gồm số học sinh created / updated / unchanged.
+    File lớn nên dùng job chạy nền: POST /api/jobs/import/{classroom_id}
     """
-    students = crud.get_students(db, classroom_id)
-    classroom = db.query(models.Classroom).filter(models.Classroom.id == classroom_id).first()
-    if not classroom:
-        raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
+    check_import_filename(file.filename)
+    return run_import(db, classroom_id, file.file, file.filename, mode=mode)
 
-    wb = openpyxl.Workbook()
 
-    # ---------- Sheet 1: Danh sách ----------
-    ws1 = wb.active
-    ws1.title = "Danh sách"
-    ws1.append(["STT", "Tên", "Điểm", "Hạng", "Tổng cộng", "Tổng trừ"])
+# Số dòng đọc từ DB mỗi lần khi export
+EXPORT_CHUNK_SIZE = 1000
+# File export nhỏ hơn ngưỡng này giữ trong RAM, lớn hơn sẽ tràn ra file tạm
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+# Kích thước mỗi khối byte gửi về client
+EXPORT_STREAM_CHUNK = 64 * 1024
+
+RANK_NAMES = {"bronze": "Đồng", "silver": "Bạc", "gold": "Vàng", "diamond": "Kim Cương"}
 
-    rank_map = {"bronze": "Đồng", "silver": "Bạc", "gold": "Vàng", "diamond": "Kim Cương"}
 
-    for student in students:
-        total_add = sum(h.change for h in student.point_history if h.change > 0)
-        total_sub = sum(h.change for h in student.point_history if h.change < 0)
-        ws1.append([
-            student.order_number,
-            student.name,
-            student.total_points,
-            rank_map.get(student.rank, student.rank),
-            total_add,
-            total_sub
-        ])
+def counted(rows, progress, every: int = EXPORT_CHUNK_SIZE):
+    """Duyệt rows, gọi progress(số dòng) sau mỗi `every` dòng và ở cuối (progress=None: duyệt thẳng)"""
+    if progress is None:
+        yield from rows
+        return
+    pending = 0
+    for row in rows:
+        yield row
+        pending += 1
+        if pending >= every:
+            progress(pending)
+            pending = 0
+    if pending:
+        progress(pending)
+
+
+def write_classroom_workbook(db: Session, classroom_id: str, fileobj, progress=None):
+    """
+    Ghi workbook 3 sheet của một lớp vào fileobj.
+    Dùng worksheet write-only: mỗi dòng được ghi thẳng xuống file tạm của openpyxl
+    nên bộ nhớ không phụ thuộc số dòng lịch sử. progress(số dòng): báo tiến độ cho job.
+    """
+    wb = load_openpyxl().Workbook(write_only=True)
+
+    # ---------- Sheet 1: Danh sách ----------
+    ws1 = wb.create_sheet("Danh sách")
+    ws1.append(["STT", "Tên", "Điểm", "Hạng", "Tổng cộng", "Tổng trừ"])
+    summary = crud.get_export_summary(db, classroom_id)
+    for order_number, name, total_points, total_add, total_sub in counted(summary, progress):
+        rank = models.rank_for_points(total_points)
+        ws1.append([order_number, name, total_points, RANK_NAMES.get(rank, rank), total_add, total_sub])
 
     # ---------- Sheet 2: Lịch sử ----------
     ws2 = wb.create_sheet("Lịch sử")
     ws2.append(["Tên", "Thời gian", "Thay đổi", "Lý do", "Điểm sau"])
-
-    for student in students:
-        for h in sorted(student.point_history, key=lambda x: x.timestamp, reverse=True):
-            ws2.append([
-                student.name,
-                h.timestamp.strftime("%d/%m/%Y %H:%M"),
-                h.change,
-                h.reason,
-                h.points_after
-            ])
+    history = crud.iter_point_history(db, classroom_id, EXPORT_CHUNK_SIZE)
+    for name, timestamp, change, reason, points_after in counted(history, progress):
+        ws2.append([name, timestamp.strftime("%d/%m/%Y %H:%M"), change, reason, points_after])
 
     # ---------- Sheet 3: Quà đã đổi ----------
     ws3 = wb.create_sheet("Quà đã đổi")
     ws3.append(["Tên", "Quà", "Điểm tiêu", "Thời gian"])
+    redeemed = crud.iter_rewards_redeemed(db, classroom_id, EXPORT_CHUNK_SIZE)
+    for name, reward_name, points_spent, timestamp in counted(redeemed, progress):
+        ws3.append([name, reward_name, points_spent, timestamp.strftime("%d/%m/%Y %H:%M")])
+
+    wb.save(fileobj)
+
+
+def iter_file(fileobj, chunk_size: int = EXPORT_STREAM_CHUNK):
+    """Đọc file theo từng khối để StreamingResponse gửi dần, đóng file khi xong"""
+    try:
+        fileobj.seek(0)
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def classroom_export_filename(classroom_name: str) -> str:
+    return f"xephang_{classroom_name}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+
+
+@router.get("/export/{classroom_id}")
+def export_excel(classroom_id: str, db: Session = Depends(get_db)):
+    """
+    Export dữ liệu lớp ra file Excel gồm 3 sheet:
+    1. Danh sách: Tên | Điểm | Hạng | Tổng cộng | Tổng trừ
+    2. Lịch sử: Tên | Thời gian | Thay đổi | Lý do | Điểm sau
+    3. Quà đã đổi: Tên | Quà | Điểm tiêu | Thời gian
+    """
+    classroom = db.query(models.Classroom).filter(models.Classroom.id == classroom_id).first()
+    if not classroom:
+        raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
+
+    # Ghi ra file tạm (tự tràn xuống đĩa khi lớn) rồi stream theo khối
+    buffer = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        write_classroom_workbook(db, classroom_id, buffer)
+    except Exception:
+        buffer.close()
+        raise
 
-    for student in students:
-        for r in sorted(student.rewards_redeemed, key=lambda x: x.timestamp, reverse=True):
-            ws3.append([
-                student.name,
-                r.reward_name,
-                r.points_spent,
-                r.timestamp.strftime("%d/%m/%Y %H:%M")
-            ])
-
-    # Ghi ra buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    filename = f"xephang_{classroom.name}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    filename = classroom_export_filename(classroom.name)
     # Encode tên file để tránh lỗi latin-1 với ký tự tiếng Việt
     encoded_filename = urllib.parse.quote(filename)
 
     return StreamingResponse(
-        buffer,
+        iter_file(buffer),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={
             "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
         }
     )
+
+
+# ============ Export nhiều lớp (ZIP) ============
+# Bảng CSV toàn trường: (tên file, tiêu đề); mỗi dòng bắt đầu bằng mã lớp + tên lớp
+SCHOOL_CSV_TABLES = [
+    ("danh_sach.csv", ["Mã lớp", "Lớp", "STT", "Tên", "Điểm", "Hạng", "Tổng cộng", "Tổng trừ"]),
+    ("lich_su.csv", ["Mã lớp", "Lớp", "Tên", "Thời gian", "Thay đổi", "Lý do", "Điểm sau"]),
+    ("qua_da_doi.csv", ["Mã lớp", "Lớp", "Tên", "Quà", "Điểm tiêu", "Thời gian"]),
+]
+
+
+class ZipSink:
+    """
+    Đích ghi của zipfile khi stream: không seek được (zipfile ghi data descriptor sau mỗi file),
+    byte được gom lại để generator lấy ra và gửi đi ngay.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_school_csv_rows(db: Session, classrooms: list, table: str):
+    """Các dòng của 1 bảng CSV toàn trường, đọc lần lượt từng lớp bằng truy vấn theo khối"""
+    for classroom_id, classroom_name in classrooms:
+        prefix = (classroom_id, classroom_name)
+        if table == "danh_sach.csv":
+            for order_number, name, total_points, total_add, total_sub in crud.get_export_summary(db, classroom_id):
+                yield prefix + (order_number, name, total_points, models.rank_for_points(total_points),
+                                total_add, total_sub)
+        elif table == "lich_su.csv":
+            for name, timestamp, change, reason, points_after in crud.iter_point_history(db, classroom_id, EXPORT_CHUNK_SIZE):
+                yield prefix + (name, timestamp.isoformat(), change, reason, points_after)
+        else:
+            for name, reward_name, points_spent, timestamp in crud.iter_rewards_redeemed(db, classroom_id, EXPORT_CHUNK_SIZE):
+                yield prefix + (name, reward_name, points_spent, timestamp.isoformat())
+
+
+def workbook_names(classrooms: list):
+    """Tên file .xlsx trong ZIP theo tên lớp (bỏ ký tự không hợp lệ, thêm mã lớp nếu trùng tên)"""
+    names = {}
+    for classroom_id, classroom_name in classrooms:
+        base = re.sub(r'[\\/:*?"<>|]+', "_", classroom_name).strip() or "lop"
+        name = f"{base}.xlsx"
+        if name in names.values():
+            name = f"{base}_{classroom_id[:8]}.xlsx"
+        names[classroom_id] = name
+    return names
+
+
+def iter_school_zip(classrooms: list, format: str, progress=None):
+    """
+    Sinh file ZIP theo từng khối byte trong khi đọc DB:
+    - csv: 3 file CSV toàn trường, dòng được nén và gửi đi ngay khi đọc xong mỗi khối
+    - xlsx: 1 workbook mỗi lớp (ghi ra file tạm như export 1 lớp) rồi chép vào ZIP
+    Dùng session riêng (1 transaction đọc → số liệu các lớp nhất quán với nhau).
+    Bộ nhớ chỉ phụ thuộc kích thước khối, không phụ thuộc số lớp / số dòng lịch sử.
+    progress(số dòng): báo tiến độ cho job.
+    """
+    sink = ZipSink()
+    db = SessionLocal()
+    try:
+        compression = zipfile.ZIP_DEFLATED if format == "csv" else zipfile.ZIP_STORED
+        with zipfile.ZipFile(sink, "w", compression=compression) as zf:
+            if format == "csv":
+                for filename, header in SCHOOL_CSV_TABLES:
+                    with zf.open(filename, "w", force_zip64=True) as entry:
+                        text = io.TextIOWrapper(entry, encoding="utf-8", newline="")
+                        writer = csv.writer(text)
+                        writer.writerow(header)
+                        for row in counted(iter_school_csv_rows(db, classrooms, filename), progress):
+                            writer.writerow(row)
+                            if len(sink.buffer) >= EXPORT_STREAM_CHUNK:
+                                yield sink.drain()
+                        text.flush()
+                        text.detach()
+            else:
+                names = workbook_names(classrooms)
+                for classroom_id, _ in classrooms:
+                    buffer = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+                    try:
+                        write_classroom_workbook(db, classroom_id, buffer, progress)
+                        buffer.seek(0)
+                        with zf.open(names[classroom_id], "w", force_zip64=True) as entry:
+                            while chunk := buffer.read(EXPORT_STREAM_CHUNK):
+                                entry.write(chunk)
+                                if sink.buffer:
+                                    yield sink.drain()
+                    finally:
+                        buffer.close()
+        # Thư mục trung tâm (central directory) của ZIP
+        yield sink.drain()
+    finally:
+        db.close()
+
+
+def get_export_classrooms(db: Session, classroom_ids: Optional[List[str]]):
+    """[(id, tên)] các lớp cần export (None/rỗng = cả trường), 404 nếu có id không tồn tại"""
+    stmt = select(models.Classroom.id, models.Classroom.name).order_by(models.Classroom.name, models.Classroom.id)
+    if classroom_ids:
+        stmt = stmt.where(models.Classroom.id.in_(set(classroom_ids)))
+    classrooms = [tuple(row) for row in db.execute(stmt)]
+    if classroom_ids:
+        missing = set(classroom_ids) - {classroom_id for classroom_id, _ in classrooms}
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Không tìm thấy lớp học: {', '.join(sorted(missing))}")
+    return classrooms
+
+
+def school_export_filename(format: str) -> str:
+    return f"baocao_{format}_{datetime.now().strftime('%Y%m%d')}.zip"
+
+
+@router.get("/export")
+def export_school(classroom_ids: Optional[List[str]] = Query(None),
+                  format: Literal["xlsx", "csv"] = "xlsx",
+                  db: Session = Depends(get_db)):
+    """
+    Export nhiều lớp (classroom_ids lặp lại, bỏ trống = cả trường) thành 1 file ZIP stream:
+    - format=xlsx: mỗi lớp 1 workbook 3 sheet giống export 1 lớp
+    - format=csv: danh_sach.csv, lich_su.csv, qua_da_doi.csv cho cả trường (UTF-8, thời gian ISO 8601,
+      hạng dạng mã bronze/silver/gold/diamond) để nạp vào kho dữ liệu
+    """
+    classrooms = get_export_classrooms(db, classroom_ids)
+    if format == "xlsx":
+        load_openpyxl()
+
+    filename = school_export_filename(format)
+    return StreamingResponse(
+        iter_school_zip(classrooms, format),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
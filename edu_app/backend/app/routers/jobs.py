@@ -0,0 +1,108 @@
+"""
+Router: Job chạy nền cho import / export file lớn (xem jobs.py)
+
+Tạo job → 202 + trạng thái; hỏi tiến độ qua GET /api/jobs/{job_id};
+job export xong thì tải file qua GET /api/jobs/{job_id}/download.
+"""
+import json
+import os
+import shutil
+import urllib.parse
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from ..database import get_db
+from .. import jobs, models, schemas
+from .excel import check_import_filename, get_export_classrooms, load_openpyxl
+
+router = APIRouter(prefix="/api/jobs", tags=["Job chạy nền"])
+
+
+def job_response(job: models.Job) -> schemas.JobResponse:
+    return schemas.JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        classroom_id=job.classroom_id,
+        progress=jobs.read_progress(job),
+        total=job.total,
+        result=json.loads(job.result) if job.result else None,
+        error=job.error,
+        download_url=f"/api/jobs/{job.id}/download" if jobs.result_path(job) else None,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+def require_classroom(db: Session, classroom_id: str):
+    if db.get(models.Classroom, classroom_id) is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
+
+
+def start_job(db: Session, job: models.Job) -> schemas.JobResponse:
+    db.commit()
+    jobs.submit(job.id)
+    jobs.cleanup(db)
+    return job_response(job)
+
+
+@router.post("/import/{classroom_id}", response_model=schemas.JobResponse, status_code=202)
+def start_import(classroom_id: str, file: UploadFile = File(...),
+                 mode: Literal["append", "upsert"] = "append",
+                 db: Session = Depends(get_db)):
+    """Import học sinh từ .xlsx / .csv ở tiến trình nền (cùng định dạng và mode với /api/excel/import)"""
+    check_import_filename(file.filename)
+    require_classroom(db, classroom_id)
+    input_name = "input" + os.path.splitext(file.filename)[1]
+    job = jobs.create_job(db, "import", classroom_id, {"filename": file.filename, "input": input_name, "mode": mode})
+    with open(os.path.join(jobs.job_dir(job.id), input_name), "wb") as f:
+        shutil.copyfileobj(file.file, f)
+    return start_job(db, job)
+
+
+@router.post("/export/{classroom_id}", response_model=schemas.JobResponse, status_code=202)
+def start_export(classroom_id: str, db: Session = Depends(get_db)):
+    """Export 1 lớp ra .xlsx ở tiến trình nền"""
+    load_openpyxl()
+    require_classroom(db, classroom_id)
+    return start_job(db, jobs.create_job(db, "export", classroom_id))
+
+
+@router.post("/export", response_model=schemas.JobResponse, status_code=202)
+def start_export_school(classroom_ids: Optional[List[str]] = Query(None),
+                        format: Literal["xlsx", "csv"] = "xlsx",
+                        db: Session = Depends(get_db)):
+    """Export nhiều lớp ra ZIP ở tiến trình nền (cùng tham số với GET /api/excel/export)"""
+    if format == "xlsx":
+        load_openpyxl()
+    get_export_classrooms(db, classroom_ids)
+    job = jobs.create_job(db, "export_school", params={"classroom_ids": classroom_ids, "format": format})
+    return start_job(db, job)
+
+
+@router.get("/{job_id}", response_model=schemas.JobResponse)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    """Trạng thái + tiến độ của job"""
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job")
+    return job_response(job)
+
+
+@router.get("/{job_id}/download")
+def download_job_result(job_id: str, db: Session = Depends(get_db)):
+    """Tải file kết quả của job export đã xong"""
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job")
+    path = jobs.result_path(job)
+    if path is None:
+        raise HTTPException(status_code=409, detail="Job chưa xong hoặc không có file kết quả")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="File kết quả đã bị xóa")
+    return FileResponse(
+        path,
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(job.result_file)}"},
+    )
@@ -1,20 +1,20 @@
 """
 Router: Quản lý phần thưởng (cửa hàng quà)
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from ..database import get_db
-from .. import crud, schemas
+from ..database import get_async_db
+from .. import crud, schemas, etags
 
 router = APIRouter(prefix="/api/rewards", tags=["Phần thưởng"])
 
 
 # ⚠️ Route /redeem PHẢI đặt TRƯỚC /{classroom_id} để tránh bị match nhầm
 @router.post("/redeem")
-def redeem_reward(data: schemas.RedeemRequest, db: Session = Depends(get_db)):
+async def redeem_reward(data: schemas.RedeemRequest, db: AsyncSession = Depends(get_async_db)):
     """Đổi quà cho học sinh"""
-    student, error = crud.redeem_reward(db, data.student_id, data.reward_id)
+    student, error = await db.run_sync(crud.redeem_reward, data.student_id, data.reward_id)
     if error:
         raise HTTPException(status_code=400, detail=error)
     return {
@@ -24,21 +24,28 @@ def redeem_reward(data: schemas.RedeemRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/{classroom_id}", response_model=List[schemas.RewardResponse])
-def list_rewards(classroom_id: str, db: Session = Depends(get_db)):
-    """Lấy danh sách phần thưởng"""
-    return crud.get_rewards(db, classroom_id)
+async def list_rewards(classroom_id: str, request: Request, response: Response,
+                       db: AsyncSession = Depends(get_async_db)):
+    """Lấy danh sách phần thưởng (hỗ trợ If-None-Match)"""
+    version = await db.run_sync(crud.get_classroom_version, classroom_id)
+    if version is not None:
+        etag = etags.classroom_etag("rewards", classroom_id, version)
+        if etags.is_not_modified(request, etag):
+            return etags.not_modified(etag)
+        etags.set_etag(response, etag)
+    return await db.run_sync(crud.get_rewards, classroom_id)
 
 
 @router.post("/{classroom_id}", response_model=schemas.RewardResponse)
-def create_reward(classroom_id: str, data: schemas.RewardCreate, db: Session = Depends(get_db)):
+async def create_reward(classroom_id: str, data: schemas.RewardCreate, db: AsyncSession = Depends(get_async_db)):
     """Tạo phần thưởng mới"""
-    return crud.create_reward(db, classroom_id, data)
+    return await db.run_sync(crud.create_reward, classroom_id, data)
 
 
 @router.delete("/{reward_id}")
-def delete_reward(reward_id: str, db: Session = Depends(get_db)):
+async def delete_reward(reward_id: str, db: AsyncSession = Depends(get_async_db)):
     """Xóa phần thưởng"""
-    success = crud.delete_reward(db, reward_id)
+    success = await db.run_sync(crud.delete_reward, reward_id)
     if not success:
         raise HTTPException(status_code=404, detail="Không tìm thấy phần thưởng")
     return {"message": "Đã xóa phần thưởng"}
@@ -1,62 +1,165 @@
 """
 Router: Quản lý học sinh + điểm số
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
-from .. import crud, schemas
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Literal
+from ..database import get_async_db
+from .. import crud, schemas, avatars, etags, snapshots, search
 
 router = APIRouter(prefix="/api/students", tags=["Học sinh"])
 
 
+async def store_avatar(data):
+    """Chuyển avatar base64 vào kho ảnh (chạy trong threadpool), thay bằng tham chiếu ngắn"""
+    if not avatars.is_data_url(data.avatar):
+        return data
+    try:
+        avatar = await run_in_threadpool(avatars.store_avatar, data.avatar)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return data.model_copy(update={"avatar": avatar})
+
+
+@router.get("/search", response_model=List[schemas.StudentSearchResult])
+async def search_students(q: str = Query(..., min_length=1, max_length=100),
+                          classroom_id: Optional[str] = None,
+                          limit: int = Query(20, ge=1, le=100),
+                          db: AsyncSession = Depends(get_async_db)):
+    """
+    Tìm học sinh theo tên trong cả trường hoặc 1 lớp: không dấu, không phân biệt hoa/thường,
+    khớp tiền tố từng từ ("nguyen van a" tìm được "Nguyễn Văn An")
+    """
+    results = await db.run_sync(search.search_students, q, classroom_id, limit)
+    if results is None:
+        raise HTTPException(status_code=503, detail="SQLite của server không hỗ trợ FTS5")
+    return results
+
+
 @router.get("/{classroom_id}", response_model=List[schemas.StudentBrief])
-def list_students(classroom_id: str, db: Session = Depends(get_db)):
-    """Lấy danh sách học sinh theo lớp"""
-    return crud.get_students(db, classroom_id)
+async def list_students(classroom_id: str, request: Request, response: Response,
+                        db: AsyncSession = Depends(get_async_db)):
+    """Lấy danh sách học sinh theo lớp (hỗ trợ If-None-Match)"""
+    version = await db.run_sync(crud.get_classroom_version, classroom_id)
+    if version is not None:
+        etag = etags.classroom_etag("students", classroom_id, version)
+        if etags.is_not_modified(request, etag):
+            return etags.not_modified(etag)
+        etags.set_etag(response, etag)
+    return await db.run_sync(crud.get_students, classroom_id)
 
 
 @router.get("/detail/{student_id}", response_model=schemas.StudentResponse)
-def get_student(student_id: str, db: Session = Depends(get_db)):
+async def get_student(student_id: str, db: AsyncSession = Depends(get_async_db)):
     """Lấy chi tiết học sinh"""
-    student = crud.get_student(db, student_id)
+    student = await db.run_sync(crud.get_student, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Không tìm thấy học sinh")
     return student
 
 
+@router.get("/detail/{student_id}/history", response_model=schemas.PointHistoryPage)
+async def get_point_history(
+    student_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    sign: Optional[Literal["positive", "negative"]] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Lịch sử điểm của học sinh (phân trang theo cursor, mới nhất trước)"""
+    try:
+        items, next_cursor = await db.run_sync(
+            crud.get_point_history_page, student_id, limit, cursor, since, until, sign
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.PointHistoryPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/detail/{student_id}/redemptions", response_model=schemas.RewardRedeemedPage)
+async def get_rewards_redeemed(
+    student_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Lịch sử đổi quà của học sinh (phân trang theo cursor, mới nhất trước)"""
+    try:
+        items, next_cursor = await db.run_sync(
+            crud.get_rewards_redeemed_page, student_id, limit, cursor, since, until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.RewardRedeemedPage(items=items, next_cursor=next_cursor)
+
+
 @router.post("/{classroom_id}", response_model=schemas.StudentBrief)
-def create_student(classroom_id: str, data: schemas.StudentCreate, db: Session = Depends(get_db)):
+async def create_student(classroom_id: str, data: schemas.StudentCreate, db: AsyncSession = Depends(get_async_db)):
     """Thêm học sinh mới"""
-    return crud.create_student(db, classroom_id, data)
+    data = await store_avatar(data)
+    return await db.run_sync(crud.create_student, classroom_id, data)
 
 
 @router.put("/{student_id}", response_model=schemas.StudentBrief)
-def update_student(student_id: str, data: schemas.StudentUpdate, db: Session = Depends(get_db)):
+async def update_student(student_id: str, data: schemas.StudentUpdate, db: AsyncSession = Depends(get_async_db)):
     """Cập nhật thông tin học sinh"""
-    student = crud.update_student(db, student_id, data)
+    data = await store_avatar(data)
+    student = await db.run_sync(crud.update_student, student_id, data)
     if not student:
         raise HTTPException(status_code=404, detail="Không tìm thấy học sinh")
     return student
 
 
 @router.delete("/{student_id}")
-def delete_student(student_id: str, db: Session = Depends(get_db)):
+async def delete_student(student_id: str, db: AsyncSession = Depends(get_async_db)):
     """Xóa học sinh"""
-    success = crud.delete_student(db, student_id)
+    success = await db.run_sync(crud.delete_student, student_id)
     if not success:
         raise HTTPException(status_code=404, detail="Không tìm thấy học sinh")
     return {"message": "Đã xóa học sinh"}
 
 
+# ⚠️ Route /points/batch đặt TRƯỚC /{student_id}/points cho rõ ràng
+@router.post("/points/batch", response_model=schemas.PointBatchResponse)
+async def change_points_batch(data: schemas.PointBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """Chấm điểm hàng loạt (nhiều học sinh hoặc cả lớp) trong 1 transaction"""
+    if data.classroom_id is not None:
+        if data.items:
+            raise HTTPException(status_code=400, detail="Chỉ chọn items hoặc classroom_id")
+        if data.change is None:
+            raise HTTPException(status_code=400, detail="Thiếu số điểm thay đổi cho cả lớp")
+        if data.change < 0 and not data.reason.strip():
+            raise HTTPException(status_code=400, detail="Trừ điểm phải có lý do")
+        items = [
+            schemas.PointBatchItem(student_id=student_id, change=data.change, reason=data.reason)
+            for student_id in await db.run_sync(crud.get_student_ids, data.classroom_id)
+        ]
+    else:
+        if not data.items:
+            raise HTTPException(status_code=400, detail="Danh sách chấm điểm trống")
+        items = data.items
+
+    results = await db.run_sync(crud.change_points_batch, items)
+    return schemas.PointBatchResponse(
+        updated=sum(1 for r in results if r.error is None),
+        results=results
+    )
+
+
 @router.post("/{student_id}/points")
-def change_points(student_id: str, data: schemas.PointChange, db: Session = Depends(get_db)):
+async def change_points(student_id: str, data: schemas.PointChange, db: AsyncSession = Depends(get_async_db)):
     """Thay đổi điểm học sinh"""
     # Trừ điểm bắt buộc phải có lý do
     if data.change < 0 and not data.reason.strip():
         raise HTTPException(status_code=400, detail="Trừ điểm phải có lý do")
 
-    student, rank_changed, error = crud.change_points(db, student_id, data)
+    student, rank_changed, error = await db.run_sync(crud.change_points, student_id, data)
     if error:
         raise HTTPException(status_code=400, detail=error)
     if not student:
@@ -70,6 +173,28 @@ def change_points(student_id: str, data: schemas.PointChange, db: Session = Depe
 
 
 @router.get("/rankings/{classroom_id}", response_model=List[schemas.RankingEntry])
-def get_rankings(classroom_id: str, limit: int = 10, db: Session = Depends(get_db)):
-    """Lấy bảng xếp hạng"""
-    return crud.get_rankings(db, classroom_id, limit)
+async def get_rankings(classroom_id: str, request: Request, response: Response,
+                       limit: int = 10, period: Literal["week", "month"] = "week",
+                       db: AsyncSession = Depends(get_async_db)):
+    """Lấy bảng xếp hạng, xu hướng so với đầu tuần/tháng (hỗ trợ If-None-Match)"""
+    version = await db.run_sync(crud.get_classroom_version, classroom_id)
+    if version is not None:
+        # Sang kỳ mới thì mốc so sánh xu hướng đổi dù lớp không có thay đổi nào
+        etag = etags.classroom_etag(
+            "rankings", classroom_id, version, limit, period,
+            snapshots.period_start(period).date().isoformat()
+        )
+        if etags.is_not_modified(request, etag):
+            return etags.not_modified(etag)
+        etags.set_etag(response, etag)
+    return await db.run_sync(crud.get_rankings, classroom_id, limit, period)
+
+
+@router.get("/rankings/{classroom_id}/{student_id}", response_model=schemas.RankingEntry)
+async def get_ranking_position(classroom_id: str, student_id: str, period: Literal["week", "month"] = "week",
+                               db: AsyncSession = Depends(get_async_db)):
+    """Lấy vị trí xếp hạng của 1 học sinh"""
+    entry = await db.run_sync(crud.get_ranking_position, classroom_id, student_id, period)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Không tìm thấy học sinh trong lớp")
+    return entry
@@ -56,7 +56,34 @@ class RewardRedeemedResponse(BaseModel):
         from_attributes = True
 
 
+class PointHistoryPage(BaseModel):
+    """1 trang lịch sử điểm, mới nhất trước. next_cursor=None khi hết dữ liệu"""
+    items: List[PointHistoryResponse]
+    next_cursor: Optional[str] = None
+
+
+class RewardRedeemedPage(BaseModel):
+    """1 trang lịch sử đổi quà, mới nhất trước. next_cursor=None khi hết dữ liệu"""
+    items: List[RewardRedeemedResponse]
+    next_cursor: Optional[str] = None
+
+
+class StudentStatsResponse(BaseModel):
+    """Tổng hợp điểm của học sinh"""
+    earned: int = 0
+    deducted: int = 0
+    redeemed: int = 0
+    earn_count: int = 0
+    deduct_count: int = 0
+    redeem_count: int = 0
+    last_activity_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class StudentResponse(BaseModel):
+    """Chi tiết học sinh (lịch sử lấy riêng qua các endpoint phân trang)"""
     id: str
     name: str
     order_number: int
@@ -65,8 +92,7 @@ class StudentResponse(BaseModel):
     rank: str
     classroom_id: str
     created_at: datetime
-    point_history: List[PointHistoryResponse] = []
-    rewards_redeemed: List[RewardRedeemedResponse] = []
+    stats: Optional[StudentStatsResponse] = None
 
     class Config:
         from_attributes = True
@@ -86,12 +112,49 @@ class StudentBrief(BaseModel):
         from_attributes = True
 
 
+class StudentSearchResult(StudentBrief):
+    """Kết quả tìm học sinh (có thể thuộc nhiều lớp)"""
+    classroom_name: str
+
+
 # ============ Points ============
 class PointChange(BaseModel):
     change: int = Field(..., description="Số điểm thay đổi (+/-)")
     reason: str = Field(default="", max_length=255)
 
 
+class PointBatchItem(BaseModel):
+    student_id: str
+    change: int = Field(..., description="Số điểm thay đổi (+/-)")
+    reason: str = Field(default="", max_length=255)
+
+
+class PointBatchRequest(BaseModel):
+    """
+    Chấm điểm hàng loạt, chọn 1 trong 2 cách:
+    - items: danh sách {student_id, change, reason}
+    - classroom_id + change (+ reason): áp dụng cho cả lớp
+    Tối đa 500 mục mỗi request: mỗi mục 1 câu UPDATE trong cùng 1 transaction ghi
+    """
+    items: List[PointBatchItem] = Field(default=[], max_length=500)
+    classroom_id: Optional[str] = None
+    change: Optional[int] = None
+    reason: str = Field(default="", max_length=255)
+
+
+class PointBatchResult(BaseModel):
+    student_id: str
+    student: Optional[StudentBrief] = None
+    rank_changed: bool = False
+    new_rank: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PointBatchResponse(BaseModel):
+    updated: int
+    results: List[PointBatchResult]
+
+
 # ============ Rewards ============
 class RewardCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -128,6 +191,62 @@ class RankingEntry(BaseModel):
     trend: int = 0  # Xu hướng: +/- so với kỳ trước
 
 
+# ============ Changes ============
+class ChangesResponse(BaseModel):
+    """Thay đổi của lớp sau cursor; resync=True thì bỏ qua các trường còn lại và tải lại toàn bộ"""
+    version: int
+    resync: bool = False
+    students: List[StudentBrief] = []
+    deleted_students: List[str] = []
+    rewards: List[RewardResponse] = []
+    deleted_rewards: List[str] = []
+
+
+# ============ Analytics ============
+class TimeseriesPoint(BaseModel):
+    period: str  # Ngày (hoặc thứ Hai đầu tuần) dạng YYYY-MM-DD
+    earned: int
+    deducted: int
+    events: int
+    active_students: int
+    redeemed_points: int
+    redemptions: int
+
+
+class ReasonCount(BaseModel):
+    reason: str
+    count: int
+    points: int
+
+
+class TierCount(BaseModel):
+    rank: str
+    count: int
+
+
+class Participation(BaseModel):
+    students: int
+    active_students: int
+    rate: float
+
+
+# ============ Jobs ============
+class JobResponse(BaseModel):
+    """Trạng thái job chạy nền; download_url có khi job export đã xong"""
+    id: str
+    kind: str
+    status: str  # queued | running | done | failed
+    classroom_id: Optional[str] = None
+    progress: int = 0  # Số dòng đã xử lý
+    total: Optional[int] = None  # Ước lượng tổng số dòng (nếu biết)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
 # ============ Import ============
 class ImportPreview(BaseModel):
     rows: List[dict]
@@ -0,0 +1,123 @@
+"""
+Tìm học sinh theo tên bằng SQLite FTS5 (không dấu, không phân biệt hoa/thường, khớp tiền tố)
+
+- Bảng student_search (id INTEGER PRIMARY KEY, student_id, name) là nội dung ngoài của bảng ảo
+  student_search_fts: rowid của students có thể đổi khi VACUUM (khóa chính là chuỗi), id ở đây thì không
+- Trigger trên students giữ student_search đồng bộ với mọi câu INSERT / UPDATE tên / DELETE
+  (kể cả ghi hàng loạt, xóa dây chuyền theo lớp, tiến trình job hay công cụ ngoài: không cần hàm Python)
+- Tokenizer unicode61 remove_diacritics 2 bỏ dấu tiếng Việt (kể cả dấu chồng như "ễ") và hạ chữ
+  thường; riêng đ/Đ là chữ riêng nên được thay bằng d/D ngay trong trigger
+- Câu tìm kiếm được chuẩn hóa bằng text.fold, mỗi từ thành 1 tiền tố: "nguyen van a" → nguyen* van* a*
+SQLite không có FTS5: bỏ qua khi migration, endpoint tìm kiếm trả 503.
+"""
+import re
+from sqlalchemy import text as sql
+from sqlalchemy.exc import OperationalError
+from . import models, text
+
+MAX_QUERY_TERMS = 8
+
+SEARCH_INDEX_DDL = [
+    """CREATE TABLE IF NOT EXISTS student_search (
+        id INTEGER PRIMARY KEY,
+        student_id VARCHAR NOT NULL UNIQUE,
+        name VARCHAR NOT NULL
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS student_search_fts USING fts5(
+        name, content='student_search', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    # student_search → chỉ mục FTS (mẫu bảng nội dung ngoài của FTS5)
+    """CREATE TRIGGER IF NOT EXISTS student_search_ai AFTER INSERT ON student_search BEGIN
+        INSERT INTO student_search_fts (rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS student_search_ad AFTER DELETE ON student_search BEGIN
+        INSERT INTO student_search_fts (student_search_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS student_search_au AFTER UPDATE ON student_search BEGIN
+        INSERT INTO student_search_fts (student_search_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO student_search_fts (rowid, name) VALUES (new.id, new.name);
+    END""",
+    # students → student_search
+    """CREATE TRIGGER IF NOT EXISTS students_search_ai AFTER INSERT ON students BEGIN
+        INSERT INTO student_search (student_id, name)
+        VALUES (new.id, replace(replace(new.name, 'đ', 'd'), 'Đ', 'D'));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_search_au AFTER UPDATE OF name ON students BEGIN
+        UPDATE student_search SET name = replace(replace(new.name, 'đ', 'd'), 'Đ', 'D')
+        WHERE student_id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_search_ad AFTER DELETE ON students BEGIN
+        DELETE FROM student_search WHERE student_id = old.id;
+    END""",
+]
+
+
+def create_search_index(conn):
+    """Bước migration: tạo bảng + trigger và nạp học sinh chưa có trong chỉ mục (chạy lại được)"""
+    try:
+        for ddl in SEARCH_INDEX_DDL:
+            conn.exec_driver_sql(ddl)
+    except OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+        print("⚠️ SQLite không hỗ trợ FTS5: tắt tìm kiếm học sinh")
+        return
+    conn.exec_driver_sql("""
+        INSERT INTO student_search (student_id, name)
+        SELECT id, replace(replace(name, 'đ', 'd'), 'Đ', 'D') FROM students
+        WHERE id NOT IN (SELECT student_id FROM student_search)
+    """)
+
+
+def available(db) -> bool:
+    return db.execute(
+        sql("SELECT 1 FROM sqlite_master WHERE name = 'student_search_fts'")
+    ).first() is not None
+
+
+def build_match_query(query: str):
+    """Chuỗi người dùng → biểu thức MATCH của FTS5 (mỗi từ là 1 tiền tố), None nếu không có từ nào"""
+    terms = re.findall(r"\w+", text.fold(query))[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    # Đặt từng từ trong "..." để ký tự đặc biệt / từ khóa (AND, OR, NEAR) không bị hiểu là cú pháp FTS
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_students(db, query: str, classroom_id: str = None, limit: int = 20):
+    """
+    Học sinh khớp mọi từ trong `query`, sắp theo độ liên quan (bm25) rồi theo tên.
+    Trả về list dict (thẻ học sinh + classroom_name); None nếu SQLite không có FTS5.
+    """
+    if not available(db):
+        return None
+    match = build_match_query(query)
+    if match is None:
+        return []
+    # Chọn `limit` dòng khớp nhất ngay trong FTS rồi mới JOIN (JOIN trước thì phải nối mọi dòng khớp
+    # của tiền tố ngắn như "n*"); lọc theo lớp thì cần JOIN students trước khi cắt
+    if classroom_id:
+        matches = """
+            SELECT f.rowid, f.rank FROM student_search_fts f
+            JOIN student_search ss ON ss.id = f.rowid
+            JOIN students s ON s.id = ss.student_id
+            WHERE student_search_fts MATCH :match AND s.classroom_id = :classroom_id
+            ORDER BY f.rank LIMIT :limit
+        """
+    else:
+        matches = """
+            SELECT rowid, rank FROM student_search_fts
+            WHERE student_search_fts MATCH :match
+            ORDER BY rank LIMIT :limit
+        """
+    rows = db.execute(sql(f"""
+        SELECT s.id, s.name, s.order_number, s.avatar, s.total_points, s.classroom_id,
+               c.name AS classroom_name
+        FROM ({matches}) f
+        JOIN student_search ss ON ss.id = f.rowid
+        JOIN students s ON s.id = ss.student_id
+        JOIN classrooms c ON c.id = s.classroom_id
+        ORDER BY f.rank, s.name
+    """), {"match": match, "classroom_id": classroom_id, "limit": limit}).mappings().all()
+    return [dict(row, rank=models.rank_for_points(row["total_points"])) for row in rows]
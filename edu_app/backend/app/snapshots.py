@@ -0,0 +1,98 @@
+"""
+Ảnh chụp bảng xếp hạng theo kỳ (tuần/tháng) để tính xu hướng
+
+Mỗi lớp có 1 ảnh chụp cho mỗi kỳ, ghi lại vị trí của từng học sinh tại mốc đầu kỳ.
+Ảnh chụp được tạo ở lần thay đổi điểm đầu tiên của kỳ mới (ngay TRƯỚC khi áp dụng
+thay đổi, nên đúng bằng bảng xếp hạng lúc chuyển kỳ) hoặc ở lần xem xếp hạng đầu tiên.
+trend = vị trí đầu kỳ - vị trí hiện tại (dương = tăng hạng).
+"""
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, exists
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from . import models, leaderboard
+from .database import on_commit
+
+PERIODS = ("week", "month")
+
+# Các (lớp, kỳ, mốc) đã chắc chắn có ảnh chụp, tránh truy vấn lại mỗi lần ghi
+_known = set()
+_known_lock = threading.Lock()
+
+
+def period_start(period: str, now: datetime = None) -> datetime:
+    """Mốc đầu kỳ: 00:00 thứ Hai của tuần hoặc ngày 1 của tháng (UTC)"""
+    now = now or datetime.utcnow()
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Kỳ không hợp lệ: {period}")
+
+
+def ensure_snapshots(db: Session, classroom_id: str, now: datetime = None):
+    """
+    Tạo ảnh chụp cho kỳ hiện tại nếu chưa có (không commit, đi cùng transaction của người gọi).
+    Phải gọi TRƯỚC khi thay đổi điểm để ảnh chụp phản ánh bảng xếp hạng cuối kỳ trước.
+    Trả về True nếu đã ghi ảnh chụp mới (người gọi chỉ đọc thì chỉ cần commit khi đó).
+    """
+    inserted = False
+    for period in PERIODS:
+        start = period_start(period, now)
+        key = (classroom_id, period, start)
+        with _known_lock:
+            if key in _known:
+                continue
+        found = db.scalar(select(exists().where(
+            models.RankingSnapshot.classroom_id == classroom_id,
+            models.RankingSnapshot.period == period,
+            models.RankingSnapshot.period_start == start,
+        )))
+        if found:
+            _mark_known(key)
+            continue
+        # Như crud.get_rankings: đối chiếu version để không lưu bảng cũ trong bộ nhớ làm mốc
+        # (điểm có thể đã đổi từ process khác, vd job import)
+        version = db.scalar(select(models.Classroom.version).where(models.Classroom.id == classroom_id))
+        board = leaderboard.get_board(db, classroom_id, version)
+        if len(board) == 0:
+            continue
+        # Nhiều request có thể cùng tạo ảnh chụp đầu kỳ: bản ghi sau bị bỏ qua
+        db.execute(sqlite_insert(models.RankingSnapshot).on_conflict_do_nothing(), [
+            {
+                "classroom_id": classroom_id,
+                "period": period,
+                "period_start": start,
+                "student_id": entry["id"],
+                "position": position,
+            }
+            for position, entry in board.top(len(board))
+        ])
+        on_commit(db, lambda key=key: _mark_known(key))
+        inserted = True
+    return inserted
+
+
+def _mark_known(key):
+    with _known_lock:
+        _known.add(key)
+
+
+def forget_classroom(classroom_id: str):
+    """Bỏ đánh dấu của lớp (khi xóa lớp)"""
+    with _known_lock:
+        _known.difference_update({k for k in _known if k[0] == classroom_id})
+
+
+def get_baseline(db: Session, classroom_id: str, period: str, now: datetime = None) -> dict:
+    """Vị trí đầu kỳ {student_id: position} (1 truy vấn theo khóa chính)"""
+    rows = db.execute(
+        select(models.RankingSnapshot.student_id, models.RankingSnapshot.position).where(
+            models.RankingSnapshot.classroom_id == classroom_id,
+            models.RankingSnapshot.period == period,
+            models.RankingSnapshot.period_start == period_start(period, now),
+        )
+    ).all()
+    return dict(rows)
@@ -0,0 +1,161 @@
+"""
+Tổng hợp điểm theo học sinh (bảng student_stats)
+
+- crud gọi record() trong cùng transaction với mỗi dòng point_history / rewards_redeemed mới:
+  1 câu UPSERT cộng dồn (nhiều học sinh → executemany), không đọc-sửa-ghi trong Python
+- backfill() tính lại từ lịch sử bằng SQL (DB cũ, dữ liệu mẫu, dữ liệu ghi thẳng không qua crud),
+  gồm cả các tháng đã gộp vào point_history_monthly (archive.py)
+- Export / thống kê đọc O(số học sinh) dòng thay vì quét O(số dòng lịch sử)
+
+Tính lại cho DB đã có (chạy từ thư mục backend, dùng DATABASE_URL):
+    python -m app.stats [--classroom <id>]
+"""
+import argparse
+from sqlalchemy import case, delete, func, insert, or_, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from . import models
+
+COUNTERS = ("earned", "deducted", "redeemed", "earn_count", "deduct_count", "redeem_count")
+
+
+def point_delta(student_id: str, change: int, timestamp) -> dict:
+    """Phần cộng dồn cho 1 dòng point_history"""
+    return {
+        "student_id": student_id,
+        "earned": max(change, 0),
+        "deducted": max(-change, 0),
+        "redeemed": 0,
+        "earn_count": 1 if change > 0 else 0,
+        "deduct_count": 1 if change < 0 else 0,
+        "redeem_count": 0,
+        "last_activity_at": timestamp,
+    }
+
+
+def redeem_delta(student_id: str, points_spent: int, timestamp) -> dict:
+    """Phần cộng dồn cho 1 lượt đổi quà (kèm dòng point_history trừ điểm của nó)"""
+    return dict(point_delta(student_id, -points_spent, timestamp), redeemed=points_spent, redeem_count=1)
+
+
+def merge(deltas) -> list:
+    """Gộp các phần cộng dồn theo học sinh (1 dòng UPSERT mỗi học sinh)"""
+    merged = {}
+    for d in deltas:
+        current = merged.get(d["student_id"])
+        if current is None:
+            merged[d["student_id"]] = dict(d)
+            continue
+        for key in COUNTERS:
+            current[key] += d[key]
+        current["last_activity_at"] = max(current["last_activity_at"], d["last_activity_at"])
+    return list(merged.values())
+
+
+def record(db, deltas):
+    """Cộng dồn vào student_stats (tạo dòng nếu chưa có). Không commit: đi cùng transaction người gọi"""
+    rows = merge(deltas)
+    if not rows:
+        return
+    table = models.StudentStats.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.student_id],
+        set_={
+            **{key: table.c[key] + stmt.excluded[key] for key in COUNTERS},
+            "last_activity_at": func.max(
+                func.coalesce(table.c.last_activity_at, stmt.excluded.last_activity_at),
+                stmt.excluded.last_activity_at,
+            ),
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def backfill(conn, classroom_id: str = None) -> int:
+    """
+    Tính lại student_stats từ point_history + rewards_redeemed (cả DB hoặc 1 lớp).
+    conn: Connection hoặc Session; không commit. Trả về số học sinh đã tính.
+    """
+    history = models.PointHistory
+    monthly = models.PointHistoryMonthly
+    redeemed = models.RewardRedeemed
+    student = models.Student
+
+    history_parts = union_all(
+        select(
+            history.student_id,
+            func.sum(case((history.change > 0, history.change), else_=0)).label("earned"),
+            func.sum(case((history.change < 0, -history.change), else_=0)).label("deducted"),
+            func.sum(case((history.change > 0, 1), else_=0)).label("earn_count"),
+            func.sum(case((history.change < 0, 1), else_=0)).label("deduct_count"),
+            func.max(history.timestamp).label("last_at"),
+        ).group_by(history.student_id),
+        select(
+            monthly.student_id, monthly.earned, monthly.deducted,
+            monthly.earn_count, monthly.deduct_count, monthly.last_timestamp,
+        ),
+    ).subquery()
+    history_totals = select(
+        history_parts.c.student_id,
+        func.sum(history_parts.c.earned).label("earned"),
+        func.sum(history_parts.c.deducted).label("deducted"),
+        func.sum(history_parts.c.earn_count).label("earn_count"),
+        func.sum(history_parts.c.deduct_count).label("deduct_count"),
+        func.max(history_parts.c.last_at).label("last_at"),
+    ).group_by(history_parts.c.student_id).subquery()
+    redeemed_totals = select(
+        redeemed.student_id,
+        func.sum(redeemed.points_spent).label("redeemed"),
+        func.count().label("redeem_count"),
+        func.max(redeemed.timestamp).label("last_at"),
+    ).group_by(redeemed.student_id).subquery()
+
+    students = select(student.id)
+    if classroom_id is not None:
+        students = students.where(student.classroom_id == classroom_id)
+
+    source = select(
+        student.id,
+        func.coalesce(history_totals.c.earned, 0),
+        func.coalesce(history_totals.c.deducted, 0),
+        func.coalesce(redeemed_totals.c.redeemed, 0),
+        func.coalesce(history_totals.c.earn_count, 0),
+        func.coalesce(history_totals.c.deduct_count, 0),
+        func.coalesce(redeemed_totals.c.redeem_count, 0),
+        func.max(
+            func.coalesce(history_totals.c.last_at, redeemed_totals.c.last_at),
+            func.coalesce(redeemed_totals.c.last_at, history_totals.c.last_at),
+        ),
+    ).outerjoin(
+        history_totals, history_totals.c.student_id == student.id
+    ).outerjoin(
+        redeemed_totals, redeemed_totals.c.student_id == student.id
+    ).where(
+        student.id.in_(students),
+        # Chỉ học sinh đã có hoạt động (giống record(): dòng được tạo ở lần ghi đầu tiên)
+        or_(history_totals.c.student_id.isnot(None), redeemed_totals.c.student_id.isnot(None)),
+    )
+
+    table = models.StudentStats.__table__
+    conn.execute(delete(table).where(table.c.student_id.in_(students)))
+    result = conn.execute(insert(table).from_select(
+        ["student_id", *COUNTERS, "last_activity_at"], source
+    ))
+    return result.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classroom", help="Chỉ tính lại 1 lớp")
+    args = parser.parse_args()
+
+    from .database import Base, engine
+
+    Base.metadata.create_all(bind=engine, tables=[models.StudentStats.__table__])
+    with engine.begin() as conn:
+        count = backfill(conn, args.classroom)
+    print(f"✅ Đã tính lại tổng hợp điểm cho {count} học sinh")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Chuẩn hóa chuỗi tiếng Việt để so khớp tên
+
+fold("  Nguyễn  Văn ĐỨC ") == fold("nguyen van duc") == "nguyen van duc":
+bỏ dấu (NFD + bỏ ký tự tổ hợp, đ → d), không phân biệt hoa/thường, gộp khoảng trắng.
+"""
+import unicodedata
+
+
+def fold(value) -> str:
+    if value is None:
+        return ""
+    decomposed = unicodedata.normalize("NFD", str(value))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.replace("đ", "d").replace("Đ", "D").casefold().split())
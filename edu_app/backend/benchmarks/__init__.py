@@ -0,0 +1 @@
+# Benchmark backend Lớp Học Tích Cực (chạy: python -m benchmarks.<tên> từ thư mục backend)
@@ -0,0 +1,150 @@
+"""
+Benchmark: endpoint đồng bộ (def + Session) vs async (async def + AsyncSession/aiosqlite)
+
+Cả 2 phiên bản gọi cùng hàm crud.get_students trên cùng 1 file SQLite tạm.
+Kịch bản "blocked" giữ sẵn một số tác vụ dài trong threadpool (giống export lớn)
+để thấy endpoint đồng bộ phải xếp hàng chờ luồng còn endpoint async thì không.
+
+Chạy từ thư mục backend:
+    python -m benchmarks.db_layer --students 40 --requests 2000 --concurrency 100
+Kết quả in ra dạng JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def drive(app, path, total, concurrency):
+    """Gửi total request với tối đa concurrency request song song, trả về thống kê"""
+    import httpx
+
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker(client):
+        nonlocal errors
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                r = await client.get(path)
+                r.raise_for_status()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def build_apps():
+    from fastapi import Depends, FastAPI
+    from fastapi.concurrency import run_in_threadpool
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+    from app import crud, schemas
+    from app.database import get_db, get_async_db
+
+    sync_app = FastAPI()
+    async_app = FastAPI()
+
+    @sync_app.get("/students/{classroom_id}", response_model=List[schemas.StudentBrief])
+    def sync_list(classroom_id: str, db: Session = Depends(get_db)):
+        return crud.get_students(db, classroom_id)
+
+    @async_app.get("/students/{classroom_id}", response_model=List[schemas.StudentBrief])
+    async def async_list(classroom_id: str, db: AsyncSession = Depends(get_async_db)):
+        return await db.run_sync(crud.get_students, classroom_id)
+
+    async def block_threadpool(seconds):
+        await run_in_threadpool(time.sleep, seconds)
+
+    return sync_app, async_app, block_threadpool
+
+
+def seed(students):
+    from app import models
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(models.Classroom(id="bench", name="Bench"))
+    db.add_all([
+        models.Student(name=f"Học sinh {i}", order_number=i, total_points=i % 250, classroom_id="bench")
+        for i in range(students)
+    ])
+    db.commit()
+    db.close()
+
+
+async def run(args):
+    sync_app, async_app, block_threadpool = build_apps()
+    path = "/students/bench"
+    results = {"config": vars(args)}
+
+    for name, app in (("sync", sync_app), ("async", async_app)):
+        results[name] = await drive(app, path, args.requests, args.concurrency)
+
+    # Threadpool mặc định của anyio có 40 luồng: chiếm gần hết bằng tác vụ dài
+    for name, app in (("sync_blocked", sync_app), ("async_blocked", async_app)):
+        blockers = [asyncio.create_task(block_threadpool(args.block_seconds)) for _ in range(args.blockers)]
+        await asyncio.sleep(0.05)
+        results[name] = await drive(app, path, args.requests // 4, args.concurrency)
+        await asyncio.gather(*blockers)
+
+    from app.database import async_engine
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=30)
+    parser.add_argument("--blockers", type=int, default=36, help="Số tác vụ dài chiếm threadpool")
+    parser.add_argument("--block-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    # Luôn dùng DB trong thư mục tạm (kể cả khi môi trường đặt DATABASE_URL tới DB thật), trước khi import app
+    workdir = tempfile.mkdtemp(prefix="bench_db_")
+    os.chdir(workdir)
+    os.makedirs("data", exist_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(os.path.join('data', 'classroom.db'))}"
+    seed(args.students)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Benchmark tải toàn bộ API trên 1 trường giả lập (xem benchmarks/synthetic.py)
+
+Mỗi kịch bản gửi N request với tối đa C request song song và đo:
+- p50/p95/p99 (ms), requests/giây, số lỗi
+- số câu SQL (tổng và trung bình mỗi request, đếm qua event before_cursor_execute)
+- RSS đỉnh của tiến trình phục vụ (KB)
+Kết quả là JSON (kèm commit git) để so sánh giữa các commit, vd:
+    python -m benchmarks.load --output before.json
+    git checkout <commit khác> && python -m benchmarks.load --output after.json
+
+Mặc định chạy app trong cùng tiến trình (httpx ASGITransport). Với --uvicorn, benchmark
+khởi động 1 server uvicorn cục bộ (1 worker) trên cùng DB; khi đó không đếm được câu SQL
+và RSS là của tiến trình server.
+
+Chạy từ thư mục backend:
+    python -m benchmarks.load --classrooms 20 --students 40 --history 200 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from .db_layer import percentile
+
+# (tên, hệ số số request so với --requests): import/export nặng nên chạy ít hơn
+SCENARIOS = [
+    ("list_students", 1.0),
+    ("student_detail", 1.0),
+    ("point_history", 1.0),
+    ("rankings", 1.0),
+    ("list_rewards", 1.0),
+    ("change_points", 1.0),
+    ("points_batch", 0.2),
+    ("redeem", 0.5),
+    ("import", 0.02),
+    ("export", 0.02),
+    ("export_school_csv", 0.01),
+    ("search", 0.5),
+]
+
+
+class SqlCounter:
+    """Đếm câu SQL trên engine đồng bộ và engine async của app"""
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self):
+        from sqlalchemy import event
+        from app.database import engine, async_engine
+
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def peak_rss_kb(pid=None):
+    """RSS đỉnh (KB) của tiến trình hiện tại hoặc tiến trình pid (Linux: VmHWM)"""
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def import_csv(rnd: random.Random, rows: int) -> bytes:
+    lines = ["Họ và tên,Điểm"] + [f"Học sinh nhập {rnd.randrange(10 ** 6)},{rnd.randrange(50)}" for _ in range(rows)]
+    return "\n".join(lines).encode("utf-8")
+
+
+# Câu tìm kiếm không dấu / tiền tố như người dùng gõ (tên sinh theo synthetic.py)
+SEARCH_QUERIES = ["nguyen van", "tran th", "duc", "hoang a", "le minh l", "pham", "vo quoc b", "ng"]
+
+
+def make_request(name: str, rnd: random.Random, school: dict, args):
+    """Trả về (method, url, kwargs, mã trạng thái chấp nhận) cho 1 request ngẫu nhiên của kịch bản"""
+    classroom_id = rnd.choice(school["classroom_ids"])
+    student_id = rnd.choice(school["student_ids"])
+    if name == "list_students":
+        return "GET", f"/api/students/{classroom_id}", {}, (200,)
+    if name == "student_detail":
+        return "GET", f"/api/students/detail/{student_id}", {}, (200,)
+    if name == "point_history":
+        return "GET", f"/api/students/detail/{student_id}/history", {"params": {"limit": 50}}, (200,)
+    if name == "rankings":
+        return "GET", f"/api/students/rankings/{classroom_id}", {"params": {"limit": 10}}, (200,)
+    if name == "list_rewards":
+        return "GET", f"/api/rewards/{classroom_id}", {}, (200,)
+    if name == "change_points":
+        body = {"change": rnd.choice([1, 3, 5, 10, -1]), "reason": "Benchmark"}
+        # Trừ quá số điểm hiện có bị từ chối (400) là kết quả hợp lệ
+        return "POST", f"/api/students/{student_id}/points", {"json": body}, (200, 400)
+    if name == "points_batch":
+        body = {"classroom_id": classroom_id, "change": 1, "reason": "Benchmark cả lớp"}
+        return "POST", "/api/students/points/batch", {"json": body}, (200,)
+    if name == "redeem":
+        # Phần thưởng cùng lớp với học sinh (id sinh theo mẫu trong synthetic.py)
+        reward_id = rnd.choice([r for r in school["reward_ids"] if r.startswith(student_id.rsplit("-student-", 1)[0])])
+        body = {"student_id": student_id, "reward_id": reward_id}
+        return "POST", "/api/rewards/redeem", {"json": body}, (200, 400)
+    if name == "import":
+        files = {"file": ("import.csv", import_csv(rnd, args.import_rows), "text/csv")}
+        return "POST", f"/api/excel/import/{classroom_id}", {"files": files}, (200,)
+    if name == "export":
+        return "GET", f"/api/excel/export/{classroom_id}", {}, (200,)
+    if name == "export_school_csv":
+        return "GET", "/api/excel/export", {"params": {"format": "csv"}}, (200,)
+    if name == "search":
+        return "GET", "/api/students/search", {"params": {"q": rnd.choice(SEARCH_QUERIES), "limit": 20}}, (200,)
+    raise ValueError(name)
+
+
+async def drive(client, name, total, concurrency, school, args, seed):
+    """Gửi total request của kịch bản với tối đa concurrency request song song"""
+    rnd = random.Random(seed)
+    requests = [make_request(name, rnd, school, args) for _ in range(total)]
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                method, url, kwargs, accepted = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                r = await client.request(method, url, **kwargs)
+                await r.aread()
+                if r.status_code not in accepted:
+                    errors += 1
+                    continue
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+async def run_scenarios(client, school, args, sql_counter=None, server_pid=None):
+    results = {}
+    selected = [s for s in SCENARIOS if not args.only or s[0] in args.only]
+    for i, (name, factor) in enumerate(selected):
+        total = max(1, int(args.requests * factor))
+        before = sql_counter.count if sql_counter else None
+        stats = await drive(client, name, total, args.concurrency, school, args, args.seed + i)
+        if sql_counter:
+            queries = sql_counter.count - before
+            stats["sql_total"] = queries
+            stats["sql_per_request"] = round(queries / total, 2)
+        else:
+            stats["sql_total"] = stats["sql_per_request"] = None
+        stats["peak_rss_kb"] = peak_rss_kb(server_pid)
+        results[name] = stats
+    return results
+
+
+async def run_in_process(school, args):
+    import httpx
+    from app.main import app
+    from app.database import async_engine
+
+    sql_counter = SqlCounter()
+    sql_counter.install()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        results = await run_scenarios(client, school, args, sql_counter)
+    await async_engine.dispose()
+    return results
+
+
+async def run_uvicorn(school, args, backend_dir):
+    import httpx
+
+    env = dict(os.environ, PYTHONPATH=backend_dir)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+            for _ in range(100):
+                try:
+                    if (await client.get("/api/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn không khởi động được")
+            return await run_scenarios(client, school, args, server_pid=server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit(backend_dir):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classrooms", type=int, default=20)
+    parser.add_argument("--students", type=int, default=40, help="Số học sinh mỗi lớp")
+    parser.add_argument("--history", type=int, default=200, help="Số dòng lịch sử điểm mỗi học sinh")
+    parser.add_argument("--requests", type=int, default=500, help="Số request cho mỗi kịch bản nhẹ")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--import-rows", type=int, default=200, help="Số dòng mỗi file import")
+    parser.add_argument("--only", nargs="*", help="Chỉ chạy các kịch bản này")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--uvicorn", action="store_true", help="Chạy qua server uvicorn cục bộ")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--output", help="Ghi JSON ra file (mặc định in ra stdout)")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = os.path.abspath(args.output) if args.output else None
+    # Luôn dùng DB trong thư mục tạm (kể cả khi môi trường đặt DATABASE_URL tới DB thật);
+    # đặt trước khi import app, server --uvicorn thừa hưởng biến môi trường này
+    os.chdir(tempfile.mkdtemp(prefix="bench_load_"))
+    os.makedirs("data", exist_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(os.path.join('data', 'classroom.db'))}"
+
+    from app import models  # noqa: F401 - đăng ký bảng vào Base.metadata
+    from app.database import Base, SessionLocal, engine
+    from app.migrations import run_migrations
+    from .synthetic import generate_school
+
+    Base.metadata.create_all(bind=engine)
+    # Bảng / trigger ngoài ORM (vd chỉ mục tìm kiếm FTS5) như khi server khởi động
+    run_migrations(engine)
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        school = generate_school(db, args.classrooms, args.students, args.history, seed=args.seed)
+    finally:
+        db.close()
+    seed_seconds = time.perf_counter() - started
+
+    if args.uvicorn:
+        engine.dispose()
+        scenarios = asyncio.run(run_uvicorn(school, args, backend_dir))
+    else:
+        scenarios = asyncio.run(run_in_process(school, args))
+
+    report = {
+        "commit": git_commit(backend_dir),
+        "config": vars(args),
+        "dataset": dict(school["counts"], seed_seconds=round(seed_seconds, 3)),
+        "scenarios": scenarios,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark: nhiều "thiết bị giáo viên" cùng chấm điểm + đọc danh sách trên 1 file SQLite
+
+So sánh các profile cấu hình SQLite (xem database.py). Mỗi profile chạy trong
+1 tiến trình con riêng với biến môi trường tương ứng và 1 thư mục DB mới.
+- "legacy": giống cấu hình cũ (rollback journal, synchronous=FULL, timeout mặc định 5s của sqlite3)
+- "tuned": mặc định mới (WAL, synchronous=NORMAL, cache/mmap, busy_timeout)
+
+Chạy từ thư mục backend:
+    python -m benchmarks.sqlite_concurrency --writers 8 --readers 4 --ops 200
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = {
+    "legacy": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_CACHE_SIZE": "-2000",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_TEMP_STORE": "DEFAULT",
+        "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "DB_POOL_SIZE": "5",
+        "DB_MAX_OVERFLOW": "10",
+    },
+    "tuned": {},
+}
+
+
+def run_worker(args):
+    """Chạy trong tiến trình con: seed DB rồi cho các luồng ghi/đọc song song"""
+    os.makedirs("data", exist_ok=True)
+    from sqlalchemy.exc import OperationalError
+    from app import crud, models, schemas
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(models.Classroom(id="bench", name="Bench"))
+    student_ids = [f"s{i}" for i in range(args.students)]
+    db.add_all([
+        models.Student(id=sid, name=f"Học sinh {i}", order_number=i, total_points=0, classroom_id="bench")
+        for i, sid in enumerate(student_ids)
+    ])
+    db.commit()
+    db.close()
+
+    stats = {"writes": 0, "write_errors": 0, "locked_errors": 0, "reads": 0, "read_errors": 0}
+    lock = threading.Lock()
+    stop_reading = threading.Event()
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+
+    def writer(seed):
+        rnd = random.Random(seed)
+        for _ in range(args.ops):
+            session = SessionLocal()
+            try:
+                student, _, error = crud.change_points(
+                    session, rnd.choice(student_ids), schemas.PointChange(change=1, reason="bench")
+                )
+                count("writes" if student else "write_errors")
+            except OperationalError as e:
+                session.rollback()
+                count("locked_errors" if "locked" in str(e) else "write_errors")
+            except Exception:
+                session.rollback()
+                count("write_errors")
+            finally:
+                session.close()
+
+    def reader():
+        while not stop_reading.is_set():
+            session = SessionLocal()
+            try:
+                crud.get_students(session, "bench")
+                count("reads")
+            except Exception:
+                count("read_errors")
+            finally:
+                session.close()
+
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    started = time.perf_counter()
+    for t in readers + writers:
+        t.start()
+    for t in writers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop_reading.set()
+    for t in readers:
+        t.join()
+
+    with engine.connect() as conn:
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        total = conn.exec_driver_sql("SELECT SUM(total_points) FROM students").scalar()
+
+    stats.update({
+        "journal_mode": journal_mode,
+        "elapsed_s": round(elapsed, 3),
+        "writes_per_s": round(stats["writes"] / elapsed, 1),
+        "reads_per_s": round(stats["reads"] / elapsed, 1),
+        "points_in_db": total,
+    })
+    print(json.dumps(stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=200, help="Số lần chấm điểm mỗi luồng ghi")
+    parser.add_argument("--profile", choices=sorted(PROFILES), action="append",
+                        help="Chỉ chạy profile này (mặc định: tất cả)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {"config": {k: v for k, v in vars(args).items() if k != "worker"}}
+    for name in args.profile or sorted(PROFILES):
+        # DB trong thư mục tạm của profile, kể cả khi môi trường đặt DATABASE_URL tới DB thật
+        workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+        database_url = f"sqlite:///{os.path.join(workdir, 'data', 'classroom.db')}"
+        env = dict(os.environ, PYTHONPATH=backend_dir, DATABASE_URL=database_url, **PROFILES[name])
+        cmd = [sys.executable, "-m", "benchmarks.sqlite_concurrency", "--worker",
+               "--students", str(args.students), "--writers", str(args.writers),
+               "--readers", str(args.readers), "--ops", str(args.ops)]
+        out = subprocess.run(cmd, env=env, cwd=workdir,
+                             capture_output=True, text=True, check=True)
+        results[name] = json.loads(out.stdout.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
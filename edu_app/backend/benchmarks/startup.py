@@ -0,0 +1,84 @@
+"""
+Kiểm tra khởi động nguội: import app.main phải nhanh và không có tác dụng phụ
+
+Mỗi lần đo chạy 1 tiến trình Python mới trong thư mục tạm trống:
+- import trước các framework (fastapi, sqlalchemy, pydantic...) → thời gian framework
+- rồi import app.main → thời gian riêng của app (phần được so với ngân sách)
+Sau khi import, thư mục tạm phải vẫn trống (không tạo data/, không mở DB) và các thư viện
+nặng chỉ dùng khi cần (openpyxl, Pillow) chưa được nạp.
+
+Chạy từ thư mục backend (mã thoát 1 nếu vượt ngân sách hoặc có tác dụng phụ):
+    python -m benchmarks.startup --runs 5 --budget-ms 400
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Thư viện chỉ được nạp khi dùng tới (import/export Excel, ảnh thu nhỏ)
+DEFERRED_MODULES = ["openpyxl", "PIL"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import fastapi, fastapi.responses, pydantic, sqlalchemy, sqlalchemy.orm, sqlalchemy.ext.asyncio
+framework = time.perf_counter()
+import app.main
+done = time.perf_counter()
+print(json.dumps({
+    "framework_ms": (framework - started) * 1000,
+    "app_ms": (done - framework) * 1000,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def measure_once(backend_dir):
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ, PYTHONPATH=backend_dir, PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["created_files"] = sorted(os.listdir(workdir))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=400,
+                        help="Ngân sách cho thời gian import riêng của app (trung vị, ms)")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = [measure_once(backend_dir) for _ in range(args.runs)]
+
+    app_ms = statistics.median(r["app_ms"] for r in runs)
+    created = sorted({f for r in runs for f in r["created_files"]})
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    checks = {
+        "within_budget": app_ms <= args.budget_ms,
+        "no_files_created": not created,
+        "deferred_modules_not_loaded": not loaded,
+    }
+    report = {
+        "config": vars(args),
+        "framework_ms_median": round(statistics.median(r["framework_ms"] for r in runs), 1),
+        "app_ms_median": round(app_ms, 1),
+        "app_ms_max": round(max(r["app_ms"] for r in runs), 1),
+        "created_files": created,
+        "loaded_deferred_modules": loaded,
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
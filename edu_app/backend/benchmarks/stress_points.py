@@ -0,0 +1,151 @@
+"""
+Stress test: nhiều luồng (và tiến trình, như nhiều worker uvicorn) cùng cộng/trừ điểm
+và đổi quà cho 1 học sinh, sau đó kiểm tra sổ điểm có cân không:
+- total_points = tổng mọi thay đổi trong point_history (điểm ban đầu 0)
+- không có points_after âm, số lượt thành công khớp số dòng lịch sử
+- số lượt đổi quà x giá quà = tổng điểm trừ do đổi quà
+
+Chạy từ thư mục backend (mã thoát 1 nếu sổ điểm lệch):
+    python -m benchmarks.stress_points --processes 2 --threads 8 --ops 100
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+STUDENT_ID = "stress-student"
+REWARD_ID = "stress-reward"
+REWARD_COST = 7
+
+
+def setup_db():
+    from app import models
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(models.Classroom(id="stress", name="Stress"))
+    db.add(models.Student(id=STUDENT_ID, name="Stress", total_points=0, classroom_id="stress"))
+    db.add(models.Reward(id=REWARD_ID, name="Quà", points_required=REWARD_COST, classroom_id="stress"))
+    db.commit()
+    db.close()
+
+
+def hammer(seed, threads, ops):
+    """Chạy trong mỗi tiến trình: các luồng gửi thao tác ngẫu nhiên, trả về số lượt thành công"""
+    from app import crud, schemas
+    from app.database import SessionLocal
+
+    counts = {"points_ok": 0, "points_rejected": 0, "redeem_ok": 0, "redeem_rejected": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def worker(worker_seed):
+        rnd = random.Random(worker_seed)
+        for _ in range(ops):
+            db = SessionLocal()
+            try:
+                action = rnd.random()
+                if action < 0.15:
+                    student, error = crud.redeem_reward(db, STUDENT_ID, REWARD_ID)
+                    count("redeem_ok" if student else "redeem_rejected")
+                else:
+                    change = rnd.choice([1, 3, 5, 10, -1, -5, -10])
+                    student, _, error = crud.change_points(
+                        db, STUDENT_ID, schemas.PointChange(change=change, reason="stress")
+                    )
+                    count("points_ok" if student else "points_rejected")
+            except Exception:
+                db.rollback()
+                count("errors")
+            finally:
+                db.close()
+
+    pool = [threading.Thread(target=worker, args=(seed * 1000 + i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return counts
+
+
+def check_ledger(counts):
+    from sqlalchemy import func
+    from app import models
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        total = db.query(models.Student.total_points).filter(models.Student.id == STUDENT_ID).scalar()
+        history = db.query(
+            func.count(models.PointHistory.id),
+            func.coalesce(func.sum(models.PointHistory.change), 0),
+            func.coalesce(func.min(models.PointHistory.points_after), 0),
+        ).filter(models.PointHistory.student_id == STUDENT_ID).one()
+        redeemed = db.query(func.count(models.RewardRedeemed.id)).filter(
+            models.RewardRedeemed.student_id == STUDENT_ID
+        ).scalar()
+        redeem_points = db.query(func.coalesce(func.sum(models.PointHistory.change), 0)).filter(
+            models.PointHistory.student_id == STUDENT_ID,
+            models.PointHistory.reason.like("Đổi quà:%"),
+        ).scalar()
+    finally:
+        db.close()
+
+    history_rows, history_sum, min_after = history
+    checks = {
+        "total_equals_history_sum": total == history_sum,
+        "total_not_negative": total >= 0,
+        "no_negative_points_after": min_after >= 0,
+        "history_rows_match_successes": history_rows == counts["points_ok"] + counts["redeem_ok"],
+        "redemptions_match_successes": redeemed == counts["redeem_ok"],
+        "redemption_points_match": -redeem_points == redeemed * REWARD_COST,
+    }
+    return {
+        "total_points": total,
+        "history_rows": history_rows,
+        "history_sum": history_sum,
+        "redemptions": redeemed,
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=100, help="Số thao tác mỗi luồng")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, backend_dir)
+    # Luôn dùng DB trong thư mục tạm (kể cả khi môi trường đặt DATABASE_URL tới DB thật);
+    # đặt trước khi import app, các tiến trình con (spawn) thừa hưởng biến môi trường này
+    os.chdir(tempfile.mkdtemp(prefix="stress_"))
+    os.makedirs("data", exist_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(os.path.join('data', 'classroom.db'))}"
+    setup_db()
+
+    started = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.processes) as pool:
+        per_process = pool.starmap(hammer, [(i, args.threads, args.ops) for i in range(args.processes)])
+    elapsed = time.perf_counter() - started
+
+    counts = {key: sum(c[key] for c in per_process) for key in per_process[0]}
+    report = {"config": vars(args), "elapsed_s": round(elapsed, 3), "counts": counts, **check_ledger(counts)}
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Sinh dữ liệu trường học giả lập ở quy mô tùy chọn (lớp × học sinh × dòng lịch sử)
+
+Dữ liệu xác định theo --seed (cùng tham số → cùng dữ liệu) để so sánh benchmark giữa các commit.
+Ghi bằng INSERT nhiều dòng theo lô, không qua crud (nhanh, không đụng bảng xếp hạng trong bộ nhớ);
+bảng tổng hợp student_stats được tính lại từ lịch sử sau mỗi lớp.
+Sổ điểm nhất quán: total_points = tổng thay đổi trong point_history, points_after không âm.
+
+Chạy từ thư mục backend (ghi vào ./data/classroom.db của thư mục hiện tại):
+    python -m benchmarks.synthetic --classrooms 20 --students 40 --history 200
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+FAMILY_NAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ"]
+MIDDLE_NAMES = ["Văn", "Thị", "Minh", "Hoàng", "Ngọc", "Thanh", "Gia", "Quốc", "Thu", "Đức"]
+GIVEN_NAMES = ["An", "Bình", "Cường", "Dũng", "Đức", "Giang", "Hà", "Hải", "Lan", "Linh",
+               "Mai", "Nam", "Phúc", "Quân", "Sơn", "Thảo", "Trang", "Tú", "Vy", "Yến"]
+REASONS_ADD = ["Nộp bài đúng hạn", "Phát biểu tốt", "Giúp đỡ bạn", "Hoàn thành xuất sắc", "Trả lời đúng"]
+REASONS_SUB = ["Quên sách giáo khoa", "Nói chuyện trong giờ", "Đi học muộn", "Không làm bài tập"]
+REWARDS = [("Vé miễn 1 bài kiểm tra", "🎫", 40), ("Chọn ghế ngồi tự do", "🪑", 60),
+           ("Cộng 10 điểm bài thi", "✏️", 90), ("Phiếu mua sách 100k", "📖", 180)]
+
+# Số dòng mỗi câu INSERT nhiều dòng
+CHUNK_SIZE = 5000
+
+
+def _insert_chunked(db, model, rows):
+    from sqlalchemy import insert
+
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.execute(insert(model), rows[i:i + CHUNK_SIZE])
+
+
+def generate_school(db, classrooms: int, students: int, history: int, rewards: int = 4,
+                    redemptions: int = 2, days: int = 90, seed: int = 42) -> dict:
+    """
+    Ghi 1 trường giả lập vào session (và commit).
+    classrooms lớp × students học sinh/lớp × history dòng point_history/học sinh,
+    rewards phần thưởng/lớp, redemptions lượt đổi quà/học sinh, rải đều trong `days` ngày gần nhất.
+    Trả về id đã tạo (để benchmark chọn ngẫu nhiên) và số dòng.
+    """
+    from app import models, stats
+
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    start = now - timedelta(days=days)
+    step = timedelta(days=days) / max(history + redemptions, 1)
+
+    classroom_ids, student_ids, reward_ids = [], [], []
+    counts = {"classrooms": 0, "students": 0, "point_history": 0, "rewards": 0, "rewards_redeemed": 0}
+    for c in range(classrooms):
+        classroom_id = f"bench-class-{c:04d}"
+        classroom_ids.append(classroom_id)
+        db.add(models.Classroom(id=classroom_id, name=f"Lớp {10 + c % 3}A{c + 1}", created_at=start))
+        db.flush()
+
+        class_rewards = [REWARDS[i % len(REWARDS)] for i in range(rewards)]
+        reward_rows = []
+        for i, (name, icon, cost) in enumerate(class_rewards):
+            reward_id = f"{classroom_id}-reward-{i:02d}"
+            reward_ids.append(reward_id)
+            reward_rows.append({"id": reward_id, "name": name, "description": "", "icon": icon,
+                                "points_required": cost, "classroom_id": classroom_id})
+
+        student_rows, history_rows, redeemed_rows = [], [], []
+        for s in range(students):
+            student_id = f"{classroom_id}-student-{s:04d}"
+            student_ids.append(student_id)
+            points = 0
+            timestamp = start
+            for _ in range(history):
+                timestamp += step
+                change = rnd.choice([1, 1, 3, 5, 10]) if points < 5 or rnd.random() < 0.85 else -rnd.choice([1, 2, 5])
+                change = max(change, -points)
+                points += change
+                history_rows.append({
+                    "id": models.generate_uuid(), "student_id": student_id, "change": change,
+                    "reason": rnd.choice(REASONS_ADD if change >= 0 else REASONS_SUB),
+                    "points_after": points, "timestamp": timestamp,
+                })
+            for _ in range(redemptions if class_rewards else 0):
+                name, _, cost = rnd.choice(class_rewards)
+                if points < cost:
+                    continue
+                timestamp += step
+                points -= cost
+                redeemed_rows.append({"id": models.generate_uuid(), "student_id": student_id,
+                                      "reward_name": name, "points_spent": cost, "timestamp": timestamp})
+                history_rows.append({
+                    "id": models.generate_uuid(), "student_id": student_id, "change": -cost,
+                    "reason": f"Đổi quà: {name}", "points_after": points, "timestamp": timestamp,
+                })
+            student_rows.append({
+                "id": student_id,
+                "name": f"{rnd.choice(FAMILY_NAMES)} {rnd.choice(MIDDLE_NAMES)} {rnd.choice(GIVEN_NAMES)}",
+                "order_number": s + 1, "avatar": None, "total_points": points,
+                "classroom_id": classroom_id, "created_at": start,
+            })
+
+        _insert_chunked(db, models.Student, student_rows)
+        _insert_chunked(db, models.PointHistory, history_rows)
+        _insert_chunked(db, models.Reward, reward_rows)
+        _insert_chunked(db, models.RewardRedeemed, redeemed_rows)
+        stats.backfill(db, classroom_id)
+        counts["classrooms"] += 1
+        counts["students"] += len(student_rows)
+        counts["point_history"] += len(history_rows)
+        counts["rewards"] += len(reward_rows)
+        counts["rewards_redeemed"] += len(redeemed_rows)
+        db.commit()
+
+    return {
+        "classroom_ids": classroom_ids,
+        "student_ids": student_ids,
+        "reward_ids": reward_ids,
+        "counts": counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classrooms", type=int, default=20)
+    parser.add_argument("--students", type=int, default=40, help="Số học sinh mỗi lớp")
+    parser.add_argument("--history", type=int, default=200, help="Số dòng lịch sử điểm mỗi học sinh")
+    parser.add_argument("--rewards", type=int, default=4, help="Số phần thưởng mỗi lớp")
+    parser.add_argument("--redemptions", type=int, default=2, help="Số lượt đổi quà tối đa mỗi học sinh")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app import models  # noqa: F401 - đăng ký bảng vào Base.metadata
+    from app.database import Base, SessionLocal, engine
+
+    os.makedirs("data", exist_ok=True)
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        school = generate_school(db, args.classrooms, args.students, args.history,
+                                 args.rewards, args.redemptions, seed=args.seed)
+    finally:
+        db.close()
+    print(json.dumps({"counts": school["counts"], "elapsed_s": round(time.perf_counter() - started, 3)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
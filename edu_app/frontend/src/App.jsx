@@ -1,9 +1,9 @@
 /**
  * App.jsx - Component chính của ứng dụng
  */
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { ThemeProvider, CssBaseline } from '@mui/material';
-import { Toaster } from 'react-hot-toast';
+import toast, { Toaster } from 'react-hot-toast';
 import theme from './theme';
 import Header from './components/Header';
 import StudentGrid from './components/StudentGrid';
@@ -21,6 +21,8 @@ export default function App() {
   const [selectedClassroom, setSelectedClassroom] = useState('');
   const [students, setStudents] = useState([]);
   const [loading, setLoading] = useState(true);
+  // Version của lớp mà danh sách học sinh đang phản ánh (cursor đồng bộ delta)
+  const versionRef = useRef(null);
 
   // Dialog/Drawer states
   const [drawerStudent, setDrawerStudent] = useState(null);
@@ -73,6 +75,91 @@ export default function App() {
     );
   };
 
+  // Thêm hoặc cập nhật 1 student (từ sự kiện realtime), giữ thứ tự theo STT
+  const upsertStudentInList = (student) => {
+    setStudents(prev => {
+      if (prev.some(s => s.id === student.id)) {
+        return prev.map(s => s.id === student.id ? { ...s, ...student } : s);
+      }
+      return [...prev, student].sort((a, b) => a.order_number - b.order_number);
+    });
+  };
+
+  // Chỉ lấy các học sinh đã đổi kể từ version đã biết; cursor quá cũ thì tải lại toàn bộ
+  const syncStudents = useCallback(async () => {
+    if (!selectedClassroom) return;
+    if (versionRef.current === null) {
+      loadStudents();
+      return;
+    }
+    try {
+      const { data } = await api.getClassroomChanges(selectedClassroom, versionRef.current);
+      if (data.resync) {
+        await loadStudents();
+      } else {
+        data.students.forEach(upsertStudentInList);
+        if (data.deleted_students.length > 0) {
+          setStudents(prev => prev.filter(s => !data.deleted_students.includes(s.id)));
+        }
+      }
+      versionRef.current = data.version;
+    } catch (err) {
+      console.error('Lỗi đồng bộ học sinh:', err);
+    }
+  }, [selectedClassroom, loadStudents]);
+
+  // Đồng bộ realtime với các màn hình khác (máy chiếu, máy tính bảng) thay vì tải lại định kỳ
+  useEffect(() => {
+    if (!selectedClassroom) return undefined;
+    versionRef.current = null;
+    return api.subscribeClassroomEvents(selectedClassroom, (event) => {
+      const version = versionRef.current;
+      if (event.type === 'hello') {
+        // Kết nối lại sau khi mất mạng: chỉ lấy phần thay đổi bị lỡ
+        if (version !== null && event.version !== version) {
+          syncStudents();
+        } else {
+          versionRef.current = event.version;
+        }
+        return;
+      }
+      if (event.type === 'resync') {
+        syncStudents();
+        return;
+      }
+      if (version !== null && event.version <= version) return;
+      if (version !== null && event.version > version + 1) {
+        syncStudents();
+        return;
+      }
+      versionRef.current = event.version;
+
+      switch (event.type) {
+        case 'points':
+        case 'redeem':
+        case 'student_created':
+        case 'student_updated':
+          upsertStudentInList(event.student);
+          break;
+        case 'points_batch':
+          event.students.forEach(upsertStudentInList);
+          break;
+        case 'student_deleted':
+          setStudents(prev => prev.filter(s => s.id !== event.student_id));
+          break;
+        case 'students_reloaded':
+          versionRef.current = version;
+          syncStudents();
+          break;
+        case 'classroom_deleted':
+          loadClassrooms();
+          break;
+        default:
+          break;
+      }
+    });
+  }, [selectedClassroom, syncStudents]);
+
   return (
     <ThemeProvider theme={theme}>
       <CssBaseline />
@@ -112,18 +199,29 @@ export default function App() {
         classroomId={selectedClassroom}
         onAddStudent={() => setShowAddStudent(true)}
         onShowRewardShop={() => setShowRewardShop(true)}
-        onImportDone={loadStudents}
+        onImportDone={syncStudents}
         onExportClick={async () => {
+          // Export chạy nền; xong thì trình duyệt tải thẳng file kết quả
+          const toastId = toast.loading('Đang tạo file Excel...');
           try {
-            const res = await api.exportExcel(selectedClassroom);
-            const url = window.URL.createObjectURL(new Blob([res.data]));
+            const { data } = await api.startExportJob(selectedClassroom);
+            const job = await api.waitForJob(data.id, (j) => {
+              if (j.status === 'running' && j.total) {
+                const percent = Math.min(99, Math.round((j.progress / j.total) * 100));
+                toast.loading(`Đang tạo file Excel... ${percent}%`, { id: toastId });
+              }
+            });
+            if (job.status === 'failed') {
+              toast.error(job.error || 'Lỗi export', { id: toastId });
+              return;
+            }
+            toast.dismiss(toastId);
             const a = document.createElement('a');
-            a.href = url;
-            a.download = `xephang_${selectedClassroom}.xlsx`;
+            a.href = job.download_url;
             a.click();
-            window.URL.revokeObjectURL(url);
           } catch (err) {
             console.error('Lỗi export:', err);
+            toast.error('Lỗi export', { id: toastId });
           }
         }}
       />
@@ -133,7 +231,7 @@ export default function App() {
         student={drawerStudent}
         open={!!drawerStudent}
         onClose={() => setDrawerStudent(null)}
-        onUpdate={() => { loadStudents(); }}
+        onUpdate={() => { syncStudents(); }}
       />
 
       {/* Dialog xếp hạng */}
@@ -149,7 +247,7 @@ export default function App() {
         onClose={() => setShowRewardShop(false)}
         classroomId={selectedClassroom}
         students={students}
-        onRedeemed={loadStudents}
+        onRedeemed={syncStudents}
       />
 
       {/* Dialog thêm học sinh */}
@@ -157,7 +255,7 @@ export default function App() {
         open={showAddStudent}
         onClose={() => setShowAddStudent(false)}
         classroomId={selectedClassroom}
-        onAdded={loadStudents}
+        onAdded={syncStudents}
       />
 
       {/* Dialog cài đặt */}
@@ -15,9 +15,21 @@ export const getClassrooms = () => api.get('/classrooms');
 export const createClassroom = (name) => api.post('/classrooms', { name });
 export const deleteClassroom = (id) => api.delete(`/classrooms/${id}`);
 
+// Đồng bộ delta: thay đổi sau version `since` → { version, resync, students, deleted_students, rewards, deleted_rewards }
+export const getClassroomChanges = (classroomId, since) =>
+  api.get(`/classrooms/${classroomId}/changes`, { params: { since } });
+
 // ============ Students ============
 export const getStudents = (classroomId) => api.get(`/students/${classroomId}`);
+// Tìm theo tên (không dấu, khớp tiền tố) trong cả trường hoặc 1 lớp (classroomId)
+export const searchStudents = (q, { classroomId, limit } = {}) =>
+  api.get('/students/search', { params: { q, classroom_id: classroomId, limit } });
 export const getStudentDetail = (studentId) => api.get(`/students/detail/${studentId}`);
+// params: { limit, cursor, since, until, sign: 'positive' | 'negative' }
+export const getPointHistory = (studentId, params = {}) =>
+  api.get(`/students/detail/${studentId}/history`, { params });
+export const getRewardsRedeemed = (studentId, params = {}) =>
+  api.get(`/students/detail/${studentId}/redemptions`, { params });
 export const createStudent = (classroomId, data) => api.post(`/students/${classroomId}`, data);
 export const updateStudent = (studentId, data) => api.put(`/students/${studentId}`, data);
 export const deleteStudent = (studentId) => api.delete(`/students/${studentId}`);
@@ -25,10 +37,16 @@ export const deleteStudent = (studentId) => api.delete(`/students/${studentId}`)
 // ============ Points ============
 export const changePoints = (studentId, change, reason = '') =>
   api.post(`/students/${studentId}/points`, { change, reason });
+// items: [{ student_id, change, reason }]
+export const changePointsBatch = (items) =>
+  api.post('/students/points/batch', { items });
+export const changePointsClassroom = (classroomId, change, reason = '') =>
+  api.post('/students/points/batch', { classroom_id: classroomId, change, reason });
 
 // ============ Rankings ============
-export const getRankings = (classroomId, limit = 10) =>
-  api.get(`/students/rankings/${classroomId}`, { params: { limit } });
+// period: 'week' | 'month' (mốc tính xu hướng)
+export const getRankings = (classroomId, limit = 10, period = 'week') =>
+  api.get(`/students/rankings/${classroomId}`, { params: { limit, period } });
 
 // ============ Rewards ============
 export const getRewards = (classroomId) => api.get(`/rewards/${classroomId}`);
@@ -37,16 +55,67 @@ export const deleteReward = (rewardId) => api.delete(`/rewards/${rewardId}`);
 export const redeemReward = (studentId, rewardId) =>
   api.post('/rewards/redeem', { student_id: studentId, reward_id: rewardId });
 
+// ============ Analytics ============
+// params: { bucket: 'day' | 'week', since, until }
+export const getAnalyticsTimeseries = (classroomId, params = {}) =>
+  api.get(`/analytics/${classroomId}/timeseries`, { params });
+// params: { sign: 'positive' | 'negative', limit, since, until }
+export const getAnalyticsReasons = (classroomId, params = {}) =>
+  api.get(`/analytics/${classroomId}/reasons`, { params });
+export const getAnalyticsTiers = (classroomId) => api.get(`/analytics/${classroomId}/tiers`);
+export const getAnalyticsParticipation = (classroomId, params = {}) =>
+  api.get(`/analytics/${classroomId}/participation`, { params });
+
 // ============ Excel ============
-export const importExcel = (classroomId, file) => {
+export const importExcel = (classroomId, file, mode = 'append') => {
   const formData = new FormData();
   formData.append('file', file);
   return api.post(`/excel/import/${classroomId}`, formData, {
+    params: { mode },
     headers: { 'Content-Type': 'multipart/form-data' },
   });
 };
 
 export const exportExcel = (classroomId) =>
   api.get(`/excel/export/${classroomId}`, { responseType: 'blob' });
+// Export nhiều lớp (ZIP stream): mở URL trực tiếp để trình duyệt ghi dần xuống đĩa thay vì giữ cả file trong RAM.
+// classroomIds rỗng = cả trường; format: 'xlsx' (1 workbook mỗi lớp) | 'csv'
+export const schoolExportUrl = (classroomIds = [], format = 'xlsx') => {
+  const params = new URLSearchParams({ format });
+  classroomIds.forEach((id) => params.append('classroom_ids', id));
+  return `${API_BASE}/excel/export?${params}`;
+};
+
+// ============ Job chạy nền (import / export file lớn) ============
+// mode: 'append' (thêm mới mọi dòng) hoặc 'upsert' (cập nhật học sinh đã có theo tên / STT)
+export const startImportJob = (classroomId, file, mode = 'append') => {
+  const formData = new FormData();
+  formData.append('file', file);
+  return api.post(`/jobs/import/${classroomId}`, formData, {
+    params: { mode },
+    headers: { 'Content-Type': 'multipart/form-data' },
+  });
+};
+export const startExportJob = (classroomId) => api.post(`/jobs/export/${classroomId}`);
+export const getJob = (jobId) => api.get(`/jobs/${jobId}`);
+
+// Hỏi trạng thái job tới khi xong (done/failed); onProgress nhận job sau mỗi lần hỏi
+export const waitForJob = async (jobId, onProgress, intervalMs = 1000) => {
+  for (;;) {
+    const { data } = await getJob(jobId);
+    if (onProgress) onProgress(data);
+    if (data.status === 'done' || data.status === 'failed') return data;
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};
+
+// ============ Sự kiện realtime (SSE) ============
+// onEvent nhận { type, version, ... }; trả về hàm đóng kết nối.
+// EventSource tự kết nối lại khi mất mạng (server gửi lại sự kiện hello).
+export const subscribeClassroomEvents = (classroomId, onEvent) => {
+  const source = new EventSource(`${API_BASE}/events/${classroomId}`);
+  source.onmessage = (e) => onEvent(JSON.parse(e.data));
+  return () => source.close();
+};
 
 export default api;
@@ -24,15 +24,26 @@ export default function Footer({
     const file = e.target.files[0];
     if (!file) return;
 
+    // File được xử lý ở job chạy nền: hiện tiến độ thay vì chờ 1 request dài
+    const toastId = toast.loading('Đang import...');
     try {
-      const res = await api.importExcel(classroomId, file);
-      toast.success(`✅ Đã import ${res.data.imported} học sinh`);
-      if (res.data.errors?.length > 0) {
-        toast.error(`⚠️ ${res.data.errors.length} lỗi: ${res.data.errors[0]}`);
+      // Upsert: nhập lại danh sách đã sửa không tạo học sinh trùng
+      const { data } = await api.startImportJob(classroomId, file, 'upsert');
+      const job = await api.waitForJob(data.id, (j) => {
+        if (j.status === 'running') toast.loading(`Đang import... ${j.progress} dòng`, { id: toastId });
+      });
+      if (job.status === 'failed') {
+        toast.error(job.error || 'Lỗi import file', { id: toastId });
+      } else {
+        const { created, updated } = job.result;
+        toast.success(`✅ Thêm ${created} học sinh, cập nhật ${updated} học sinh`, { id: toastId });
+        if (job.result.error_count > 0) {
+          toast.error(`⚠️ ${job.result.error_count} lỗi: ${job.result.errors[0]}`);
+        }
+        onImportDone();
       }
-      onImportDone();
     } catch (err) {
-      toast.error(err.response?.data?.detail || 'Lỗi import file');
+      toast.error(err.response?.data?.detail || 'Lỗi import file', { id: toastId });
     }
     // Reset input
     e.target.value = '';
@@ -14,18 +14,30 @@ import { RANKS, generateDefaultAvatar } from '../utils';
 
 const positionIcons = ['🥇', '🥈', '🥉'];
 
+const PERIODS = [
+  { value: 'week', label: 'Tuần này' },
+  { value: 'month', label: 'Tháng này' },
+];
+
+function TrendLabel({ trend }) {
+  if (trend > 0) return <Typography color="success.main" fontWeight={600}>↑ +{trend}</Typography>;
+  if (trend < 0) return <Typography color="error.main" fontWeight={600}>↓ {trend}</Typography>;
+  return <Typography color="text.secondary">→ 0</Typography>;
+}
+
 export default function RankingDialog({ open, onClose, classroomId }) {
   const [rankings, setRankings] = useState([]);
+  const [period, setPeriod] = useState('week');
 
   useEffect(() => {
     if (open && classroomId) {
       loadRankings();
     }
-  }, [open, classroomId]);
+  }, [open, classroomId, period]);
 
   const loadRankings = async () => {
     try {
-      const res = await api.getRankings(classroomId);
+      const res = await api.getRankings(classroomId, 10, period);
       setRankings(res.data);
     } catch (err) {
       console.error(err);
@@ -42,6 +54,16 @@ export default function RankingDialog({ open, onClose, classroomId }) {
         <IconButton onClick={onClose}><CloseIcon /></IconButton>
       </DialogTitle>
       <DialogContent>
+        <Box sx={{ display: 'flex', gap: 1, mb: 1 }}>
+          {PERIODS.map(p => (
+            <Chip
+              key={p.value}
+              label={p.label}
+              color={period === p.value ? 'primary' : 'default'}
+              onClick={() => setPeriod(p.value)}
+            />
+          ))}
+        </Box>
         <Table>
           <TableHead>
             <TableRow>
@@ -49,6 +71,7 @@ export default function RankingDialog({ open, onClose, classroomId }) {
               <TableCell sx={{ fontWeight: 700 }}>Học sinh</TableCell>
               <TableCell align="center" sx={{ fontWeight: 700 }}>Điểm</TableCell>
               <TableCell align="center" sx={{ fontWeight: 700 }}>Danh hiệu</TableCell>
+              <TableCell align="center" sx={{ fontWeight: 700 }}>Xu hướng</TableCell>
             </TableRow>
           </TableHead>
           <TableBody>
@@ -94,12 +117,15 @@ export default function RankingDialog({ open, onClose, classroomId }) {
                       }}
                     />
                   </TableCell>
+                  <TableCell align="center">
+                    <TrendLabel trend={entry.trend} />
+                  </TableCell>
                 </TableRow>
               );
             })}
             {rankings.length === 0 && (
               <TableRow>
-                <TableCell colSpan={4} align="center">
+                <TableCell colSpan={5} align="center">
                   <Typography color="text.secondary">Chưa có dữ liệu</Typography>
                 </TableCell>
               </TableRow>
@@ -23,25 +23,47 @@ import toast from 'react-hot-toast';
 
 ChartJS.register(CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend);
 
+const PAGE_SIZE = 50;
+
 function TabPanel({ children, value, index }) {
   return value === index ? <Box sx={{ py: 2 }}>{children}</Box> : null;
 }
 
 export default function StudentDrawer({ student, open, onClose, onUpdate }) {
   const [tab, setTab] = useState(0);
-  const [detail, setDetail] = useState(null);
+  // Lịch sử được tải theo trang (mới nhất trước), cursor = null khi đã hết
+  const [history, setHistory] = useState({ items: [], cursor: null });
+  const [redeemed, setRedeemed] = useState({ items: [], cursor: null });
 
   useEffect(() => {
     if (student && open) {
-      loadDetail();
+      setHistory({ items: [], cursor: null });
+      setRedeemed({ items: [], cursor: null });
+      loadHistory();
+      loadRedeemed();
       setTab(0);
     }
   }, [student, open]);
 
-  const loadDetail = async () => {
+  const loadHistory = async (cursor = null) => {
+    try {
+      const res = await api.getPointHistory(student.id, { limit: PAGE_SIZE, cursor });
+      setHistory(prev => ({
+        items: cursor ? [...prev.items, ...res.data.items] : res.data.items,
+        cursor: res.data.next_cursor,
+      }));
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
+  const loadRedeemed = async (cursor = null) => {
     try {
-      const res = await api.getStudentDetail(student.id);
-      setDetail(res.data);
+      const res = await api.getRewardsRedeemed(student.id, { limit: PAGE_SIZE, cursor });
+      setRedeemed(prev => ({
+        items: cursor ? [...prev.items, ...res.data.items] : res.data.items,
+        cursor: res.data.next_cursor,
+      }));
     } catch (err) {
       console.error(err);
     }
@@ -68,10 +90,10 @@ export default function StudentDrawer({ student, open, onClose, onUpdate }) {
 
   // Thống kê cho biểu đồ
   const getChartData = () => {
-    if (!detail?.point_history) return null;
+    if (history.items.length === 0) return null;
 
     const months = {};
-    detail.point_history.forEach(h => {
+    [...history.items].reverse().forEach(h => {
       const date = new Date(h.timestamp);
       const key = `${date.getMonth() + 1}/${date.getFullYear()}`;
       if (!months[key]) months[key] = { add: 0, sub: 0 };
@@ -162,36 +184,39 @@ export default function StudentDrawer({ student, open, onClose, onUpdate }) {
 
       {/* Tab: Hoạt động (Timeline) */}
       <TabPanel value={tab} index={0}>
-        {detail?.point_history?.length > 0 ? (
+        {history.items.length > 0 ? (
           <List dense>
-            {[...detail.point_history]
-              .sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp))
-              .map((h, i) => (
-                <ListItem key={h.id || i} sx={{ alignItems: 'flex-start' }}>
-                  <ListItemIcon sx={{ minWidth: 36, mt: 0.5 }}>
-                    {h.change > 0
-                      ? <AddCircleIcon sx={{ color: '#6750A4' }} />
-                      : <RemoveCircleIcon sx={{ color: '#FF6D00' }} />}
-                  </ListItemIcon>
-                  <ListItemText
-                    primary={
-                      <Box sx={{ display: 'flex', gap: 1, alignItems: 'center' }}>
-                        <Chip
-                          label={h.change > 0 ? `+${h.change}` : h.change}
-                          size="small"
-                          sx={{
-                            fontWeight: 700,
-                            backgroundColor: h.change > 0 ? '#F3EEFF' : '#FFF3E0',
-                            color: h.change > 0 ? '#6750A4' : '#FF6D00',
-                          }}
-                        />
-                        <Typography variant="body2">{h.reason || '—'}</Typography>
-                      </Box>
-                    }
-                    secondary={`${formatTime(h.timestamp)} | Sau: ${h.points_after} điểm`}
-                  />
-                </ListItem>
-              ))}
+            {history.items.map((h, i) => (
+              <ListItem key={h.id || i} sx={{ alignItems: 'flex-start' }}>
+                <ListItemIcon sx={{ minWidth: 36, mt: 0.5 }}>
+                  {h.change > 0
+                    ? <AddCircleIcon sx={{ color: '#6750A4' }} />
+                    : <RemoveCircleIcon sx={{ color: '#FF6D00' }} />}
+                </ListItemIcon>
+                <ListItemText
+                  primary={
+                    <Box sx={{ display: 'flex', gap: 1, alignItems: 'center' }}>
+                      <Chip
+                        label={h.change > 0 ? `+${h.change}` : h.change}
+                        size="small"
+                        sx={{
+                          fontWeight: 700,
+                          backgroundColor: h.change > 0 ? '#F3EEFF' : '#FFF3E0',
+                          color: h.change > 0 ? '#6750A4' : '#FF6D00',
+                        }}
+                      />
+                      <Typography variant="body2">{h.reason || '—'}</Typography>
+                    </Box>
+                  }
+                  secondary={`${formatTime(h.timestamp)} | Sau: ${h.points_after} điểm`}
+                />
+              </ListItem>
+            ))}
+            {history.cursor && (
+              <Button fullWidth size="small" onClick={() => loadHistory(history.cursor)}>
+                Xem thêm
+              </Button>
+            )}
           </List>
         ) : (
           <Typography variant="body2" color="text.secondary" textAlign="center">
@@ -202,21 +227,24 @@ export default function StudentDrawer({ student, open, onClose, onUpdate }) {
 
       {/* Tab: Phần thưởng đã đổi */}
       <TabPanel value={tab} index={1}>
-        {detail?.rewards_redeemed?.length > 0 ? (
+        {redeemed.items.length > 0 ? (
           <List dense>
-            {[...detail.rewards_redeemed]
-              .sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp))
-              .map((r, i) => (
-                <ListItem key={r.id || i}>
-                  <ListItemIcon sx={{ minWidth: 36 }}>
-                    <CardGiftcardIcon sx={{ color: '#6750A4' }} />
-                  </ListItemIcon>
-                  <ListItemText
-                    primary={r.reward_name}
-                    secondary={`-${r.points_spent} điểm | ${formatTime(r.timestamp)}`}
-                  />
-                </ListItem>
-              ))}
+            {redeemed.items.map((r, i) => (
+              <ListItem key={r.id || i}>
+                <ListItemIcon sx={{ minWidth: 36 }}>
+                  <CardGiftcardIcon sx={{ color: '#6750A4' }} />
+                </ListItemIcon>
+                <ListItemText
+                  primary={r.reward_name}
+                  secondary={`-${r.points_spent} điểm | ${formatTime(r.timestamp)}`}
+                />
+              </ListItem>
+            ))}
+            {redeemed.cursor && (
+              <Button fullWidth size="small" onClick={() => loadRedeemed(redeemed.cursor)}>
+                Xem thêm
+              </Button>
+            )}
           </List>
         ) : (
           <Typography variant="body2" color="text.secondary" textAlign="center">